@@ -0,0 +1,400 @@
+"""Ambient lighting from screen captures, videos and image sequences.
+
+A CapturePipeline thread pulls frames from a FrameSource and keeps only
+the newest one. Each zone precomputes a RegionMap for the frame size:
+for every LED a regular grid of sample points covering its region along
+the frame edges, as flat pixel indices. Reducing a frame is one gather
+of (leds, samples, 3) pixels from a strided (pixels, 3) view of the
+frame and one weighted sum, so the cost depends on the LED count, not
+the frame size: about 0.5 ms for a 4K frame and 540 LEDs. Sources hand
+out strided views where they can (BGR(A) as RGB, memory-mapped .npy
+frames) instead of converting whole frames.
+
+Sources are given as a spec:
+    screen[:MONITOR]     screen grab (mss, or Pillow's ImageGrab)
+    frames.npy           (count, height, width, 3) uint8 array, memory-mapped
+    shots/ or shots/*.png image sequence (Pillow)
+    clip.mp4             video file (OpenCV)
+Other grabbers (e.g. a platform capture API) are added with
+register_grabber(). File sources loop and are paced to their frame rate.
+"""
+import os
+import glob
+import time
+import threading
+import numpy as np
+
+# Frame rate of image sequences and .npy files, and the screen grab limit
+DEFAULT_FPS = 30.0
+MAX_SCREEN_FPS = 60.0
+# Depth of the edge regions, as a fraction of the frame's smaller side
+DEFAULT_DEPTH = 0.12
+# Sample points per side of each LED's region grid (samples**2 per LED)
+DEFAULT_SAMPLES = 8
+# Where a zone's LEDs sit on the frame
+EDGES = ("around", "top", "bottom", "left", "right", "layout")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+
+class FrameSource:
+    """Base class of frame sources
+
+    read() returns an RGB uint8 (height, width, 3) array or None at the
+    end. A frame is never written to after it was returned, since
+    effects may still be reading it.
+    """
+    fps = DEFAULT_FPS
+    realtime = True  # Paced to fps by the pipeline (screens pace themselves)
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ArraySource(FrameSource):
+    """Frames of a (count, height, width, 3) .npy file, memory-mapped and looped"""
+
+    def __init__(self, path, fps=DEFAULT_FPS):
+        self.frames = np.load(path, mmap_mode="r")
+        if self.frames.ndim != 4 or self.frames.shape[3] != 3:
+            raise ValueError(f"{path} is not a (count, height, width, 3) frame array")
+        self.fps = fps
+        self.index = 0
+
+    def read(self):
+        # Only the pages of the sampled pixels are ever read from disk
+        frame = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+        return frame
+
+
+class ImageSequenceSource(FrameSource):
+    """Image files in name order, looped"""
+
+    def __init__(self, pattern, fps=DEFAULT_FPS):
+        if os.path.isdir(pattern):
+            paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            paths = glob.glob(pattern)
+        self.paths = sorted(path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.paths:
+            raise ValueError(f"No images in {pattern}")
+        try:
+            from PIL import Image
+        except ImportError:
+            raise RuntimeError("Image sequences need Pillow (pip install pillow)") from None
+        self.image = Image
+        self.fps = fps
+        self.index = 0
+
+    def read(self):
+        with self.image.open(self.paths[self.index]) as image:
+            frame = np.asarray(image.convert("RGB"))
+        self.index = (self.index + 1) % len(self.paths)
+        return frame
+
+
+class VideoSource(FrameSource):
+    """Frames of a video file, looped"""
+
+    def __init__(self, path):
+        try:
+            import cv2
+        except ImportError:
+            raise RuntimeError("Video files need OpenCV (pip install opencv-python)") from None
+        self.cv2 = cv2
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video {path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+
+    def read(self):
+        ok, frame = self.capture.read()
+        if not ok:
+            self.capture.set(self.cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+            if not ok:
+                return None
+        return frame[:, :, ::-1]  # BGR to RGB as a view
+
+    def close(self):
+        self.capture.release()
+
+
+class ScreenSource(FrameSource):
+    """Grabs of one monitor (1 is the primary)"""
+    realtime = False
+
+    def __init__(self, monitor="1"):
+        self.fps = MAX_SCREEN_FPS
+        self.mss_module = None
+        self.mss = None  # Made by the first read(): mss handles only work on the thread that made them
+        self.monitor_index = int(monitor or 1)
+        self.image_grab = None
+        try:
+            import mss
+            self.mss_module = mss
+        except ImportError:
+            try:
+                from PIL import ImageGrab
+            except ImportError:
+                raise RuntimeError("Screen capture needs mss or Pillow (pip install mss)") from None
+            self.image_grab = ImageGrab
+        self.next_grab = 0.0
+
+    def read(self):
+        wait = self.next_grab - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        self.next_grab = time.perf_counter() + 1.0 / self.fps
+        if self.mss_module is not None:
+            if self.mss is None:
+                self.mss = self.mss_module.mss()
+                self.monitor = self.mss.monitors[self.monitor_index]
+            shot = self.mss.grab(self.monitor)
+            # BGRA to RGB as a strided view of the grab's own buffer
+            return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)[:, :, 2::-1]
+        return np.asarray(self.image_grab.grab().convert("RGB"))
+
+    def close(self):
+        if self.mss is not None:
+            self.mss.close()
+
+
+# Grabber name -> factory taking the text after "name:" (or "")
+GRABBERS = {"screen": ScreenSource}
+
+
+def register_grabber(name, factory):
+    """Make factory(argument) available as the source spec "name[:argument]" """
+    GRABBERS[name] = factory
+
+
+def open_frame_source(spec):
+    name, _, argument = spec.partition(":")
+    if name in GRABBERS:
+        return GRABBERS[name](argument)
+    if spec.lower().endswith(".npy"):
+        return ArraySource(spec)
+    if os.path.isdir(spec) or glob.has_magic(spec) or spec.lower().endswith(IMAGE_EXTENSIONS):
+        return ImageSequenceSource(spec)
+    if not os.path.exists(spec):
+        raise ValueError(f"No such frame source: {spec}")
+    return VideoSource(spec)
+
+
+def edge_points(count, edge="around"):
+    """Region centers (x, y) in [0, 1] of count LEDs along the frame edges
+
+    "around" starts at the bottom left corner and runs clockwise: up the
+    left side, along the top, down the right side and back along the
+    bottom. Returns the centers and the region length along the edge,
+    as a fraction of that edge.
+    """
+    fraction = (np.arange(count, dtype=np.float32) + 0.5) / max(1, count)
+    points = np.zeros((count, 2), dtype=np.float32)
+    if edge == "top":
+        points[:, 0] = fraction
+        return points, 1.0 / max(1, count)
+    if edge == "bottom":
+        points[:, 0] = fraction
+        points[:, 1] = 1.0
+        return points, 1.0 / max(1, count)
+    if edge == "left":
+        points[:, 1] = 1.0 - fraction
+        return points, 1.0 / max(1, count)
+    if edge == "right":
+        points[:, 0] = 1.0
+        points[:, 1] = fraction
+        return points, 1.0 / max(1, count)
+    side, along = np.divmod(fraction * 4.0, 1.0)
+    points[:, 0] = np.choose(side.astype(np.intp), [0.0, along, 1.0, 1.0 - along])
+    points[:, 1] = np.choose(side.astype(np.intp), [1.0 - along, 0.0, along, 1.0])
+    return points, 4.0 / max(1, count)
+
+
+def layout_points(positions):
+    """Region centers from layout positions, pushed onto the nearest frame edge"""
+    points = np.clip(np.asarray(positions, dtype=np.float32)[:, :2], 0.0, 1.0)
+    distances = np.stack((points[:, 0], 1.0 - points[:, 0], points[:, 1], 1.0 - points[:, 1]), axis=1)
+    nearest = np.argmin(distances, axis=1)
+    rows = np.arange(len(points))
+    points[rows[nearest == 0], 0] = 0.0
+    points[rows[nearest == 1], 0] = 1.0
+    points[rows[nearest == 2], 1] = 0.0
+    points[rows[nearest == 3], 1] = 1.0
+    return points, min(1.0, 4.0 / max(1, len(points)))
+
+
+class RegionMap:
+    """Sample points of every LED's edge region for one frame size
+
+    Each region is length (along its edge) by depth (inward from the
+    edge, a fraction of the smaller side) around its point, sampled on a
+    samples x samples grid. Points are kept as row and column indices
+    and as flat pixel indices, with the weights that average them.
+    """
+
+    def __init__(self, points, length, height, width, depth=DEFAULT_DEPTH, samples=DEFAULT_SAMPLES):
+        points = np.asarray(points, dtype=np.float32)
+        self.shape = (height, width)
+        inward = depth * min(height, width)
+        on_vertical = (points[:, 0] <= 0.0) | (points[:, 0] >= 1.0)
+        # Region size in pixels: along the edge it lies on, and inward from it
+        size_x = np.where(on_vertical, inward, length * width)
+        size_y = np.where(on_vertical, length * height, inward)
+        center_x = np.clip(points[:, 0] * width, size_x / 2, width - size_x / 2)
+        center_y = np.clip(points[:, 1] * height, size_y / 2, height - size_y / 2)
+        grid = (np.arange(samples, dtype=np.float32) + 0.5) / samples - 0.5
+        offset_y, offset_x = np.meshgrid(grid, grid, indexing="ij")
+        rows = center_y[:, None] + size_y[:, None] * offset_y.reshape(1, -1)
+        cols = center_x[:, None] + size_x[:, None] * offset_x.reshape(1, -1)
+        self.rows = np.clip(rows, 0, height - 1).astype(np.intp)
+        self.cols = np.clip(cols, 0, width - 1).astype(np.intp)
+        self.flat = self.rows * width + self.cols
+        self.weights = np.full(samples * samples, 1.0 / (samples * samples), dtype=np.float32)
+
+    def reduce(self, frame):
+        """Mean color of every LED's region as float32 (leds, 3)"""
+        pixels = pixel_view(frame)
+        if pixels is None:
+            samples = frame[self.rows, self.cols]
+        elif pixels.flags.c_contiguous:
+            samples = np.take(pixels, self.flat, axis=0)
+        else:
+            samples = pixels[self.flat]
+        return np.matmul(self.weights, samples.astype(np.float32))
+
+
+def pixel_view(frame):
+    """The frame as (pixels, 3) without copying, or None if its rows are padded
+
+    Works on strided frames too, e.g. RGB views of BGR(A) buffers.
+    """
+    height, width = frame.shape[:2]
+    row_stride, pixel_stride, channel_stride = frame.strides
+    if row_stride != pixel_stride * width:
+        return None
+    return np.lib.stride_tricks.as_strided(frame, (height * width, 3), (pixel_stride, channel_stride),
+                                           writeable=False)
+
+
+class CapturePipeline:
+    """Background reader keeping only the newest frame of a source"""
+
+    def __init__(self, source):
+        self.source = source
+        self.frame = None
+        self.captured_at = 0.0
+        self.frames = 0
+        self.read_time = 0.0  # Seconds the last read took
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="Ambient capture", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        next_frame = time.perf_counter()
+        try:
+            while self.running:
+                started = time.perf_counter()
+                frame = self.source.read()
+                if frame is None:
+                    break
+                self.read_time = time.perf_counter() - started
+                # Publish as one reference swap so readers never see a half update
+                self.frame, self.captured_at = frame, time.perf_counter()
+                self.frames += 1
+                if self.source.realtime:
+                    next_frame = max(next_frame + 1.0 / self.source.fps, time.perf_counter() - 1.0)
+                    wait = next_frame - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+        except Exception as e:
+            print(f"Ambient capture error: {e}")
+        finally:
+            self.running = False
+            self.source.close()
+
+    def stats(self):
+        return {
+            "ambient_frames": self.frames,
+            "ambient_read_ms": self.read_time * 1000,
+            "ambient_age_ms": (time.perf_counter() - self.captured_at) * 1000 if self.captured_at else 0.0,
+        }
+
+
+# One pipeline per source spec, shared by every zone and device using it
+_pipelines = {}
+_users = {}
+_pipelines_lock = threading.Lock()
+
+
+def acquire_capture(spec):
+    """Return a started pipeline for a source spec; pair with release_capture"""
+    with _pipelines_lock:
+        pipeline = _pipelines.get(spec)
+        if pipeline is None or not pipeline.running:
+            pipeline = CapturePipeline(open_frame_source(spec))
+            pipeline.start()
+            _pipelines[spec] = pipeline
+        _users[spec] = _users.get(spec, 0) + 1
+        return pipeline
+
+
+def release_capture(spec):
+    """Drop one user of a pipeline; the last one stops it"""
+    with _pipelines_lock:
+        _users[spec] = _users.get(spec, 0) - 1
+        if _users[spec] <= 0:
+            _users.pop(spec)
+            pipeline = _pipelines.pop(spec, None)
+            if pipeline is not None:
+                pipeline.stop()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Show the edge colors and reduce time of a frame source")
+    parser.add_argument("source", help="screen[:MONITOR], a .npy frame array, an image folder or pattern, or a video")
+    parser.add_argument("--leds", type=int, default=300, help="LEDs placed around the frame")
+    args = parser.parse_args(argv)
+
+    pipeline = CapturePipeline(open_frame_source(args.source))
+    pipeline.start()
+    points, length = edge_points(args.leds)
+    regions = None
+    try:
+        while pipeline.running or pipeline.frame is not None:
+            frame = pipeline.frame
+            if frame is not None:
+                if regions is None or frame.shape[:2] != regions.shape:
+                    regions = RegionMap(points, length, *frame.shape[:2])
+                started = time.perf_counter()
+                colors = regions.reduce(frame)
+                elapsed = time.perf_counter() - started
+                sides = colors.reshape(4, -1, 3).mean(axis=1) if args.leds % 4 == 0 else colors[:1]
+                text = " ".join("#%02x%02x%02x" % tuple(int(c) for c in side) for side in sides)
+                print(f"\r{frame.shape[1]}x{frame.shape[0]} {text} reduce {elapsed * 1000:.2f} ms", end="", flush=True)
+            time.sleep(1 / 30)
+            if not pipeline.running:
+                break
+    except KeyboardInterrupt:
+        pass
+    pipeline.stop()
+    print()
+    print(pipeline.stats())
+
+
+if __name__ == "__main__":
+    main()
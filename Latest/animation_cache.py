@@ -0,0 +1,133 @@
+"""Prerendered loops of deterministic effects.
+
+Effects such as rainbow, breathing, police and color wave show the same
+frames on every loop. The first time one is started for a zone, one full
+period is rendered into a .npy file keyed on the effect, its params and
+the LED positions it is sampled at; after that the file is memory-mapped
+and playback only picks a frame slice per tick, so a looping animation
+costs almost no CPU. Files are kept under ~/.hanyargb/animations and the
+oldest are removed when the cache grows too big.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+from app_paths import get_app_path
+
+# Bump when effect rendering changes so stale loops are not played
+CACHE_VERSION = 2
+# Set to 0 to render every frame live
+CACHE_ENV = "HANYARGB_ANIMATION_CACHE"
+# Loops above this size are rendered live instead (bytes)
+MAX_LOOP_BYTES = 32 * 1024 * 1024
+# Total size the cache directory is trimmed to (bytes)
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def cache_key(effect, params):
+    """Hash of everything the frames of an effect depend on"""
+    step, frames = effect.period()
+    description = json.dumps({
+        "version": CACHE_VERSION,
+        "effect": effect.name,
+        "leds": effect.led_count,
+        "speed": effect.speed,
+        "params": params or {},
+        "period": [step, frames],
+    }, sort_keys=True, default=str)
+    digest = hashlib.sha1(description.encode("utf-8"))
+    # The positions the effect is sampled at (index or layout)
+    digest.update(np.ascontiguousarray(effect.coords, dtype=np.float32).tobytes())
+    return f"{effect.name}-{digest.hexdigest()[:20]}"
+
+
+def loop_path(key):
+    return get_app_path("animations", f"{key}.npy")
+
+
+class BakedEffect:
+    """Plays a memory-mapped loop in place of the effect it was rendered from"""
+
+    def __init__(self, effect, frames, step):
+        self.effect = effect
+        self.frames = frames  # uint8 (frame count, led_count, 3), memory-mapped
+        self.step = step
+        self.name = effect.name
+        self.label = effect.label
+        self.led_count = effect.led_count
+
+    def render(self, t):
+        return self.frames[int(t / self.step) % len(self.frames)]
+
+    def stats(self):
+        return None
+
+
+def bake(effect, path):
+    """Render one period of an effect into a .npy file at path"""
+    step, count = effect.period()
+    tmp_path = path + ".tmp"
+    frames = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(count, effect.led_count, 3))
+    for i in range(count):
+        # Sample mid-frame so rounding can't land on the previous step
+        frames[i] = effect.render((i + 0.5) * step)
+    frames.flush()
+    del frames
+    os.replace(tmp_path, path)
+
+
+def load_loop(effect, params=None):
+    """Memory-mapped loop of an effect, baking it first if needed
+
+    Returns None when the effect doesn't repeat or its loop is too big.
+    """
+    period = effect.period()
+    if period is None or not effect.led_count:
+        return None
+    step, count = period
+    if count * effect.led_count * 3 > MAX_LOOP_BYTES:
+        return None
+    path = loop_path(cache_key(effect, params))
+    if not os.path.exists(path):
+        bake(effect, path)
+        prune()
+    frames = np.load(path, mmap_mode="r")
+    if frames.shape != (count, effect.led_count, 3):
+        os.remove(path)
+        return None
+    return BakedEffect(effect, frames, step)
+
+
+def cached_effect(effect, params=None):
+    """The effect itself, or a BakedEffect playing its prerendered loop"""
+    if effect is None:
+        return None
+    try:
+        return load_loop(effect, params) or effect
+    except (OSError, ValueError) as e:
+        print(f"Error caching {effect.name} animation: {e}")
+        return effect
+
+
+def prune(max_bytes=MAX_CACHE_BYTES):
+    """Delete the least recently written loops until the cache fits max_bytes"""
+    directory = os.path.dirname(loop_path("x"))
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(".npy"):
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def cache_enabled():
+    return os.environ.get(CACHE_ENV, "1") != "0"
@@ -0,0 +1,468 @@
+"""Local control API for scripts and monitoring tools.
+
+A small HTTP server running on asyncio in its own thread, on a loopback
+port or a Unix socket:
+
+    POST /commands   {"commands": [COMMAND, ...]} (or one COMMAND, or a list)
+    GET  /devices    devices with their zones and LED counts
+    GET  /stats      request counts and latency percentiles
+
+A COMMAND is one of
+
+    {"action": "color", "device": "all", "color": "#ff0000", "zone": "0", "leds": "0-9"}
+    {"action": "off", "device": "all"}
+    {"action": "flash", "device": "case", "color": "red", "duration": 1.0, "pulses": 3}
+    {"action": "effect", "device": "0", "effect": "rainbow", "params": {}}
+    {"action": "stop", "device": "0"}
+    {"action": "profile", "name": "default"}
+
+with devices, zones, colors and LED ranges written as for cli.py. The
+server never touches devices itself: requests arriving within
+COALESCE_WINDOW of each other, or while the previous batch is still
+being applied, are merged into one batch in which a command replaces
+earlier ones on the same target, and the batch is handed to whoever owns
+the devices (the Tk loop or the headless engine loop) through a
+CommandQueue. Colors of a batch go out in one write. Every response
+says how many of the request's commands were applied, how many a later
+command replaced, and how many requests shared its batch.
+This module must never import customtkinter.
+"""
+import os
+import json
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from latency_metrics import LatencyHistogram
+from profile_store import ProfileStore, device_key
+from global_ops import apply_profile_all, base_colors
+from cli import Session, parse_color, parse_range, find_devices, resolve_effect, describe_devices
+
+# Set to an address (PORT, HOST:PORT or unix:PATH) to serve the API from the GUI
+API_ENV = "HANYARGB_API"
+# Port used when an address gives none (OpenRGB itself is on 6742)
+DEFAULT_API_PORT = 6743
+# Requests this close together are applied as one batch (seconds)
+COALESCE_WINDOW = 0.002
+# Largest request body accepted (bytes)
+MAX_BODY = 1024 * 1024
+# How long a request waits for the device owner to apply it (seconds)
+APPLY_TIMEOUT = 5.0
+# Every action a command may have
+ACTIONS = ("color", "off", "flash", "effect", "stop", "profile")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+def parse_address(text):
+    """PORT, HOST:PORT or unix:PATH -> ("tcp", host, port) or ("unix", path)"""
+    text = (text or "").strip()
+    if text.startswith("unix:"):
+        return ("unix", text[len("unix:"):])
+    host, _, port = text.rpartition(":")
+    if not host and not port.isdigit():
+        host, port = port, ""
+    return ("tcp", host or "127.0.0.1", int(port) if port else DEFAULT_API_PORT)
+
+
+def parse_command(data):
+    """Check a command from a request and normalize it, raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError("A command must be a JSON object")
+    action = data.get("action")
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action} (one of {', '.join(ACTIONS)})")
+    command = {"action": action}
+    if action == "profile":
+        command["name"] = str(data.get("name", "default"))
+        return command
+    command["device"] = str(data.get("device", "all"))
+    if action == "color":
+        command["color"] = parse_api_color(data.get("color"))
+        command["zone"] = None if data.get("zone") is None else str(data["zone"])
+        command["leds"] = parse_range(str(data["leds"])) if data.get("leds") is not None else None
+    elif action == "flash":
+        command["color"] = parse_api_color(data.get("color", "red"))
+        command["duration"] = float(data.get("duration", 1.0))
+        command["pulses"] = int(data.get("pulses", 3))
+    elif action == "effect":
+        command["effect"] = resolve_effect(str(data.get("effect", "")))
+        command["params"] = data.get("params") or None
+    return command
+
+
+def parse_api_color(value):
+    if isinstance(value, (list, tuple)) and len(value) == 3:
+        value = ",".join(str(channel) for channel in value)
+    return parse_color(str(value))
+
+
+def target(command):
+    """What a command acts on; a later command on the same target replaces it"""
+    action = command["action"]
+    if action == "flash":
+        return ("flash", command["device"])
+    if action == "color":
+        return ("leds", command["device"], command["zone"], command["leds"])
+    return ("leds", command["device"], None, None)
+
+
+def coalesce(commands):
+    """Drop commands a later one in the batch replaces
+
+    commands are (owner, command) pairs; a profile replaces everything
+    before it.
+    """
+    kept = []
+    seen = set()
+    for owner, command in reversed(commands):
+        if command["action"] == "profile":
+            kept.append((owner, command))
+            break
+        key = target(command)
+        if key not in seen:
+            seen.add(key)
+            kept.append((owner, command))
+    kept.reverse()
+    return kept
+
+
+class CommandQueue:
+    """Batches waiting for the thread that owns the devices
+
+    post() may be called from any thread; the owner calls drain() from
+    its own loop, so commands run on the same thread as its UI or
+    engine calls.
+    """
+
+    def __init__(self):
+        self.items = queue.SimpleQueue()
+        self.posted = threading.Event()
+
+    def post(self, batch):
+        future = Future()
+        self.items.put((batch, future, time.perf_counter()))
+        self.posted.set()
+        return future
+
+    def wait(self, timeout):
+        """Wait up to timeout for a batch to be posted"""
+        self.posted.wait(timeout)
+        self.posted.clear()
+
+    def drain(self, apply):
+        """Run apply(batch) for every waiting batch"""
+        while True:
+            try:
+                batch, future, posted = self.items.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            try:
+                result = apply(batch)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result((result, started - posted, time.perf_counter() - started))
+
+
+class ApiHandler:
+    """Applies command batches to the devices, on the thread that owns them
+
+    engine is an in-process EffectEngine (keyed by device key) or the
+    EffectEngineProcess handle (keyed by device object).
+    """
+
+    def __init__(self, client, engine=None, keyed=False):
+        self.client = client
+        self.engine = engine
+        self.keyed = keyed
+
+    def engine_target(self, device):
+        return device_key(device) if self.keyed else device
+
+    def stop_effects(self, device_spec, devices, stopped):
+        """Stop effects on devices about to get static colors, once per batch"""
+        if self.engine is None or "all" in stopped:
+            return
+        if device_spec.lower() == "all":
+            self.engine.stop_all()
+            stopped.add("all")
+            return
+        for device in devices:
+            if device not in stopped:
+                self.engine.stop_effect(self.engine_target(device))
+                stopped.add(device)
+
+    def apply(self, commands):
+        """Run every command, returns an error message or None per command"""
+        session = Session(self.client)
+        stopped = set()
+        errors = []
+        for command in commands:
+            try:
+                self.run(session, command, stopped)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        session.flush()
+        return errors
+
+    def run(self, session, command, stopped):
+        action = command["action"]
+        if action in ("color", "off"):
+            devices = find_devices(self.client, command["device"])
+            self.stop_effects(command["device"], devices, stopped)
+            if action == "off":
+                session.set_color(command["device"], (0, 0, 0))
+            else:
+                session.set_color(command["device"], command["color"], command["zone"], command["leds"])
+            return
+        # Colors set so far must land before the engine takes the devices over
+        session.flush()
+        stopped.clear()
+        if action == "profile":
+            store = ProfileStore(command["name"])
+            if not store.profiles:
+                raise ValueError(f"No saved profile '{command['name']}'")
+            if self.engine is not None:
+                self.engine.stop_all()
+            apply_profile_all(self.client, store)
+            return
+        devices = find_devices(self.client, command["device"])
+        if self.engine is None:
+            raise ValueError("Effects need the effect engine")
+        if action == "effect" and command["device"].lower() == "all":
+            # One engine command, so every device starts on the same clock
+            self.engine.start_effect_all(command["effect"], command["params"], base_colors(self.client.devices))
+            return
+        for device in devices:
+            if action == "flash":
+                self.engine.flash(self.engine_target(device), command["color"], command["duration"],
+                                  command["pulses"])
+            elif action == "effect":
+                self.engine.start_effect(self.engine_target(device), command["effect"],
+                                         params=command["params"])
+            elif action == "stop":
+                self.engine.stop_effect(self.engine_target(device))
+
+    def devices(self):
+        return describe_devices(self.client)
+
+
+class ApiServer:
+    """HTTP control API served from a background asyncio loop"""
+
+    def __init__(self, handler, address=None):
+        self.handler = handler
+        self.address = parse_address(address)
+        self.commands = CommandQueue()
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.last_error = ""
+        self.waiting = []  # (owner future, commands) not yet sent to the owner
+        self.flushing = False
+        # Touched only from the asyncio thread, so they need no lock
+        self.requests = 0
+        self.batches = 0
+        self.dropped = 0  # Commands replaced by a later one in their batch
+        self.latency = {"request": LatencyHistogram(), "queue": LatencyHistogram(), "apply": LatencyHistogram()}
+
+    @property
+    def url(self):
+        if self.address[0] == "unix":
+            return f"unix:{self.address[1]}"
+        return f"http://{self.address[1]}:{self.address[2]}"
+
+    def start(self):
+        """Start serving; returns False if the address could not be bound"""
+        self.thread = threading.Thread(target=self._run, name="HanyaRGB API", daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        return self.server is not None
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            if self.address[0] == "unix":
+                path = self.address[1]
+                if os.path.exists(path):
+                    os.remove(path)  # Left over from a run that didn't shut down
+                self.server = self.loop.run_until_complete(asyncio.start_unix_server(self._serve, path))
+            else:
+                _, host, port = self.address
+                self.server = self.loop.run_until_complete(asyncio.start_server(self._serve, host, port))
+        except (OSError, ValueError) as e:
+            self.last_error = f"Could not start the API on {self.url}: {e}"
+            print(self.last_error)
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+            if self.address[0] == "unix" and os.path.exists(self.address[1]):
+                os.remove(self.address[1])
+
+    def drain(self):
+        """Apply waiting batches; call from the thread that owns the devices"""
+        self.commands.drain(self._apply)
+
+    def _apply(self, batch):
+        if batch == "devices":
+            return self.handler.devices()
+        return self.handler.apply(batch)
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": f"Body over {MAX_BODY} bytes"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+                received = time.perf_counter()
+                status, payload = await self._dispatch(method, path.split("?", 1)[0], body)
+                elapsed = time.perf_counter() - received
+                self.requests += 1
+                self.latency["request"].record(elapsed)
+                payload["latency_ms"] = round(elapsed * 1000, 3)
+                await self._respond(writer, status, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+    async def _dispatch(self, method, path, body):
+        if path == "/stats":
+            return 200, self.stats()
+        if path == "/devices":
+            if method != "GET":
+                return 405, {"error": "Use GET"}
+            try:
+                devices, _, _ = await self._owner(self.commands.post("devices"))
+            except Exception as e:
+                return 503, {"error": str(e)}
+            return 200, {"devices": devices}
+        if path != "/commands":
+            return 404, {"error": f"No such endpoint: {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+        try:
+            data = json.loads(body or b"null")
+            if isinstance(data, dict) and "commands" in data:
+                data = data["commands"]
+            commands = [parse_command(item) for item in (data if isinstance(data, list) else [data])]
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        future = self.loop.create_future()
+        self.waiting.append((future, commands))
+        if not self.flushing:
+            self.flushing = True
+            self.loop.create_task(self._flush())
+        try:
+            errors, shared = await future
+        except Exception as e:
+            return 503, {"error": str(e)}
+        # errors has one entry per command that ran; the rest were replaced
+        payload = {
+            "applied": sum(1 for error in errors if not error),
+            "replaced": len(commands) - len(errors),
+            "batched_requests": shared,
+        }
+        if any(errors):
+            payload["errors"] = [error for error in errors if error]
+        return 200, payload
+
+    async def _owner(self, future):
+        """Wait for the device owner to run a posted batch"""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), APPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Not applied within {APPLY_TIMEOUT:.0f}s; is the app busy?") from None
+
+    async def _flush(self):
+        """Send waiting requests to the owner as one batch, until none are left"""
+        try:
+            await asyncio.sleep(COALESCE_WINDOW)
+            while self.waiting:
+                waiting, self.waiting = self.waiting, []
+                commands = [(owner, command) for owner, (_, request) in enumerate(waiting) for command in request]
+                batch = coalesce(commands)
+                self.dropped += len(commands) - len(batch)
+                self.batches += 1
+                try:
+                    errors, queued, applied = await self._owner(self.commands.post([command for _, command in batch]))
+                except Exception as e:
+                    for future, _ in waiting:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.latency["queue"].record(queued)
+                self.latency["apply"].record(applied)
+                per_request = [[] for _ in waiting]
+                for (owner, _), error in zip(batch, errors):
+                    per_request[owner].append(error)
+                for (future, _), request_errors in zip(waiting, per_request):
+                    if not future.done():
+                        future.set_result((request_errors, len(waiting)))
+        finally:
+            self.flushing = False
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "replaced_commands": self.dropped,
+            "latency": {
+                name: {"p50_ms": histogram.percentile(50) * 1000, "p99_ms": histogram.percentile(99) * 1000}
+                for name, histogram in self.latency.items()
+            },
+        }
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+
+def api_from_env(handler):
+    """Start an ApiServer when HANYARGB_API is set, else return None"""
+    address = os.environ.get(API_ENV)
+    if not address or address == "0":
+        return None
+    server = ApiServer(handler, None if address == "1" else address)
+    if not server.start():
+        return None
+    print(f"Control API listening on {server.url}")
+    return server
@@ -0,0 +1,18 @@
+import os
+
+# Directory used for profiles and other per-user data
+APP_DIR_NAME = ".hanyargb"
+
+
+def get_app_dir():
+    """Return the per-user data directory, creating it if needed"""
+    base_dir = os.environ.get("HANYARGB_HOME") or os.path.join(os.path.expanduser("~"), APP_DIR_NAME)
+    os.makedirs(base_dir, exist_ok=True)
+    return base_dir
+
+
+def get_app_path(*parts):
+    """Return a path inside the data directory, creating parent folders"""
+    path = os.path.join(get_app_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
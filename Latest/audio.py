@@ -0,0 +1,366 @@
+"""Streaming audio analysis for the music visualizer.
+
+Sources deliver mono float blocks; the pipeline runs a windowed real FFT
+per block, bins it into log-spaced bands with attack/decay smoothing and
+keeps only the newest result, so the delay from sample to LED stays
+bounded by one block plus one frame.
+
+Test from a file or stdin:
+    python audio.py song.wav
+    some_decoder | python audio.py - --rate 44100
+"""
+import sys
+import time
+import wave
+import queue
+import threading
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 1024
+DEFAULT_BANDS = 16
+# Longest a live read waits for a block, so a stopped pipeline's reader notices (seconds)
+READ_TIMEOUT = 0.1
+
+
+def pcm_to_float(data, sample_width, channels):
+    """Decode interleaved PCM bytes into a mono float32 array in [-1, 1]"""
+    if sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        samples = padded.view("<i4").ravel().astype(np.float32) / 2147483648.0
+    elif sample_width == 4:
+        samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+class AudioSource:
+    """Base class of audio sources
+
+    read(frames) returns mono float32, an empty block if nothing arrived
+    in time, or None at the end. close() is called by the thread reading.
+    """
+    sample_rate = 44100
+
+    def read(self, frames):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WavSource(AudioSource):
+    """Stream a WAV file, paced in real time unless realtime is False"""
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.wav = wave.open(path, "rb")
+        self.sample_rate = self.wav.getframerate()
+        self.channels = self.wav.getnchannels()
+        self.sample_width = self.wav.getsampwidth()
+        self.started = None
+        self.frames_read = 0
+
+    def read(self, frames):
+        data = self.wav.readframes(frames)
+        if not data and self.loop:
+            self.wav.rewind()
+            data = self.wav.readframes(frames)
+        if not data:
+            return None
+        samples = pcm_to_float(data, self.sample_width, self.channels)
+        if self.realtime:
+            # Don't deliver samples before they would have been played
+            if self.started is None:
+                self.started = time.perf_counter()
+            self.frames_read += len(samples)
+            due = self.started + self.frames_read / self.sample_rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return samples
+
+    def close(self):
+        self.wav.close()
+
+
+class PCMStreamSource(AudioSource):
+    """Raw little-endian PCM from a binary stream such as stdin"""
+
+    def __init__(self, stream=None, sample_rate=44100, channels=1, sample_width=2):
+        self.stream = stream or sys.stdin.buffer
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+
+    def read(self, frames):
+        frame_bytes = self.channels * self.sample_width
+        data = self.stream.read(frames * frame_bytes)
+        if not data:
+            return None
+        data = data[:len(data) - len(data) % frame_bytes]
+        return pcm_to_float(data, self.sample_width, self.channels)
+
+
+# Live capture backends by name: factory(sample_rate, block_size) -> AudioSource
+CAPTURE_BACKENDS = {}
+
+
+def register_capture_backend(name, factory):
+    """Register a live capture backend usable as source="live:<name>\""""
+    CAPTURE_BACKENDS[name] = factory
+
+
+class SoundDeviceSource(AudioSource):
+    """Live capture from the default input device through sounddevice"""
+
+    def __init__(self, sample_rate=44100, block_size=DEFAULT_BLOCK_SIZE):
+        import sounddevice  # Optional dependency, only needed for live capture
+        self.sample_rate = sample_rate
+        self.blocks = queue.Queue(maxsize=8)
+        self.stream = sounddevice.InputStream(
+            samplerate=sample_rate,
+            blocksize=block_size,
+            channels=1,
+            dtype="float32",
+            callback=self._callback
+        )
+        self.stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        try:
+            self.blocks.put_nowait(indata[:, 0].copy())
+        except queue.Full:
+            pass  # Analysis is behind; dropping keeps latency bounded
+
+    def read(self, frames):
+        try:
+            return self.blocks.get(timeout=READ_TIMEOUT)
+        except queue.Empty:
+            return np.zeros(0, dtype=np.float32)
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+register_capture_backend("sounddevice", SoundDeviceSource)
+
+
+def open_source(spec, block_size=DEFAULT_BLOCK_SIZE):
+    """Open a source from a spec: "live", "live:<backend>", "-" (stdin) or a WAV path"""
+    if spec == "-":
+        return PCMStreamSource()
+    if spec.startswith("live"):
+        backend = spec.partition(":")[2] or "sounddevice"
+        if backend not in CAPTURE_BACKENDS:
+            raise ValueError(f"Unknown capture backend: {backend}")
+        return CAPTURE_BACKENDS[backend](block_size=block_size)
+    return WavSource(spec, loop=True)
+
+
+class SpectrumAnalyzer:
+    """Windowed real FFT binned into smoothed, log-spaced bands"""
+
+    def __init__(self, sample_rate, block_size=DEFAULT_BLOCK_SIZE, bands=DEFAULT_BANDS,
+                 min_freq=40.0, max_freq=16000.0, attack=0.6, decay=0.15, floor_db=-60.0):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.window = np.hanning(block_size).astype(np.float32)
+        self.attack = attack
+        self.decay = decay
+        self.floor_db = floor_db
+
+        # Band edges as FFT bin indices, at least one bin per band
+        max_freq = min(max_freq, sample_rate / 2)
+        edges = np.geomspace(min_freq, max_freq, bands + 1)
+        bins = np.round(edges * block_size / sample_rate).astype(np.int64)
+        bins = np.clip(bins, 1, block_size // 2)
+        for i in range(1, len(bins)):
+            bins[i] = max(bins[i], bins[i - 1] + 1)
+        self.band_starts = bins[:-1]
+        self.band_widths = np.diff(bins).astype(np.float32)
+        self.last_bin = int(bins[-1])
+        self.levels = np.zeros(bands, dtype=np.float32)
+        self.peak = 1e-6
+
+    def process(self, block):
+        """Analyze one block of samples, returns band levels in [0, 1]"""
+        if len(block) < self.block_size:
+            block = np.pad(block, (0, self.block_size - len(block)))
+        spectrum = np.abs(np.fft.rfft(block[:self.block_size] * self.window))
+        power = spectrum[:self.last_bin] ** 2
+        energy = np.add.reduceat(power, self.band_starts) / self.band_widths
+        db = 10.0 * np.log10(energy + 1e-12)
+
+        # Normalize against a slowly decaying peak so quiet music still moves
+        self.peak = max(self.peak * 0.995, float(db.max()))
+        levels = np.clip((db - (self.peak + self.floor_db)) / -self.floor_db, 0.0, 1.0)
+
+        rising = levels > self.levels
+        rate = np.where(rising, self.attack, self.decay)
+        self.levels += (levels - self.levels) * rate
+        return self.levels
+
+
+class AudioPipeline:
+    """Background reader and analyzer that keeps only the newest band levels"""
+
+    def __init__(self, source, block_size=DEFAULT_BLOCK_SIZE, bands=DEFAULT_BANDS, max_latency=0.1):
+        self.source = source
+        self.block_size = block_size
+        self.analyzer = SpectrumAnalyzer(source.sample_rate, block_size, bands)
+        self.max_latency = max_latency
+        self.levels = np.zeros(bands, dtype=np.float32)
+        self.captured_at = 0.0  # When the newest analyzed block was complete
+        self.running = False
+        self.thread = None
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+        self.latency_count = 0
+        self.late_frames = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop reading; the reader thread closes the source when it exits"""
+        self.running = False
+        if self.thread is None:
+            self.source.close()
+
+    def _run(self):
+        try:
+            while self.running:
+                block = self.source.read(self.block_size)
+                if block is None:
+                    break
+                if not len(block):
+                    continue  # Nothing captured yet; look at running again
+                captured_at = time.perf_counter()
+                levels = self.analyzer.process(block).copy()
+                # Publish as one reference swap so readers never see a half update
+                self.levels, self.captured_at = levels, captured_at
+        except Exception as e:
+            print(f"Audio pipeline error: {e}")
+        finally:
+            self.running = False
+            try:
+                self.source.close()
+            except Exception as e:
+                print(f"Error closing audio source: {e}")
+
+    def read(self):
+        """Return the newest band levels and record sample-to-output latency"""
+        levels, captured_at = self.levels, self.captured_at
+        if captured_at:
+            latency = time.perf_counter() - captured_at
+            self.latency_last = latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latency_total += latency
+            self.latency_count += 1
+            if latency > self.max_latency:
+                self.late_frames += 1
+        return levels
+
+    def stats(self):
+        """Latency report in milliseconds"""
+        mean = self.latency_total / self.latency_count if self.latency_count else 0.0
+        block_ms = 1000.0 * self.block_size / self.analyzer.sample_rate
+        return {
+            "audio_latency_ms": self.latency_last * 1000,
+            "audio_latency_mean_ms": mean * 1000,
+            "audio_latency_max_ms": self.latency_max * 1000,
+            "audio_block_ms": block_ms,
+            "audio_late_frames": self.late_frames,
+        }
+
+
+# One pipeline per source spec and band count, shared by every zone and
+# device using it
+_pipelines = {}
+_users = {}
+_pipelines_lock = threading.Lock()
+
+
+def acquire_pipeline(spec, block_size=DEFAULT_BLOCK_SIZE, bands=DEFAULT_BANDS):
+    """Return a started pipeline for a source spec; pair with release_pipeline"""
+    key = (spec, bands)
+    with _pipelines_lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is None or not pipeline.running:
+            pipeline = AudioPipeline(open_source(spec, block_size), block_size, bands)
+            pipeline.start()
+            _pipelines[key] = pipeline
+        _users[key] = _users.get(key, 0) + 1
+        return pipeline
+
+
+def release_pipeline(spec, bands=DEFAULT_BANDS):
+    """Drop one user of a pipeline; the last one stops it and closes the source"""
+    key = (spec, bands)
+    with _pipelines_lock:
+        _users[key] = _users.get(key, 0) - 1
+        if _users[key] <= 0:
+            _users.pop(key)
+            pipeline = _pipelines.pop(key, None)
+            if pipeline is not None:
+                pipeline.stop()
+
+
+def map_bands_to_leds(levels, led_count):
+    """Spread band levels over a zone with linear interpolation"""
+    if led_count == 1:
+        return np.array([levels.max()], dtype=np.float32)
+    band_positions = np.linspace(0.0, 1.0, len(levels))
+    led_positions = np.linspace(0.0, 1.0, led_count)
+    return np.interp(led_positions, band_positions, levels).astype(np.float32)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Print band levels of a WAV file, stdin PCM or live input")
+    parser.add_argument("source", help="WAV path, '-' for raw 16-bit PCM on stdin, or 'live'")
+    parser.add_argument("--rate", type=int, default=44100, help="Sample rate of stdin PCM")
+    parser.add_argument("--channels", type=int, default=1, help="Channels of stdin PCM")
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS)
+    args = parser.parse_args(argv)
+
+    if args.source == "-":
+        source = PCMStreamSource(sample_rate=args.rate, channels=args.channels)
+    else:
+        source = open_source(args.source)
+        if isinstance(source, WavSource):
+            source.loop = False
+    pipeline = AudioPipeline(source, bands=args.bands)
+    pipeline.start()
+    bars = " .:-=+*#%@"
+    try:
+        while pipeline.running:
+            levels = pipeline.read()
+            line = "".join(bars[min(len(bars) - 1, int(level * len(bars)))] for level in levels)
+            print(f"\r{line} {pipeline.latency_last * 1000:5.1f} ms", end="", flush=True)
+            time.sleep(1 / 30)
+    except KeyboardInterrupt:
+        pass
+    print()
+    print(pipeline.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Per-device color calibration applied on the way out to the hardware.
+
+The same RGB value looks different on RAM, fans and strips: LEDs have
+different tints, brightness curves and current limits. Each device can
+have a gamma (perceived brightness), a white point (what full white
+should be sent as) and a max current (a cap on how hard each channel is
+driven). They are baked into one uint8 lookup table per channel, so a
+frame is calibrated with a single indexing pass over its RGBx bytes.
+
+Colors everywhere else (sliders, layers, cached LED colors, profiles)
+stay uncalibrated; only the bytes put on the wire go through the tables.
+Colors read from the server are what an earlier write put on the wire,
+so read_back() runs them through the inverse tables to get the
+uncalibrated colors again.
+"""
+import os
+import json
+import time
+from app_paths import get_app_path
+from profile_store import device_key
+from led_packets import device_colors_to_bytes, sync_cached_colors
+
+# The calibration is hand-editable JSON in the data directory:
+#   {"version": 1,
+#    "default": {"gamma": 2.2},
+#    "devices": [{"name": ..., "location": ..., "serial": ...,
+#                 "gamma": 2.2 or [r, g, b],
+#                 "white": [r, g, b],
+#                 "max_current": 0.8 or [r, g, b]}]}
+# "default" applies to devices without an entry of their own. Missing
+# settings are neutral: gamma 1, white (255, 255, 255), max current 1.
+CALIBRATION_VERSION = 1
+CALIBRATION_FILE = "calibration.json"
+SETTINGS = ("gamma", "white", "max_current")
+NEUTRAL = {"gamma": 1.0, "white": (255, 255, 255), "max_current": 1.0}
+# Gamma values accepted, wide enough for any real LED curve
+GAMMA_RANGE = (0.2, 5.0)
+# Start of each RGBx byte's row in a flattened (4, 256) table
+ROW_OFFSETS = (0, 256, 512, 768)
+# How often the shared calibration looks for changes to the file (seconds)
+CHECK_INTERVAL = 1.0
+
+
+def get_calibration_path():
+    return get_app_path(CALIBRATION_FILE)
+
+
+def channels(value):
+    """Three per-channel floats from one number or an (r, g, b) triple"""
+    if isinstance(value, (int, float)):
+        return (float(value),) * 3
+    values = tuple(float(v) for v in value)
+    if len(values) != 3:
+        raise ValueError(f"Expected one value or three (r, g, b), got {len(values)}")
+    return values
+
+
+def check_settings(settings):
+    """Validated copy of a calibration entry with only the known settings"""
+    checked = {}
+    for name in SETTINGS:
+        if settings.get(name) is None:
+            continue
+        values = channels(settings[name])
+        if name == "gamma" and not all(GAMMA_RANGE[0] <= v <= GAMMA_RANGE[1] for v in values):
+            raise ValueError(f"Gamma must be between {GAMMA_RANGE[0]} and {GAMMA_RANGE[1]}")
+        if name == "white" and not all(0 <= v <= 255 for v in values):
+            raise ValueError("White point channels must be between 0 and 255")
+        if name == "max_current" and not all(0 <= v <= 1 for v in values):
+            raise ValueError("Max current must be between 0 and 1")
+        checked[name] = settings[name] if isinstance(settings[name], (int, float)) else \
+            [int(v) if v.is_integer() else v for v in values]
+    return checked
+
+
+def is_neutral(settings):
+    return all(channels(settings.get(name, NEUTRAL[name])) == channels(NEUTRAL[name]) for name in SETTINGS)
+
+
+def calibration_lut(gamma=1.0, white=(255, 255, 255), max_current=1.0):
+    """uint8 (4, 256) table, one row per RGBx byte of the wire format
+
+    Row c maps a requested level v of channel c to
+    255 * (v / 255) ** gamma * white / 255 * max_current.
+    The padding row maps everything to 0.
+    """
+    import numpy as np  # Loaded on first use so the CLI starts without it
+    levels = np.arange(256, dtype=np.float64) / 255.0
+    scale = np.array(channels(white)) / 255.0 * np.array(channels(max_current))
+    lut = np.zeros((4, 256), dtype=np.uint8)
+    for channel, power in enumerate(channels(gamma)):
+        lut[channel] = np.rint(255.0 * levels ** power * scale[channel])
+    return lut
+
+
+def apply_lut(lut, colors):
+    """Calibrated copy of RGBx colors (bytes or a uint8 (n, 4) array) as bytes"""
+    import numpy as np
+    frame = np.frombuffer(colors, dtype=np.uint8).reshape(-1, 4)
+    # Offsetting each byte by its row start turns the table into one flat
+    # array, so the whole frame is one gather (about twice as fast as
+    # indexing rows and columns)
+    return np.take(lut.reshape(-1), frame + np.array(ROW_OFFSETS, dtype=np.uint16)).tobytes()
+
+
+def inverse_lut(lut):
+    """Table mapping each wire level back to the requested level nearest to it
+
+    Gamma squeezes several dark levels onto the same wire level, so the
+    round trip is exact for everything the table can tell apart.
+    """
+    import numpy as np
+    levels = np.arange(256)
+    inverse = np.zeros((4, 256), dtype=np.uint8)
+    for channel in range(3):
+        row = lut[channel].astype(np.int16)  # Rows only ever increase
+        above = np.minimum(np.searchsorted(row, levels), 255)
+        below = np.maximum(above - 1, 0)
+        nearer_below = np.abs(row[below] - levels) < np.abs(row[above] - levels)
+        inverse[channel] = np.where(nearer_below, below, above)
+    return inverse
+
+
+class Calibration:
+    """Calibration settings of every device, with their lookup tables
+
+    lut(device) returns the table of a device, or None when it needs no
+    calibration so callers can skip the pass. Tables are built once per
+    device and reused every frame. generation goes up whenever settings
+    change, so holders of tables know to fetch them again.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_calibration_path()
+        self.default = {}
+        self.devices = {}  # key -> settings
+        self.cache = {}
+        self.inverse_cache = {}
+        self.mtime = None  # Modification time of the file as last loaded or saved
+        self.generation = 0
+
+    def file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self):
+        """Whether the file was written by someone else since it was loaded"""
+        return self.file_mtime() != self.mtime
+
+    def load(self):
+        """Load the calibration file, leaving every device neutral if it is missing"""
+        self.default = {}
+        self.devices = {}
+        self.forget()
+        self.mtime = self.file_mtime()
+        if self.mtime is None:
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.default = check_settings(data.get("default") or {})
+            for entry in data.get("devices", []):
+                key = (entry.get("name", ""), entry.get("location", ""), entry.get("serial", ""))
+                self.devices[key] = check_settings(entry)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error loading calibration {self.path}: {e}")
+        return self
+
+    def save(self):
+        """Write the calibration file atomically"""
+        data = {
+            "version": CALIBRATION_VERSION,
+            "default": self.default,
+            "devices": [
+                {"name": key[0], "location": key[1], "serial": key[2], **settings}
+                for key, settings in self.devices.items()
+            ],
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self.mtime = self.file_mtime()
+        except OSError as e:
+            print(f"Error saving calibration {self.path}: {e}")
+
+    def forget(self, key=None):
+        """Drop the tables of one device, or of all of them"""
+        if key is None:
+            self.cache = {}
+            self.inverse_cache = {}
+        else:
+            self.cache.pop(key, None)
+            self.inverse_cache.pop(key, None)
+        self.generation += 1
+
+    def settings(self, device):
+        """Calibration settings in effect for a device"""
+        return dict(self.devices.get(device_key(device), self.default))
+
+    def set_device(self, device, **settings):
+        """Change some settings of a device; None resets a setting"""
+        current = self.settings(device)
+        current.update(settings)
+        self.devices[device_key(device)] = check_settings(current)
+        self.forget(device_key(device))
+
+    def reset_device(self, device):
+        """Drop the settings of a device so it uses the default again"""
+        self.devices.pop(device_key(device), None)
+        self.forget(device_key(device))
+
+    def lut(self, device):
+        key = device_key(device)
+        if key not in self.cache:
+            settings = self.settings(device)
+            self.cache[key] = None if is_neutral(settings) else calibration_lut(
+                **{name: settings.get(name, NEUTRAL[name]) for name in SETTINGS})
+        return self.cache[key]
+
+    def inverse(self, device):
+        """Inverse of lut(device), or None when it needs no calibration"""
+        key = device_key(device)
+        if key not in self.inverse_cache:
+            lut = self.lut(device)
+            self.inverse_cache[key] = None if lut is None else inverse_lut(lut)
+        return self.inverse_cache[key]
+
+    def apply(self, device, colors):
+        """RGBx bytes of a device as they should go on the wire"""
+        lut = self.lut(device)
+        return colors if lut is None else apply_lut(lut, colors)
+
+    def read_back(self, device):
+        """Turn the cached LED colors of a device, as read from the server, back into requested colors"""
+        inverse = self.inverse(device)
+        if inverse is not None:
+            sync_cached_colors(device, apply_lut(inverse, device_colors_to_bytes(device)))
+
+
+# One calibration per process, shared by every write path
+_calibration = None
+_checked = 0.0
+
+
+def shared_calibration():
+    """The process wide Calibration, loaded on first use
+
+    Reloaded when the file changes (looked at every CHECK_INTERVAL at
+    most), so edits from another process such as the calibrate command of
+    cli.py reach the GUI, the API and the engine alike.
+    """
+    global _calibration, _checked
+    now = time.monotonic()
+    if _calibration is None:
+        _calibration = Calibration().load()
+        _checked = now
+    elif now - _checked >= CHECK_INTERVAL:
+        _checked = now
+        if _calibration.changed():
+            _calibration.load()
+    return _calibration
+
+
+def calibrate(device, colors):
+    """RGBx bytes of a device with its calibration applied"""
+    return shared_calibration().apply(device, colors)
+
+
+def read_back(devices):
+    """Undo the calibration on colors just read from the server
+
+    Call after anything refills the cached LED colors from the server
+    (connecting, device.update()), since those are the calibrated bytes
+    an earlier write sent.
+    """
+    calibration = shared_calibration()
+    for device in devices:
+        calibration.read_back(device)
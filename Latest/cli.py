@@ -0,0 +1,454 @@
+"""Control lighting from the command line.
+
+Usage:
+    python cli.py [--host HOST] [--port PORT] [--start-server] COMMAND ...
+
+Commands:
+    list [--json]                                 devices, zones and LED counts
+    effects                                       effects that can be started
+    set DEVICE COLOR [--zone ZONE] [--leds A-B]   color a device, zone or LED range
+    off [DEVICE]                                  turn LEDs off (all devices by default)
+    profile [NAME] [--effects]                    apply a saved profile
+    effect DEVICE EFFECT [--duration SECONDS]     run an effect until Ctrl+C
+    calibrate DEVICE [--gamma G] [--white COLOR] [--max-current F] [--reset]
+                                                  show or change a device's color calibration
+    batch                                         read commands from stdin, one per line
+
+DEVICE is an index from list, part of a device name, or "all"; ZONE is
+an index or part of a zone name. COLOR is #rrggbb, r,g,b or a color
+name, and LED ranges are inclusive and relative to the zone if one is
+given. A batch may also use "flush" and "sleep SECONDS"; lines starting
+with # are skipped.
+
+Every command of a run shares one connection. Color changes are
+gathered per device and sent as one packet per device in a single
+write, at the end of the run or at flush and sleep, so a script
+touching many devices costs one round over the socket. Effects started
+in a run are played once all commands are done. Only what a command
+needs is imported; this module must never import customtkinter.
+"""
+import sys
+import time
+import json
+import shlex
+import signal
+import argparse
+import threading
+from openrgb import OpenRGBClient
+from led_packets import BYTES_PER_LED, device_colors_to_bytes
+from profile_store import ProfileStore, DEFAULT_PROFILE, device_key
+from global_ops import GlobalResult, flush_device_frames, apply_profile_all
+from calibration import shared_calibration, read_back
+
+# Names accepted as COLOR besides #rrggbb and r,g,b
+COLOR_NAMES = {
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "red": (255, 0, 0),
+    "green": (0, 255, 0),
+    "blue": (0, 0, 255),
+    "yellow": (255, 255, 0),
+    "cyan": (0, 255, 255),
+    "magenta": (255, 0, 255),
+    "orange": (255, 128, 0),
+    "purple": (128, 0, 255),
+    "pink": (255, 64, 160),
+    "warm": (255, 147, 41),
+}
+
+
+def parse_color(text):
+    """#rrggbb, rrggbb, r,g,b or a color name -> (r, g, b)"""
+    value = text.strip().lower()
+    if value in COLOR_NAMES:
+        return COLOR_NAMES[value]
+    if "," in value:
+        parts = value.split(",")
+        if len(parts) == 3 and all(part.strip().isdigit() for part in parts):
+            color = tuple(int(part) for part in parts)
+            if all(0 <= channel <= 255 for channel in color):
+                return color
+    else:
+        value = value.lstrip("#")
+        if len(value) == 6:
+            try:
+                return tuple(bytes.fromhex(value))
+            except ValueError:
+                pass
+    raise ValueError(f"Not a color: {text}")
+
+
+def parse_range(text):
+    """A or A-B (inclusive) -> (start, end) with end exclusive"""
+    first, _, last = text.partition("-")
+    try:
+        start = int(first)
+        end = int(last) + 1 if last else start + 1
+    except ValueError:
+        raise ValueError(f"Not an LED range: {text}") from None
+    if start < 0 or end <= start:
+        raise ValueError(f"Not an LED range: {text}")
+    return start, end
+
+
+def parse_channels(text):
+    """One number or three comma separated ones (r, g, b)"""
+    values = [float(part) for part in text.split(",")]
+    if len(values) not in (1, 3):
+        raise ValueError(f"Expected one value or three (r,g,b): {text}")
+    return values[0] if len(values) == 1 else values
+
+
+def find_devices(client, spec):
+    """Devices matching an index, part of a name or "all" """
+    devices = client.devices
+    if spec.lower() == "all":
+        return list(devices)
+    if spec.isdigit():
+        index = int(spec)
+        if index >= len(devices):
+            raise ValueError(f"No device {index}; there are {len(devices)}")
+        return [devices[index]]
+    exact = [device for device in devices if device.name.lower() == spec.lower()]
+    matches = exact or [device for device in devices if spec.lower() in device.name.lower()]
+    if not matches:
+        raise ValueError(f"No device matches '{spec}'")
+    return matches
+
+
+def zone_range(device, spec):
+    """(start, end) of the zone of a device matching an index or part of a name"""
+    zones = device.zones
+    if spec.isdigit():
+        index = int(spec)
+        if index >= len(zones):
+            raise ValueError(f"{device.name} has no zone {index}")
+    else:
+        names = [zone.name.lower() for zone in zones]
+        matches = [i for i, name in enumerate(names) if name == spec.lower()] or \
+            [i for i, name in enumerate(names) if spec.lower() in name]
+        if not matches:
+            raise ValueError(f"{device.name} has no zone matching '{spec}'")
+        index = matches[0]
+    start = sum(len(zone.leds) for zone in zones[:index])
+    return start, start + len(zones[index].leds)
+
+
+def effect_names():
+    """Effect name -> label of every built-in effect and plugin"""
+    from effects import EFFECTS
+    from plugins import discover_plugins
+    names = {name: effect.label for name, effect in EFFECTS.items()}
+    names.update(discover_plugins())
+    return names
+
+
+def resolve_effect(text):
+    """Effect name for a name, plugin file name or label"""
+    value = text.lower()
+    for name, label in effect_names().items():
+        if value in (name, label.lower()) or name == "plugin:" + value:
+            return name
+    raise ValueError(f"Unknown effect: {text} (see the effects command)")
+
+
+class Session:
+    """Commands of one run, sharing its connection"""
+
+    def __init__(self, client):
+        self.client = client
+        self.pending = {}  # device -> RGBx bytearray not sent yet
+        self.effects = {}  # device key -> effect name to run at the end
+        self.duration = 0.0  # Seconds effects run for, 0 until Ctrl+C
+        self.timed = True
+
+    def colors(self, device):
+        data = self.pending.get(device)
+        if data is None:
+            data = self.pending[device] = bytearray(device_colors_to_bytes(device))
+        return data
+
+    def set_color(self, device_spec, color, zone=None, leds=None):
+        pixel = bytes((*color, 0))
+        for device in find_devices(self.client, device_spec):
+            start, end = zone_range(device, zone) if zone is not None else (0, len(device.leds))
+            if leds is not None:
+                first, last = leds
+                if last > end - start:
+                    raise ValueError(f"{device.name} has {end - start} LEDs there, not {last}")
+                start, end = start + first, start + last
+            if end > start:
+                self.colors(device)[start * BYTES_PER_LED:end * BYTES_PER_LED] = pixel * (end - start)
+
+    def flush(self):
+        """Send every pending device in one write"""
+        if not self.pending:
+            return None
+        started = time.perf_counter()
+        frames = [(device, bytes(data)) for device, data in self.pending.items()]
+        self.pending = {}
+        flush_device_frames(self.client, frames)
+        return GlobalResult("Set", len(frames), time.perf_counter() - started)
+
+    def apply_profile(self, name, with_effects=False):
+        store = ProfileStore(name)
+        if not store.profiles:
+            raise ValueError(f"No saved profile '{name}'")
+        self.report(self.flush())
+        self.report(apply_profile_all(self.client, store))
+        if with_effects:
+            for device in self.client.devices:
+                profile = store.get(device)
+                if profile and profile.effect:
+                    self.add_effect(device, profile.effect)
+
+    def calibrate(self, device_spec, reset=False, **settings):
+        """Change the calibration of devices and resend their colors through it"""
+        calibration = shared_calibration()
+        changes = {name: value for name, value in settings.items() if value is not None}
+        for device in find_devices(self.client, device_spec):
+            if reset:
+                calibration.reset_device(device)
+            elif changes:
+                calibration.set_device(device, **changes)
+            if reset or changes:
+                self.colors(device)  # Sent again at the next flush, calibrated
+            print(f"{device.name}: {calibration.settings(device) or 'not calibrated'}")
+        if reset or changes:
+            calibration.save()
+
+    def add_effect(self, device, name, duration=None):
+        self.effects[device_key(device)] = name
+        if duration is None:
+            self.timed = False
+        else:
+            self.duration = max(self.duration, duration)
+
+    def run_effects(self):
+        """Play the effects started in this run until Ctrl+C or their duration"""
+        if not self.effects:
+            return
+        from effect_engine import EffectEngine
+        from layout import SpatialLayout
+        engine = EffectEngine(self.client, layout=SpatialLayout().load())
+        for key, name in self.effects.items():
+            try:
+                engine.start_effect(key, name)
+            except Exception as e:
+                print(f"Error starting {name} on {key[0]}: {e}")
+        if not engine.jobs:
+            return
+        stop_event = threading.Event()
+        signal.signal(signal.SIGINT, lambda sig, frame: stop_event.set())
+        signal.signal(signal.SIGTERM, lambda sig, frame: stop_event.set())
+        deadline = time.perf_counter() + self.duration if self.timed else None
+        if deadline is None:
+            print(f"Running effects on {len(engine.jobs)} device(s). Press Ctrl+C to stop.")
+
+        def on_idle(timeout):
+            if deadline is not None and time.perf_counter() >= deadline:
+                stop_event.set()
+            stop_event.wait(timeout)
+
+        try:
+            engine.run(stop_event, on_idle)
+        finally:
+            engine.stop_all()
+            if engine.plugins:
+                engine.plugins.close()
+
+    def report(self, result):
+        if result is not None:
+            print(result)
+
+    def run(self, args):
+        """Run one parsed command"""
+        command = args.command
+        if command == "list":
+            list_devices(self.client, args.json)
+        elif command == "effects":
+            for name, label in effect_names().items():
+                print(f"{name:<24} {label}")
+        elif command == "set":
+            zone = args.zone
+            leds = parse_range(args.leds) if args.leds else None
+            self.set_color(args.device, parse_color(args.color), zone, leds)
+        elif command == "off":
+            self.set_color(args.device, (0, 0, 0))
+        elif command == "profile":
+            self.apply_profile(args.name, args.effects)
+        elif command == "effect":
+            name = resolve_effect(args.effect)
+            for device in find_devices(self.client, args.device):
+                self.add_effect(device, name, args.duration)
+        elif command == "calibrate":
+            white = parse_color(args.white) if args.white else None
+            self.calibrate(args.device, args.reset, gamma=args.gamma, white=white, max_current=args.max_current)
+        elif command == "flush":
+            self.report(self.flush())
+        elif command == "sleep":
+            self.report(self.flush())
+            time.sleep(args.seconds)
+        elif command == "batch":
+            raise ValueError("batch can't be nested")
+
+
+def describe_devices(client):
+    """Index, identity, zones and LED counts of every device, ready for JSON"""
+    devices = []
+    for index, device in enumerate(client.devices):
+        _, location, serial = device_key(device)
+        devices.append({
+            "index": index,
+            "name": device.name,
+            "location": location,
+            "serial": serial,
+            "leds": len(device.leds),
+            "zones": [{"name": zone.name, "leds": len(zone.leds)} for zone in device.zones],
+        })
+    return devices
+
+
+def list_devices(client, as_json=False):
+    devices = describe_devices(client)
+    if as_json:
+        print(json.dumps(devices, indent=2))
+        return
+    for entry in devices:
+        print(f"{entry['index']:>2}  {entry['name']} ({entry['leds']} LEDs)")
+        for zone_index, zone in enumerate(entry["zones"]):
+            print(f"      zone {zone_index}: {zone['name']} ({zone['leds']} LEDs)")
+
+
+class CommandError(Exception):
+    """A command line that could not be parsed"""
+
+
+class CommandParser(argparse.ArgumentParser):
+    """Raises CommandError instead of exiting, so a bad batch line doesn't end the batch"""
+
+    def error(self, message):
+        raise CommandError(message)
+
+
+def build_parser(batch=False):
+    parser = CommandParser(prog="" if batch else None, add_help=not batch,
+                           description="Control HanyaRGB lighting from the command line")
+    if not batch:
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=6742)
+        parser.add_argument("--start-server", action="store_true",
+                            help="Start the OpenRGB server if it isn't running")
+    commands = parser.add_subparsers(dest="command", required=True, parser_class=CommandParser)
+
+    list_parser = commands.add_parser("list", help="List devices, zones and LED counts")
+    list_parser.add_argument("--json", action="store_true", help="Print the devices as JSON")
+    commands.add_parser("effects", help="List the effects that can be started")
+
+    set_parser = commands.add_parser("set", help="Color a device, zone or LED range")
+    set_parser.add_argument("device", help='Index, part of a name, or "all"')
+    set_parser.add_argument("color", help="#rrggbb, r,g,b or a color name")
+    set_parser.add_argument("--zone", help="Index or part of a zone name")
+    set_parser.add_argument("--leds", metavar="A-B", help="LED range, inclusive")
+
+    off_parser = commands.add_parser("off", help="Turn LEDs off")
+    off_parser.add_argument("device", nargs="?", default="all")
+
+    profile_parser = commands.add_parser("profile", help="Apply a saved profile")
+    profile_parser.add_argument("name", nargs="?", default=DEFAULT_PROFILE)
+    profile_parser.add_argument("--effects", action="store_true", help="Also run the effects saved in it")
+
+    effect_parser = commands.add_parser("effect", help="Run an effect until Ctrl+C")
+    effect_parser.add_argument("device", help='Index, part of a name, or "all"')
+    effect_parser.add_argument("effect", help="Effect name or label")
+    effect_parser.add_argument("--duration", type=float, help="Stop after SECONDS")
+
+    calibrate_parser = commands.add_parser("calibrate", help="Show or change a device's color calibration")
+    calibrate_parser.add_argument("device", help='Index, part of a name, or "all"')
+    calibrate_parser.add_argument("--gamma", type=parse_channels, metavar="G", help="Gamma, or r,g,b gammas")
+    calibrate_parser.add_argument("--white", metavar="COLOR", help="What full white is sent as")
+    calibrate_parser.add_argument("--max-current", type=parse_channels, metavar="F",
+                                  help="Drive limit from 0 to 1, or r,g,b limits")
+    calibrate_parser.add_argument("--reset", action="store_true", help="Go back to the default calibration")
+
+    if batch:
+        commands.add_parser("flush")
+        sleep_parser = commands.add_parser("sleep")
+        sleep_parser.add_argument("seconds", type=float)
+    else:
+        commands.add_parser("batch", help="Read commands from stdin, one per line")
+    return parser
+
+
+def run_batch(session, lines):
+    """Run commands line by line; returns the number of failed lines"""
+    parser = build_parser(batch=True)
+    failures = 0
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            session.run(parser.parse_args(shlex.split(line)))
+        except (CommandError, ValueError) as e:
+            print(f"line {number}: {e}", file=sys.stderr)
+            failures += 1
+    return failures
+
+
+def connect(args):
+    try:
+        client = OpenRGBClient(args.host, args.port, "HanyaRGB CLI")
+    except Exception as e:
+        if not args.start_server:
+            print(f"Error connecting to OpenRGB at {args.host}:{args.port}: {e}", file=sys.stderr)
+            return None
+        from openrgb_server import start_openrgb_server
+        if not start_openrgb_server(interactive=False):
+            return None
+        try:
+            client = OpenRGBClient(args.host, args.port, "HanyaRGB CLI")
+        except Exception as e:
+            print(f"Error connecting to OpenRGB at {args.host}:{args.port}: {e}", file=sys.stderr)
+            return None
+    read_back(client.devices)  # The server reports the calibrated colors last sent
+    return client
+
+
+def main(argv=None):
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except CommandError as e:
+        parser.print_usage(sys.stderr)
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    client = connect(args)
+    if client is None:
+        return 1
+    session = Session(client)
+    status = 0
+    try:
+        if args.command == "batch":
+            status = 1 if run_batch(session, sys.stdin) else 0
+        else:
+            session.run(args)
+        session.report(session.flush())
+        session.run_effects()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        status = 1
+    except Exception as e:
+        print(f"Error talking to OpenRGB: {e}", file=sys.stderr)
+        status = 1
+    finally:
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,50 @@
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import colorchooser
-import colorsys
+from tkinter import colorchooser, filedialog
 import math
-from openrgb.utils import RGBColor
 import threading
 import time
+import numpy as np
 from PIL import Image, ImageTk
 import os
 import sys
+from effects import EFFECTS, FRAME_DELAY, create_effect
+from compositor import BLEND_MODES
+from frame_buffer import FrameRing, ring_name
+from profile_store import device_key
+from led_packets import (
+    resize_zones,
+    zone_size_range,
+    set_zone_colors,
+    set_device_colors,
+    device_color_array,
+    zone_slices,
+)
+from led_control_window import led_count_colors
+from latency_metrics import format_summary
+from plugins import discover_plugins, is_plugin_effect
+from timeline import Timeline, EASINGS, DEFAULT_DURATION, save_timeline, load_timeline, list_timelines
+
+# Refresh interval of the live LED preview while an effect runs (~60 Hz)
+PREVIEW_INTERVAL_MS = 16
+# Audio the music visualizer can follow (see audio.open_source); a WAV
+# file is picked with a file dialog
+AUDIO_SOURCES = {"Simulated audio": None, "Live input": "live", "WAV file...": ""}
 
 class ColorControlWindow(ctk.CTkToplevel):
-    def __init__(self, parent, client, device):
+    def __init__(self, parent, client, device, profile_store=None, effect_engine=None):
         super().__init__(parent)
         
         self.parent = parent
         self.client = client
         self.device = device
+        self.profile_store = profile_store
+        self.effect_engine = effect_engine  # Out-of-process effect worker, if available
+        self.active_effect = ""  # Name of the running effect, saved with the profile
+        self.effect_blend = "normal"  # Blend mode of the effect layer over the zone colors
+        self.audio_source = None  # Source spec of the music visualizer, None for simulated audio
+        self.preview_ring = None  # Shared memory frames published by the effect engine
+        self.preview_sequence = 0
         self.selected_zone = None
         self.update_thread = None
         self.updating = False
@@ -24,19 +52,23 @@ class ColorControlWindow(ctk.CTkToplevel):
         self.zone_colors = {}   # Store zone colors
         self.color_picker_window = None  # Store reference to color picker window
         self.static_mode = False  # Track static mode state
+        self.timeline_mode = False  # Track timeline mode state
+        self.timeline = Timeline(device.name, len(device.leds))  # Light show being authored
         self.zone_led_counts = {}  # Initialize zone LED counts dictionary
         self.saved_zone_colors = {}  # Store zone colors before LED control window
         
-        # Set all zone LEDs to white initially
-        try:
-            white_color = RGBColor(255, 255, 255)
-            for zone in device.zones:
-                if zone.leds:
-                    for led in zone.leds:
-                        led.set_color(white_color)
-            client.update_device(device)
-        except Exception as e:
-            print(f"Error setting initial white color: {e}")
+        # Restore the saved profile, or set all zone LEDs to white initially
+        restored = False
+        if profile_store:
+            try:
+                restored = profile_store.apply_device(client, device)
+            except Exception as e:
+                print(f"Error restoring profile: {e}")
+        if not restored:
+            try:
+                set_device_colors(client, device, (255, 255, 255))
+            except Exception as e:
+                print(f"Error setting initial white color: {e}")
         
         # Get initial color from first zone if available
         try:
@@ -51,6 +83,10 @@ class ColorControlWindow(ctk.CTkToplevel):
         
         # Initialize default LED counts for each zone
         self.initialize_default_led_counts()
+        if profile_store:
+            saved_counts = profile_store.zone_led_counts_for(device)
+            if saved_counts:
+                self.zone_led_counts = saved_counts
         
         # Window setup
         self.title(f"Color Control - {device.name}")
@@ -195,6 +231,60 @@ class ColorControlWindow(ctk.CTkToplevel):
         )
         self.rainbow_btn.pack(side="left")
         
+        # Effects menu with the rest of the effect library and the user's plugins
+        self.plugins = discover_plugins()
+        self.effect_menu = ctk.CTkOptionMenu(
+            self.button_frame,
+            values=[effect.label for name, effect in EFFECTS.items() if name != "rainbow"] + list(self.plugins.values()),
+            command=self.on_effect_selected,
+            width=200,
+            height=40
+        )
+        self.effect_menu.set("Effects")
+        self.effect_menu.pack(side="left", padx=(10, 0))
+        
+        # How the running effect blends with the zone colors below it
+        self.blend_menu = ctk.CTkOptionMenu(
+            self.button_frame,
+            values=list(BLEND_MODES),
+            command=self.on_blend_selected,
+            width=120,
+            height=40
+        )
+        self.blend_menu.set(self.effect_blend)
+        self.blend_menu.pack(side="left", padx=(10, 0))
+        
+        # Where the music visualizer gets its audio from
+        self.audio_menu = ctk.CTkOptionMenu(
+            self.button_frame,
+            values=list(AUDIO_SOURCES),
+            command=self.on_audio_source_selected,
+            width=150,
+            height=40
+        )
+        self.audio_menu.set("Simulated audio")
+        self.audio_menu.pack(side="left", padx=(10, 0))
+        
+        # Timeline mode for authored keyframe light shows
+        self.timeline_btn = ctk.CTkButton(
+            self.button_frame,
+            text="Timeline",
+            command=self.toggle_timeline_mode,
+            width=120,
+            height=40
+        )
+        self.timeline_btn.pack(side="left", padx=(10, 0))
+        
+        # Effect engine telemetry (frame rate while an effect is running)
+        self.effect_status_label = ctk.CTkLabel(
+            self.button_frame,
+            text="",
+            font=("Arial", 12)
+        )
+        self.effect_status_label.pack(side="left", padx=(10, 0))
+        # Clicking the status writes the latency histograms to a file
+        self.effect_status_label.bind("<Button-1>", self.dump_metrics)
+        
         # RGB sliders frame (initially hidden)
         self.sliders_frame = ctk.CTkFrame(self.color_frame)
         # Don't pack initially
@@ -205,6 +295,11 @@ class ColorControlWindow(ctk.CTkToplevel):
         # LED buttons frame (for individual LED control) (initially hidden)
         self.led_buttons_frame = ctk.CTkFrame(self.color_frame)
         # Don't pack initially
+        
+        # Timeline controls (initially hidden)
+        self.timeline_frame = ctk.CTkFrame(self.color_frame)
+        # Don't pack initially
+        self.create_timeline_controls()
     
     def toggle_static_mode(self):
         """Show color controls and hide the Static button"""
@@ -222,6 +317,203 @@ class ColorControlWindow(ctk.CTkToplevel):
             if self.selected_zone:
                 self.update_led_buttons()
     
+    def toggle_timeline_mode(self):
+        """Show the timeline editor with the color sliders for keyframe colors"""
+        if not self.timeline_mode:
+            self.button_frame.pack_forget()
+            self.sliders_frame.pack(fill="x", padx=20, pady=10)
+            self.timeline_frame.pack(fill="x", padx=20, pady=(0, 20))
+            self.timeline_mode = True
+            self.update_keyframe_list()
+    
+    def create_timeline_controls(self):
+        """Create the keyframe editor and playback controls"""
+        # File row: name, load and save
+        file_row = ctk.CTkFrame(self.timeline_frame)
+        file_row.pack(fill="x", padx=10, pady=(10, 5))
+        ctk.CTkLabel(file_row, text="Timeline:", width=80).pack(side="left", padx=(10, 5))
+        self.timeline_name_entry = ctk.CTkEntry(file_row, width=200)
+        self.timeline_name_entry.insert(0, self.timeline.name)
+        self.timeline_name_entry.pack(side="left", padx=5)
+        self.timeline_load_menu = ctk.CTkOptionMenu(
+            file_row,
+            values=list_timelines() or ["(none saved)"],
+            command=self.on_timeline_load,
+            width=160
+        )
+        self.timeline_load_menu.set("Load")
+        self.timeline_load_menu.pack(side="left", padx=5)
+        ctk.CTkButton(file_row, text="Save", command=self.save_timeline, width=80).pack(side="left", padx=5)
+        ctk.CTkLabel(file_row, text="Length (s):").pack(side="left", padx=(20, 5))
+        self.timeline_duration_entry = ctk.CTkEntry(file_row, width=60)
+        self.timeline_duration_entry.insert(0, f"{self.timeline.duration:g}")
+        self.timeline_duration_entry.bind("<KeyRelease>", self.on_timeline_duration_change)
+        self.timeline_duration_entry.pack(side="left", padx=5)
+        
+        # Keyframe row: time, easing, add and remove for the selected zone
+        keyframe_row = ctk.CTkFrame(self.timeline_frame)
+        keyframe_row.pack(fill="x", padx=10, pady=5)
+        ctk.CTkLabel(keyframe_row, text="Time (s):", width=80).pack(side="left", padx=(10, 5))
+        self.keyframe_time_entry = ctk.CTkEntry(keyframe_row, width=60)
+        self.keyframe_time_entry.insert(0, "0")
+        self.keyframe_time_entry.pack(side="left", padx=5)
+        self.easing_menu = ctk.CTkOptionMenu(keyframe_row, values=list(EASINGS), width=120)
+        self.easing_menu.set("linear")
+        self.easing_menu.pack(side="left", padx=5)
+        ctk.CTkButton(keyframe_row, text="Add Keyframe", command=self.add_keyframe, width=120).pack(side="left", padx=5)
+        ctk.CTkButton(keyframe_row, text="Remove Keyframe", command=self.remove_keyframe, width=120).pack(side="left", padx=5)
+        
+        # Playback row: play/stop and a seek slider over the timeline length
+        play_row = ctk.CTkFrame(self.timeline_frame)
+        play_row.pack(fill="x", padx=10, pady=5)
+        self.timeline_play_btn = ctk.CTkButton(play_row, text="Play", command=self.toggle_timeline_playback, width=100)
+        self.timeline_play_btn.pack(side="left", padx=(10, 5))
+        self.timeline_seek_slider = ctk.CTkSlider(
+            play_row,
+            from_=0,
+            to=self.timeline.duration,
+            command=self.on_timeline_seek
+        )
+        self.timeline_seek_slider.set(0)
+        self.timeline_seek_slider.pack(side="left", fill="x", expand=True, padx=10)
+        
+        # Keyframes of the selected zone
+        self.keyframe_list_label = ctk.CTkLabel(self.timeline_frame, text="", font=("Arial", 12), justify="left")
+        self.keyframe_list_label.pack(anchor="w", padx=20, pady=(5, 10))
+    
+    def zone_track(self, zone):
+        """Timeline track of a zone, covering its LEDs on the device"""
+        start, end = self.zone_led_range(zone)
+        return self.timeline.track(zone.name, start, end)
+    
+    def get_seconds(self, entry, default=0.0):
+        try:
+            return max(0.0, float(entry.get()))
+        except ValueError:
+            return default
+    
+    def add_keyframe(self):
+        """Key the current color on the selected zone at the entered time"""
+        if not self.selected_zone:
+            return
+        try:
+            time_s = self.get_seconds(self.keyframe_time_entry)
+            self.zone_track(self.selected_zone).add_keyframe(time_s, self.current_color, self.easing_menu.get())
+        except ValueError as e:
+            print(f"Error adding keyframe: {e}")
+        self.update_keyframe_list()
+        self.refresh_timeline_playback()
+    
+    def remove_keyframe(self):
+        """Remove the selected zone's keyframe at the entered time"""
+        track = self.timeline.tracks.get(self.selected_zone.name) if self.selected_zone else None
+        if track:
+            track.remove_keyframe(self.get_seconds(self.keyframe_time_entry))
+        self.update_keyframe_list()
+        self.refresh_timeline_playback()
+    
+    def update_keyframe_list(self):
+        """Show the keyframes of the selected zone"""
+        if not self.timeline_mode:
+            return
+        track = self.timeline.tracks.get(self.selected_zone.name) if self.selected_zone else None
+        if not track or not track.times:
+            self.keyframe_list_label.configure(text="No keyframes on this zone yet")
+            return
+        lines = []
+        for time_s, colors, easing in zip(track.times, track.colors, track.easings):
+            r, g, b = (int(round(c)) for c in colors[0])
+            lines.append(f"{time_s:6.2f}s  RGB({r}, {g}, {b})  {easing}")
+        self.keyframe_list_label.configure(text="\n".join(lines))
+    
+    def on_timeline_duration_change(self, event=None):
+        self.timeline.duration = self.get_seconds(self.timeline_duration_entry, DEFAULT_DURATION) or DEFAULT_DURATION
+        self.timeline_seek_slider.configure(to=self.timeline.duration)
+        self.refresh_timeline_playback()
+    
+    def save_timeline(self):
+        name = self.timeline_name_entry.get().strip()
+        if not name:
+            return
+        self.timeline.name = name
+        if save_timeline(self.timeline):
+            self.timeline_load_menu.configure(values=list_timelines())
+    
+    def on_timeline_load(self, name):
+        """Load a saved timeline for this device"""
+        self.timeline_load_menu.set("Load")
+        timeline = load_timeline(name)
+        if timeline is None:
+            return
+        if timeline.led_count != len(self.device.leds):
+            print(f"Timeline {name} is for {timeline.led_count} LEDs, {self.device.name} has {len(self.device.leds)}")
+            return
+        self.timeline = timeline
+        self.timeline_name_entry.delete(0, "end")
+        self.timeline_name_entry.insert(0, timeline.name)
+        self.timeline_duration_entry.delete(0, "end")
+        self.timeline_duration_entry.insert(0, f"{timeline.duration:g}")
+        self.timeline_seek_slider.configure(to=timeline.duration)
+        self.update_keyframe_list()
+        self.refresh_timeline_playback()
+    
+    def toggle_timeline_playback(self):
+        if self.active_effect == "timeline":
+            self.stop_effect()
+        else:
+            self.play_timeline()
+    
+    def play_timeline(self, position=0.0):
+        """Play the timeline through the effect engine, looping"""
+        if self.active_effect:
+            self.stop_effect(restore=False)
+        
+        if self.effect_engine:
+            try:
+                self.effect_engine.start_timeline(self.device, self.timeline)
+                if position:
+                    self.effect_engine.seek(self.device, position)
+            except Exception as e:
+                print(f"Error playing timeline: {e}")
+                return
+            self.after(500, self.update_effect_status)
+            self.after(PREVIEW_INTERVAL_MS, self.update_led_preview)
+        else:
+            def timeline_loop():
+                try:
+                    self.timeline_started = time.perf_counter() - position
+                    while getattr(self, 'effect_running', True):
+                        t = time.perf_counter() - self.timeline_started
+                        set_device_colors(self.client, self.device, np.rint(self.timeline.render(t)))
+                        time.sleep(FRAME_DELAY)
+                except Exception as e:
+                    print(f"Error in timeline: {e}")
+            
+            self.effect_running = True
+            self.effect_thread = threading.Thread(target=timeline_loop, daemon=True)
+            self.effect_thread.start()
+        
+        self.active_effect = "timeline"
+        self.timeline_play_btn.configure(text="Stop")
+    
+    def refresh_timeline_playback(self):
+        """Send an edited timeline to the engine without restarting it"""
+        if self.active_effect == "timeline" and self.effect_engine:
+            self.effect_engine.start_timeline(self.device, self.timeline)
+    
+    def on_timeline_seek(self, value):
+        """Jump playback to the slider position, or preview that moment"""
+        if self.active_effect == "timeline":
+            if self.effect_engine:
+                self.effect_engine.seek(self.device, float(value))
+            else:
+                self.timeline_started = time.perf_counter() - float(value)
+        elif not self.engine_effect_running():  # Previews would race the engine's frames
+            try:
+                set_device_colors(self.client, self.device, np.rint(self.timeline.render(float(value))))
+            except Exception as e:
+                print(f"Error previewing timeline: {e}")
+    
     def show_color_controls(self):
         """Show the color control frame with only Static button visible"""
         if not self.color_frame.winfo_viewable():
@@ -401,8 +693,9 @@ class ColorControlWindow(ctk.CTkToplevel):
             print(f"Error getting zone color: {e}")
             self.current_color = (255, 255, 255)  # Default to white if error
         
-        # Reset static mode
+        # Reset static and timeline modes
         self.static_mode = False
+        self.timeline_mode = False
         
         # Show color frame if not visible
         if not self.color_frame.winfo_viewable():
@@ -414,6 +707,7 @@ class ColorControlWindow(ctk.CTkToplevel):
         # Hide color controls
         self.sliders_frame.pack_forget()
         self.led_buttons_frame.pack_forget()
+        self.timeline_frame.pack_forget()
     
     def rgb_to_hex(self, rgb):
         """Convert RGB tuple to hex color"""
@@ -494,12 +788,26 @@ class ColorControlWindow(ctk.CTkToplevel):
     
     def on_closing(self):
         """Handle window closing"""
+        # Persist the device state before closing
+        self.save_profile()
+        self.close_preview()
         # Close color picker if it's open
         if self.color_picker_window:
             self.color_picker_window.destroy()
         # Destroy the main window
         self.destroy()
     
+    def save_profile(self):
+        """Save zone sizes, LED colors and the active effect of this device"""
+        if not self.profile_store:
+            return
+        try:
+            effect = self.active_effect if self.active_effect in EFFECTS or is_plugin_effect(self.active_effect) else ""
+            self.profile_store.update_device(self.device, self.zone_led_counts, effect)
+            self.profile_store.save()
+        except Exception as e:
+            print(f"Error saving profile: {e}")
+
     def save_zone_colors(self):
         """Save current colors for all zones"""
         self.saved_zone_colors.clear()
@@ -516,11 +824,12 @@ class ColorControlWindow(ctk.CTkToplevel):
     def restore_zone_colors(self):
         """Restore saved colors for all zones"""
         try:
+            colors = device_color_array(self.device)
+            slices = zone_slices(self.device)
             for zone, color in self.saved_zone_colors.items():
-                rgb_color = RGBColor(*color)
-                for led in zone.leds:
-                    led.set_color(rgb_color)
-            self.client.update_device(self.device)
+                if zone in slices:
+                    colors[slices[zone]] = color
+            set_device_colors(self.client, self.device, colors)
         except Exception as e:
             print(f"Error restoring zone colors: {e}")
 
@@ -639,9 +948,17 @@ class ColorControlWindow(ctk.CTkToplevel):
         
         if color[0]:
             rgb = tuple(int(c) for c in color[0])
-            rgb_color = RGBColor(*rgb)
-            led.set_color(rgb_color)
-            self.client.update_device(self.device)
+            if self.engine_effect_running():
+                # Keep the effect running and put the LED on the override layer
+                start, _ = self.zone_led_range(self.selected_zone)
+                self.effect_engine.set_layer_colors(
+                    self.device, "overrides", start + led_index, start + led_index + 1, rgb
+                )
+            else:
+                # Through set_zone_colors so the LED gets the device calibration
+                colors = device_color_array(self.device)[zone_slices(self.device)[self.selected_zone]]
+                colors[led_index] = rgb
+                set_zone_colors(self.client, self.device, self.selected_zone, colors)
             
             # Update button color immediately
             if hasattr(self.selected_zone, 'led_buttons') and led_index in self.selected_zone.led_buttons:
@@ -652,6 +969,14 @@ class ColorControlWindow(ctk.CTkToplevel):
         if not self.selected_zone or not self.client:
             return
         
+        if self.engine_effect_running():
+            # The engine owns the device; the zone color becomes its base layer
+            start, end = self.zone_led_range(self.selected_zone)
+            color = tuple(int(c) for c in self.current_color)
+            self.effect_engine.set_layer_colors(self.device, "base", start, end, color)
+            self.zone_colors[self.selected_zone] = self.current_color
+            return
+        
         # Throttle updates to avoid overwhelming the RGB device
         if self.updating:
             return
@@ -660,19 +985,9 @@ class ColorControlWindow(ctk.CTkToplevel):
         
         def update_color():
             try:
-                # Create RGBColor object
-                rgb_color = RGBColor(
-                    int(self.current_color[0]),
-                    int(self.current_color[1]),
-                    int(self.current_color[2])
-                )
-                
-                # Apply color to all LEDs in the zone
-                for i in range(len(self.selected_zone.leds)):
-                    self.selected_zone.leds[i].set_color(rgb_color)
-                
-                # Update the device
-                self.client.update_device(self.device)
+                # Fill the whole zone with one zone update packet
+                rgb = tuple(int(c) for c in self.current_color)
+                set_zone_colors(self.client, self.device, self.selected_zone, rgb)
                 
                 # Store the color for this zone
                 self.zone_colors[self.selected_zone] = self.current_color
@@ -689,20 +1004,42 @@ class ColorControlWindow(ctk.CTkToplevel):
             self.update_thread = threading.Thread(target=update_color, daemon=True)
             self.update_thread.start()
 
+    def engine_effect_running(self):
+        """Whether the engine drives this device, also when another window or the API started it"""
+        return bool(self.effect_engine and (self.active_effect or self.effect_engine.has_job(self.device)))
+
+    def zone_led_range(self, zone):
+        """Device-wide start and end LED index of a zone"""
+        start = 0
+        for other in self.device.zones:
+            if other is zone:
+                break
+            start += len(other.leds)
+        return start, start + len(zone.leds)
+
     def update_zone_led_counts(self, zone_led_counts):
         """Update LED counts from LED control window"""
         self.zone_led_counts = zone_led_counts
 
         try:
-            for zone, count in zone_led_counts.items():
-                for i in range(len(zone.leds)):
-                    if i < count - 1:
-                        zone.leds[i].set_color(RGBColor(255, 255, 255))
-                    elif i < count:
-                        zone.leds[i].set_color(RGBColor(255, 0, 0))
-                    else:
-                        zone.leds[i].set_color(RGBColor(0, 0, 0))
-            self.client.update_device(self.device)
+            # Resize addressable zones on the controller so it drives the real
+            # strip length; their counts then follow what the server accepted
+            sizes = [zone_led_counts.get(zone, len(zone.leds)) for zone in self.device.zones]
+            if resize_zones(self.client, self.device, sizes):
+                for index, zone in enumerate(self.device.zones):
+                    low, high = zone_size_range(self.device, index)
+                    if low != high:
+                        zone_led_counts[zone] = len(zone.leds)
+                if self.engine_effect_running():
+                    self.effect_engine.refresh_device(self.device, zone_led_counts)
+                    self.close_preview()  # The engine publishes to a new, resized ring
+
+            # Mark the configured length of every zone, in one device update
+            colors = device_color_array(self.device)
+            for zone, zone_slice in zone_slices(self.device).items():
+                count = zone_led_counts.get(zone, len(zone.leds))
+                colors[zone_slice] = led_count_colors(len(zone.leds), count)
+            set_device_colors(self.client, self.device, colors)
 
             # Update LED buttons if in static mode
             if self.static_mode and self.selected_zone:
@@ -719,18 +1056,14 @@ class ColorControlWindow(ctk.CTkToplevel):
 
     def turn_all_off(self):
         """Turn off all LEDs in all zones"""
+        if self.engine_effect_running():
+            # Black would only be the engine's base layer; stop it, then write
+            self.stop_effect(restore=False)
+            self.effect_engine.when_stopped(self, self.turn_all_off)
+            return
         try:
-            # Create black color
-            black_color = RGBColor(0, 0, 0)
-            
-            # Apply black color to all LEDs in all zones
-            for zone in self.device.zones:
-                if zone.leds:
-                    for led in zone.leds:
-                        led.set_color(black_color)
-            
-            # Update the device
-            self.client.update_device(self.device)
+            # Turn every LED of the device black with one device update
+            set_device_colors(self.client, self.device, (0, 0, 0))
             
             # Update current color to black
             self.current_color = (0, 0, 0)
@@ -744,57 +1077,132 @@ class ColorControlWindow(ctk.CTkToplevel):
 
     def start_rainbow_effect(self):
         """Start a moving rainbow effect on all zones"""
-        if hasattr(self, 'rainbow_thread') and self.rainbow_thread.is_alive():
-            return  # Already running
+        self.start_effect("rainbow")
+
+    def stop_rainbow_effect(self):
+        """Stop the rainbow effect"""
+        self.stop_effect()
+
+    def on_effect_selected(self, label):
+        """Start the effect picked from the effects menu"""
+        labels = {effect.label: name for name, effect in EFFECTS.items()}
+        labels.update({plugin_label: name for name, plugin_label in self.plugins.items()})
+        if label in labels:
+            self.start_effect(labels[label])
+        self.effect_menu.set("Effects")
+
+    def on_blend_selected(self, blend):
+        """Change how the effect blends with the zone colors"""
+        self.effect_blend = blend
+        if self.engine_effect_running():
+            self.effect_engine.set_layer_blend(self.device, "effect", blend)
+
+    def on_audio_source_selected(self, label):
+        """Pick the audio of the music visualizer, restarting it if it runs"""
+        source = AUDIO_SOURCES.get(label)
+        if source == "":
+            source = filedialog.askopenfilename(
+                parent=self, title="Choose a WAV file", filetypes=[("WAV files", "*.wav"), ("All files", "*")]
+            )
+            if not source:
+                # Cancelled: keep the current source
+                current = {spec: name for name, spec in AUDIO_SOURCES.items()}.get(self.audio_source)
+                self.audio_menu.set(current or os.path.basename(self.audio_source))
+                return
+            self.audio_menu.set(os.path.basename(source))
+        self.audio_source = source
+        if self.active_effect == "music":
+            self.start_effect("music")
+
+    def start_effect(self, name):
+        """Start an effect on all zones, replacing any running effect"""
+        if self.active_effect:
+            self.stop_effect(restore=False)
         
-        def rainbow_loop():
+        params = {"source": self.audio_source} if name == "music" and self.audio_source else None
+        if self.effect_engine:
+            # Run the effect in the worker process so UI work can't slow it down
             try:
-                position = 0
-                while getattr(self, 'rainbow_running', True):
-                    # Calculate colors for each zone based on their LED counts
-                    for zone in self.device.zones:
-                        led_count = self.zone_led_counts.get(zone, len(zone.leds) if zone.leds else 0)
-                        if led_count == 0:
-                            continue
-                        
-                        # Create colors for each LED in this zone
-                        for i in range(led_count):
-                            # Calculate hue based on position and LED index to create movement
-                            hue = ((position * 2) + (i * 360 / led_count)) % 360 / 360.0
-                            r, g, b = [int(c * 255) for c in colorsys.hsv_to_rgb(hue, 1, 1)]
-                            
-                            # Only update actual LEDs if they exist
-                            if i < len(zone.leds):
-                                zone.leds[i].set_color(RGBColor(r, g, b))
-                    
-                    # Update the device
-                    self.client.update_device(self.device)
-                    
-                    # Increment position for animation (faster movement)
-                    position = (position + 5) % 360  # Full color cycle
-                    time.sleep(0.01)  # Faster update for smoother movement
-                    
+                self.effect_engine.start_effect(self.device, name, self.zone_led_counts, params)
+                if self.effect_blend != "normal":
+                    self.effect_engine.set_layer_blend(self.device, "effect", self.effect_blend)
+            except Exception as e:
+                print(f"Error starting {name} effect: {e}")
+                return
+            self.after(500, self.update_effect_status)
+            self.after(PREVIEW_INTERVAL_MS, self.update_led_preview)
+        elif is_plugin_effect(name):
+            print(f"Plugin effects need the effect engine: {name}")
+            return
+        else:
+            # Create one effect per zone based on their LED counts
+            zone_effects = []
+            try:
+                for zone in self.device.zones:
+                    led_count = self.zone_led_counts.get(zone, len(zone.leds) if zone.leds else 0)
+                    zone_effects.append((zone, create_effect(name, led_count, **(params or {})) if led_count else None))
             except Exception as e:
-                print(f"Error in rainbow effect: {e}")
+                # e.g. no audio input; release what the zones created so far
+                for _, effect in zone_effects:
+                    if hasattr(effect, "close"):
+                        effect.close()
+                print(f"Error starting {name} effect: {e}")
+                return
+            
+            def effect_loop():
+                try:
+                    started = time.perf_counter()
+                    slices = zone_slices(self.device)
+                    frame = device_color_array(self.device)
+                    while getattr(self, 'effect_running', True):
+                        t = time.perf_counter() - started
+                        for zone, effect in zone_effects:
+                            if effect is None:
+                                continue
+                            colors = effect.render(t)
+                            # Only update actual LEDs if they exist
+                            count = min(len(zone.leds), len(colors))
+                            frame[slices[zone]][:count] = colors[:count]
+                        
+                        # One device update for all zones
+                        set_device_colors(self.client, self.device, frame)
+                        time.sleep(FRAME_DELAY)  # Faster update for smoother movement
+                        
+                except Exception as e:
+                    print(f"Error in {name} effect: {e}")
+                finally:
+                    # Release what the effects hold (e.g. the sensor sampler)
+                    for _, effect in zone_effects:
+                        if hasattr(effect, "close"):
+                            effect.close()
+
+            # Start the effect in a separate thread
+            self.effect_running = True
+            self.effect_thread = threading.Thread(target=effect_loop, daemon=True)
+            self.effect_thread.start()
         
-        # Start the rainbow effect in a separate thread
-        self.rainbow_running = True
-        self.rainbow_thread = threading.Thread(target=rainbow_loop, daemon=True)
-        self.rainbow_thread.start()
+        self.active_effect = name
         
-        # Change button to "Stop Rainbow"
+        # Change button to stop the running effect
         self.rainbow_btn.configure(
-            text="Stop Rainbow",
-            command=self.stop_rainbow_effect,
+            text=f"Stop {EFFECTS[name].label if name in EFFECTS else self.plugins.get(name, name)}",
+            command=self.stop_effect,
             fg_color=["#E74C3C", "#C0392B"],  # Red color
             hover_color=["#C0392B", "#922B21"]
         )
 
-    def stop_rainbow_effect(self):
-        """Stop the rainbow effect"""
-        self.rainbow_running = False
-        if hasattr(self, 'rainbow_thread') and self.rainbow_thread.is_alive():
-            self.rainbow_thread.join(timeout=1)
+    def stop_effect(self, restore=True):
+        """Stop the running effect"""
+        self.effect_running = False
+        self.active_effect = ""
+        if self.effect_engine:
+            self.effect_engine.stop_effect(self.device)
+            self.effect_status_label.configure(text="")
+            self.close_preview()
+        if hasattr(self, 'effect_thread') and self.effect_thread.is_alive():
+            self.effect_thread.join(timeout=1)
+        
+        self.timeline_play_btn.configure(text="Play")
         
         # Reset button to "Rainbow"
         self.rainbow_btn.configure(
@@ -804,6 +1212,82 @@ class ColorControlWindow(ctk.CTkToplevel):
             hover_color=["#8E44AD", "#6C3483"]
         )
         
-        # Restore the zone colors that were active before rainbow
-        self.restore_zone_colors()
-        
\ No newline at end of file
+        # Restore the zone colors that were active before the effect, once
+        # the worker has stopped writing frames
+        if restore and self.effect_engine:
+            self.effect_engine.when_stopped(self, self.restore_zone_colors)
+        elif restore:
+            self.restore_zone_colors()
+
+    def update_effect_status(self):
+        """Show effect engine telemetry while an effect is running"""
+        if not self.effect_engine or not self.active_effect or not self.winfo_exists():
+            return
+        telemetry = self.effect_engine.poll()
+        if telemetry:
+            text = f"{telemetry.get('fps', 0):.0f} fps | render {telemetry.get('render_ms', 0):.1f} ms"
+            if "audio_latency_ms" in telemetry:
+                text += f" | audio {telemetry['audio_latency_ms']:.0f} ms"
+            if telemetry.get("latency_ms"):
+                text += f" | {format_summary(telemetry['latency_ms'])}"
+            if not telemetry.get("connected", True):
+                text = f"Reconnecting... {telemetry.get('outage_s', 0):.0f}s"
+            self.effect_status_label.configure(text=text)
+        self.after(500, self.update_effect_status)
+
+    def dump_metrics(self, event=None):
+        """Ask the effect engine to save its latency histograms"""
+        if self.effect_engine and self.effect_engine.telemetry.get("latency_ms"):
+            self.effect_engine.dump_metrics()
+
+    def update_led_preview(self):
+        """Show the latest engine frame on the LED buttons of the selected zone"""
+        if not self.active_effect or not self.winfo_exists():
+            self.close_preview()
+            return
+        self.after(PREVIEW_INTERVAL_MS, self.update_led_preview)
+        
+        if self.preview_ring is None:
+            self.preview_ring = FrameRing.attach(ring_name(device_key(self.device)))
+            if self.preview_ring is None:
+                return  # Engine has not published a frame yet
+        
+        zone = self.selected_zone
+        if not self.static_mode or not zone or not getattr(zone, 'led_buttons', None):
+            return
+        
+        sequence, frame = self.preview_ring.latest()
+        if frame is None or sequence == self.preview_sequence:
+            return
+        
+        # Copy only this zone's slice out of the shared frame, then make sure
+        # the engine did not overwrite the slot while we were reading it
+        start = 0
+        for other in self.device.zones:
+            if other is zone:
+                break
+            start += len(other.leds)
+        end = start + len(zone.leds)
+        colors = bytes(frame[start * 4:end * 4])
+        frame.release()
+        if not self.preview_ring.is_current(sequence):
+            return
+        self.preview_sequence = sequence
+        
+        for i, btn in list(zone.led_buttons.items()):
+            if i >= len(zone.leds):
+                continue
+            hex_color = self.rgb_to_hex(colors[i * 4:i * 4 + 3])
+            try:
+                if btn.cget("fg_color") != hex_color:
+                    btn.configure(fg_color=hex_color)
+            except tk.TclError:
+                # Button was destroyed when the LED grid was rebuilt
+                del zone.led_buttons[i]
+
+    def close_preview(self):
+        """Detach from the engine's frame ring"""
+        if self.preview_ring:
+            self.preview_ring.close()
+            self.preview_ring = None
+        self.preview_sequence = 0
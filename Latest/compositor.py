@@ -0,0 +1,167 @@
+import time
+import numpy as np
+
+# How a layer combines with what is below it (colors as floats in [0, 1])
+BLEND_MODES = {
+    "normal": lambda below, above: above,
+    "add": lambda below, above: np.minimum(below + above, 1.0),
+    "multiply": lambda below, above: below * above,
+    "screen": lambda below, above: 1.0 - (1.0 - below) * (1.0 - above),
+    "max": lambda below, above: np.maximum(below, above),
+}
+
+# Stacking order of the named layers, bottom first
+LAYER_ORDER = ("base", "effect", "overrides", "flash")
+
+
+def check_blend(blend):
+    if blend not in BLEND_MODES:
+        raise ValueError(f"Unknown blend mode: {blend}")
+
+
+class Layer:
+    """One layer of the stack: colors with an alpha, a blend mode and a mask
+
+    render(t) returns float colors in [0, 1] of shape (n, 3), or None to be
+    skipped this frame. The mask says which LEDs the layer covers.
+    """
+
+    def __init__(self, led_count, alpha=1.0, blend="normal"):
+        check_blend(blend)
+        self.led_count = led_count
+        self.alpha = alpha
+        self.blend = blend
+        self.mask = np.ones(led_count, dtype=np.float32)
+
+    def render(self, t):
+        raise NotImplementedError
+
+    def expired(self, t):
+        return False
+
+
+class ColorLayer(Layer):
+    """Static per-LED colors; only LEDs that were set are covered"""
+
+    def __init__(self, led_count, alpha=1.0, blend="normal", colors=None):
+        super().__init__(led_count, alpha, blend)
+        self.colors = np.zeros((led_count, 3), dtype=np.float32)
+        self.mask = np.zeros(led_count, dtype=np.float32)
+        if colors is not None:
+            self.set_range(0, led_count, colors)
+
+    def set_range(self, start, end, colors):
+        """Set one color, or an array of colors, for LEDs start..end"""
+        self.colors[start:end] = np.asarray(colors, dtype=np.float32) / 255.0
+        self.mask[start:end] = 1.0
+
+    def clear_range(self, start, end):
+        self.mask[start:end] = 0.0
+
+    def render(self, t):
+        return self.colors
+
+
+class EffectLayer(Layer):
+    """Zone effects rendered into one device-wide layer"""
+
+    def __init__(self, zone_effects, zone_sizes, alpha=1.0, blend="normal"):
+        super().__init__(sum(zone_sizes), alpha, blend)
+        self.zone_effects = zone_effects
+        self.zone_sizes = zone_sizes
+        self.colors = np.zeros((self.led_count, 3), dtype=np.float32)
+
+    def render(self, t):
+        start = 0
+        for effect, size in zip(self.zone_effects, self.zone_sizes):
+            if effect is not None and effect.led_count:
+                colors = effect.render(t)
+                count = min(size, len(colors))
+                self.colors[start:start + count] = colors[:count]
+                self.colors[start + count:start + size] = 0
+            else:
+                self.colors[start:start + size] = 0
+            start += size
+        self.colors *= 1.0 / 255.0
+        return self.colors
+
+    def opaque(self):
+        """Whether the layer hides everything below it"""
+        return self.blend == "normal" and self.alpha >= 1.0
+
+    def render_into(self, t, out):
+        """Write the zone frames straight into a uint8 (n, 3) array, unblended"""
+        start = 0
+        for effect, size in zip(self.zone_effects, self.zone_sizes):
+            if effect is not None and effect.led_count:
+                colors = effect.render(t)
+                count = min(size, len(colors))
+                out[start:start + count] = colors[:count]
+                out[start + count:start + size] = 0
+            else:
+                out[start:start + size] = 0
+            start += size
+
+
+class FlashLayer(Layer):
+    """Notification flash: a color pulsing a few times, then gone"""
+
+    def __init__(self, led_count, color, duration=1.0, pulses=3, started=None, alpha=1.0, blend="normal"):
+        super().__init__(led_count, alpha, blend)
+        self.color = np.asarray(color, dtype=np.float32) / 255.0
+        self.duration = duration
+        self.pulses = pulses
+        self.started = time.perf_counter() if started is None else started
+        self.colors = np.empty((led_count, 3), dtype=np.float32)
+        self.colors[:] = self.color
+        self.base_alpha = alpha
+
+    def render(self, t):
+        elapsed = time.perf_counter() - self.started
+        # Square pulses: on for the first half of every pulse period
+        phase = (elapsed * self.pulses / self.duration) % 1.0
+        self.alpha = self.base_alpha if phase < 0.5 else 0.0
+        return self.colors
+
+    def expired(self, t):
+        return time.perf_counter() - self.started >= self.duration
+
+
+class Compositor:
+    """Stack of named layers flattened into one frame per tick"""
+
+    def __init__(self, led_count):
+        self.led_count = led_count
+        self.layers = {}
+        self.output = np.zeros((led_count, 3), dtype=np.float32)
+
+    def set_layer(self, name, layer):
+        if layer.led_count != self.led_count:
+            raise ValueError("Layer size does not match the device")
+        self.layers[name] = layer
+
+    def get_layer(self, name):
+        return self.layers.get(name)
+
+    def remove_layer(self, name):
+        return self.layers.pop(name, None)
+
+    def ordered_layers(self):
+        order = {name: i for i, name in enumerate(LAYER_ORDER)}
+        return sorted(self.layers.items(), key=lambda item: order.get(item[0], len(order)))
+
+    def flatten(self, t):
+        """Blend all layers bottom to top, returns uint8 colors (n, 3)"""
+        output = self.output
+        output.fill(0)
+        for name, layer in self.ordered_layers():
+            if layer.expired(t):
+                del self.layers[name]
+                continue
+            colors = layer.render(t)
+            if colors is None or layer.alpha <= 0:
+                continue
+            blended = BLEND_MODES[layer.blend](output, colors)
+            weight = (layer.mask * layer.alpha)[:, None]
+            output += (blended - output) * weight
+        return (np.clip(output, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
@@ -0,0 +1,203 @@
+"""Pool of SDK connections so slow devices can't hold up the others.
+
+The OpenRGB server handles every client connection on its own thread, so
+a slow controller (e.g. SMBus RAM sticks) only stalls the connection its
+packets travel on. The pool opens a few extra connections, each with its
+own sender thread, measures how long every device takes to process a
+frame and gives the slowest devices connections of their own while the
+rest share the first one.
+"""
+import os
+import time
+import socket
+import threading
+from openrgb.network import NetworkClient
+from led_packets import send_on, round_trip
+
+# Connections opened by the effect engine; 1 keeps everything on the main client
+DEFAULT_CONNECTIONS = int(os.environ.get("HANYARGB_CONNECTIONS", "3"))
+# How often each device's processing time is measured (seconds)
+PROBE_INTERVAL = 1.0
+# How often devices are re-routed from the measurements (seconds)
+REBALANCE_INTERVAL = 2.0
+# A device counts as slow above this, or above SLOW_FACTOR x the median
+SLOW_MS = 4.0
+SLOW_FACTOR = 3.0
+# Weight of a new measurement in the moving average
+LATENCY_SMOOTHING = 0.3
+
+
+def _ignore_update(device_id, packet_type, data):
+    pass
+
+
+class PooledConnection:
+    """One SDK connection with a sender thread that always sends the newest frame"""
+
+    def __init__(self, index, address, port, name, metrics=None):
+        self.index = index
+        self.metrics = metrics  # latency_metrics.Metrics; write and ack times are recorded here
+        # Dedicated connections wait for every frame to be processed, so a
+        # slow device drops frames instead of building up a backlog
+        self.paced = index > 0
+        self.comms = NetworkClient(_ignore_update, address, port, f"{name} #{index + 1}")
+        # Frames and probes are small; don't let Nagle hold them back
+        self.comms.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.pending = {}  # key -> (device id, packet); a newer frame replaces an unsent one
+        self.condition = threading.Condition()
+        self.latency = {}  # key -> smoothed processing time in seconds
+        self.next_probe = {}
+        self.errors = 0
+        self.last_error = ""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"SDK connection {index + 1}", daemon=True)
+        self.thread.start()
+
+    @property
+    def can_probe(self):
+        # Protocol 0 servers don't answer version requests
+        return self.comms.max_protocol_version > 0
+
+    def submit(self, packets):
+        """Queue packets (key -> (device id, packet)) for the sender thread"""
+        with self.condition:
+            self.pending.update(packets)
+            self.condition.notify()
+
+    def probe(self):
+        """Round trip through the server's queue for this connection"""
+        return round_trip(self.comms)
+
+    def _run(self):
+        while self.running:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait(0.5)
+                packets, self.pending = self.pending, {}
+            now = time.perf_counter()
+            for key, (device_id, packet) in packets.items():
+                try:
+                    measure = self.can_probe and (self.paced or now >= self.next_probe.get(key, 0.0))
+                    if measure and not self.paced:
+                        self.probe()  # Drain what is queued before timing this device
+                    started = time.perf_counter()
+                    send_on(self.comms, packet)
+                    if self.metrics is not None:
+                        written = time.perf_counter()
+                        self.metrics.record(key, "write", written - started)
+                        self.metrics.count(key, "sent")
+                    if measure:
+                        # The reply comes after the server has processed the
+                        # frame, so this times the device's own write
+                        self.probe()
+                        acked = time.perf_counter()
+                        self.record(key, acked - started)
+                        self.next_probe[key] = now + PROBE_INTERVAL
+                        if self.metrics is not None:
+                            self.metrics.record(key, "ack", acked - written)
+                            self.metrics.count(key, "acked")
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = f"connection {self.index + 1}: {e}"
+
+    def record(self, key, elapsed):
+        previous = self.latency.get(key)
+        if previous is None:
+            self.latency[key] = elapsed
+        else:
+            self.latency[key] = previous + (elapsed - previous) * LATENCY_SMOOTHING
+
+    def close(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        self.thread.join(timeout=1)
+        self.comms.stop_connection()
+
+
+class ConnectionPool:
+    """Routes each device's frames to a connection chosen from measured latency"""
+
+    def __init__(self, size=DEFAULT_CONNECTIONS, address="127.0.0.1", port=6742, name="HanyaRGB", metrics=None):
+        self.size = max(1, size)
+        self.metrics = metrics
+        self.address = address
+        self.port = port
+        self.name = name
+        self.connections = []
+        self.routes = {}  # key -> connection index; unknown devices use connection 0
+        self.last_rebalance = time.perf_counter()
+
+    @classmethod
+    def for_client(cls, client, size=DEFAULT_CONNECTIONS, metrics=None):
+        """Open a pool to the same server as an existing client"""
+        comms = client.comms
+        address, port = getattr(comms, "address", "127.0.0.1"), getattr(comms, "port", 6742)
+        return cls(size, address, port, metrics=metrics).connect()
+
+    def connect(self):
+        self.connections = [
+            PooledConnection(i, self.address, self.port, self.name, self.metrics) for i in range(self.size)
+        ]
+        return self
+
+    def submit(self, packets):
+        """Send one frame per device: packets maps key -> (device id, packet)"""
+        now = time.perf_counter()
+        if now - self.last_rebalance >= REBALANCE_INTERVAL:
+            self.rebalance()
+            self.last_rebalance = now
+        batches = {}
+        for key, packet in packets.items():
+            batches.setdefault(self.routes.get(key, 0), {})[key] = packet
+        for index, batch in batches.items():
+            self.connections[index].submit(batch)
+
+    @property
+    def healthy(self):
+        """False once any connection has lost its socket"""
+        return all(connection.comms.connected for connection in self.connections)
+
+    def latencies(self):
+        """Latest measured processing time per device, in seconds"""
+        latency = {}
+        for connection in self.connections:
+            latency.update(connection.latency)
+        return latency
+
+    def rebalance(self):
+        """Give the slowest devices their own connections"""
+        latency = self.latencies()
+        if len(self.connections) < 2 or not latency:
+            return
+        values = sorted(latency.values())
+        median = values[len(values) // 2]
+        slow = [
+            key for key, value in sorted(latency.items(), key=lambda item: item[1], reverse=True)
+            if value * 1000 > SLOW_MS or value > median * SLOW_FACTOR
+        ]
+        routes = {}
+        for i, key in enumerate(slow[:len(self.connections) - 1]):
+            routes[key] = i + 1
+        self.routes = routes
+
+    def stats(self):
+        latency = self.latencies()
+        return {
+            "connections": len(self.connections),
+            "dedicated": len(self.routes),
+            "device_latency_ms": {key[0]: value * 1000 for key, value in latency.items()},
+            "pool_errors": sum(connection.errors for connection in self.connections),
+        }
+
+    @property
+    def last_error(self):
+        for connection in self.connections:
+            if connection.last_error:
+                return connection.last_error
+        return ""
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
@@ -0,0 +1,747 @@
+import time
+import multiprocessing
+import numpy as np
+from led_packets import encode_device_colors, send_packet, device_colors_to_bytes, sync_cached_colors
+from profile_store import device_key
+from effects import EFFECTS, FRAME_DELAY, create_effect
+from compositor import Compositor, ColorLayer, EffectLayer, FlashLayer, check_blend
+from frame_buffer import FrameRing, ring_name
+from layout import SpatialLayout
+from connection_pool import ConnectionPool, DEFAULT_CONNECTIONS
+from resilient_client import ResilientClient
+from latency_metrics import metrics_from_env
+from frame_trace import recorder_from_env
+from animation_cache import cached_effect, cache_enabled
+from timeline import Timeline, TimelineLayer
+from plugins import PluginHost, PluginEffect, is_plugin_effect
+from calibration import shared_calibration, apply_lut, read_back
+
+# How often the worker reports telemetry to the UI (seconds)
+TELEMETRY_INTERVAL = 0.5
+# How long the UI waits at most for the worker to confirm a stop (seconds)
+STOP_TIMEOUT = 1.0
+# How often the UI checks for that confirmation (ms)
+STOP_POLL_MS = 5
+
+
+class DeviceJob:
+    """Layer stack of one device, flattened into one write per frame"""
+
+    def __init__(self, device, zone_led_counts=None, ring=None, base=None):
+        self.device = device
+        self.ring = ring  # Shared memory ring the rendered frames are published to
+        self.zone_sizes = [len(zone.leds) for zone in device.zones]
+        self.set_zone_led_counts(zone_led_counts)
+        self.led_count = sum(self.zone_sizes)
+        self.compositor = Compositor(self.led_count)
+        self.effect = ""
+        self.effect_params = None
+        self.started = time.perf_counter()
+        self.frame = np.zeros((self.led_count, 4), dtype=np.uint8)
+        self.lut = shared_calibration().lut(device)  # Calibration tables, None when not calibrated
+        # The base layer starts from what the device currently shows: base
+        # (RGBx bytes) when the caller knows it, else the cached colors
+        current = np.frombuffer(base or device_colors_to_bytes(device), dtype=np.uint8)
+        if len(current) == self.led_count * 4:
+            self.compositor.set_layer("base", ColorLayer(self.led_count, colors=current.reshape(-1, 4)[:, :3]))
+
+    def set_zone_led_counts(self, zone_led_counts):
+        if not zone_led_counts or len(zone_led_counts) != len(self.zone_sizes):
+            zone_led_counts = self.zone_sizes
+        self.zone_led_counts = list(zone_led_counts)
+
+    def set_effect(self, effect, params=None, alpha=1.0, blend="normal", zone_positions=None, started=None,
+                   prerender=False, plugins=None):
+        """Put an effect on the effect layer, one instance per zone
+
+        zone_positions are the layout positions of each zone's LEDs; with
+        them spatial effects line up across zones and devices. started
+        lets effects on several devices share one clock. With prerender,
+        effects that loop play a cached loop instead of rendering live.
+        Plugin effects are rendered by the plugins PluginHost.
+        """
+        zone_effects = []
+        for i, count in enumerate(self.zone_led_counts):
+            positions = zone_positions[i] if zone_positions else None
+            if positions is not None and len(positions) < count:
+                positions = None  # Virtual LEDs beyond the zone have no position
+            if not count:
+                zone_effect = None
+            elif is_plugin_effect(effect):
+                zone_effect = PluginEffect(plugins, effect, count, positions)
+            else:
+                zone_effect = create_effect(effect, count, positions, **(params or {}))
+            if prerender:
+                zone_effect = cached_effect(zone_effect, params)
+            zone_effects.append(zone_effect)
+        self.close_effects()
+        self.compositor.set_layer("effect", EffectLayer(zone_effects, self.zone_sizes, alpha, blend))
+        self.effect = effect
+        self.effect_params = params
+        self.started = time.perf_counter() if started is None else started
+
+    def set_timeline(self, timeline, alpha=1.0, blend="normal", started=None):
+        """Play a keyframe timeline on the effect layer"""
+        if timeline.led_count != self.led_count:
+            raise ValueError(f"Timeline is for {timeline.led_count} LEDs, device has {self.led_count}")
+        self.close_effects()
+        self.compositor.set_layer("effect", TimelineLayer(timeline, alpha, blend))
+        self.effect = "timeline"
+        self.effect_params = None
+        self.started = time.perf_counter() if started is None else started
+
+    def seek(self, position):
+        """Jump the effect clock to position seconds"""
+        self.started = time.perf_counter() - position
+
+    def color_layer(self, name):
+        """Return the color layer called name, creating it if needed"""
+        layer = self.compositor.get_layer(name)
+        if not isinstance(layer, ColorLayer):
+            layer = ColorLayer(self.led_count)
+            self.compositor.set_layer(name, layer)
+        return layer
+
+    def animated(self):
+        """Whether any layer changes over time"""
+        return any(not isinstance(layer, ColorLayer) for layer in self.compositor.layers.values())
+
+    def stats(self):
+        """Telemetry reported by the zone effects (e.g. audio latency)"""
+        layer = self.compositor.get_layer("effect")
+        for effect in getattr(layer, "zone_effects", ()):
+            stats = effect.stats() if effect is not None else None
+            if stats:
+                return stats
+        return None
+
+    def render(self, now):
+        """Flatten the layers into the device frame as RGBx bytes"""
+        layers = self.compositor.ordered_layers()
+        top = layers[-1][1] if layers else None
+        if isinstance(top, EffectLayer) and top.opaque():
+            # Nothing above the effect and it hides everything below, so
+            # its frames (e.g. slices of a cached loop) go out unblended
+            top.render_into(now - self.started, self.frame[:, :3])
+        else:
+            self.frame[:, :3] = self.compositor.flatten(now - self.started)
+        return self.frame.tobytes()
+
+    def output(self, frame):
+        """Bytes to send for the rendered frame, through the device's calibration"""
+        return frame if self.lut is None else apply_lut(self.lut, frame)
+
+    def close_effects(self):
+        """Release what the zone effects hold (e.g. plugin slots)"""
+        for effect in getattr(self.compositor.get_layer("effect"), "zone_effects", ()):
+            close = getattr(effect, "close", None)
+            if close:
+                close()
+
+    def close(self):
+        self.close_effects()
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+
+
+class EffectEngine:
+    """Renders effects and writes frames to devices at a fixed rate
+
+    Knows nothing about Tk; it is run inside the effect worker process
+    by the GUI and directly by the headless mode. Each device has a stack
+    of layers (base color, effect, per-LED overrides, flashes) that is
+    flattened into a single write per frame.
+    """
+
+    def __init__(self, client, frame_delay=FRAME_DELAY, publish_frames=False, layout=None, pool=None,
+                 metrics=None, recorder=None):
+        self.client = client
+        self.metrics = metrics  # latency_metrics.Metrics, or None to skip all timing
+        self.recorder = recorder  # frame_trace.TraceRecorder that gets every frame sent, or None
+        self.pool = pool  # ConnectionPool for parallel device writes, or None for the client socket
+        self.frame_delay = frame_delay
+        self.publish_frames = publish_frames  # Publish frames for the UI preview
+        self.layout = layout  # SpatialLayout; spatial effects follow it when set
+        self.prerender = cache_enabled()  # Play looping effects from the animation cache
+        self.plugins = None  # PluginHost, started with the first plugin effect
+        self.epoch = time.perf_counter()  # Shared clock of spatial effects
+        self.jobs = {}
+        self.calibration_generation = shared_calibration().generation  # Tables of the jobs are from this one
+        self.pool_stale = False  # Set after a reconnect; the pool is reopened by the render loop
+        self.dropped_frames = 0  # Frames not sent while the server was unreachable
+        self.frames = 0
+        self.errors = 0
+        self.last_error = ""
+        self.render_time = 0.0
+
+    def find_device(self, key):
+        """Find a connected device by its profile key"""
+        for device in self.client.devices:
+            if device_key(device) == key:
+                return device
+        return None
+
+    def get_job(self, key, zone_led_counts=None, base=None):
+        """Return the job of a device, creating it if needed
+
+        base (RGBx bytes) is what the device shows now, for callers whose
+        writes this engine's client didn't see (the UI, on its own
+        connection); a new job's base layer starts from it.
+        """
+        job = self.jobs.get(key)
+        if job is not None:
+            if zone_led_counts:
+                job.set_zone_led_counts(zone_led_counts)
+            return job
+        device = self.find_device(key)
+        if device is None:
+            raise ValueError(f"Device not found: {key[0]}")
+        ring = None
+        if self.publish_frames:
+            ring = FrameRing.create(ring_name(key), len(device.leds) * 4)
+        job = DeviceJob(device, zone_led_counts, ring, base)
+        self.jobs[key] = job
+        return job
+
+    def check_effect(self, effect):
+        """Raise ValueError unless effect is a library effect or a plugin"""
+        if is_plugin_effect(effect):
+            if self.plugins is None:
+                self.plugins = PluginHost()
+            if effect in self.plugins.disabled:
+                raise ValueError(f"Plugin {effect} is disabled: {self.plugins.disabled[effect]}")
+        elif effect not in EFFECTS:
+            raise ValueError(f"Unknown effect: {effect}")
+
+    def start_effect(self, key, effect, zone_led_counts=None, params=None, alpha=1.0, blend="normal", base=None):
+        """Start an effect on the device identified by key"""
+        self.check_effect(effect)
+        job = self.get_job(key, zone_led_counts, base)
+        spatial = is_plugin_effect(effect) or EFFECTS[effect].spatial
+        if self.layout is not None and spatial:
+            # Sampled over the rig on the shared clock, so devices stay in step
+            zone_positions = self.layout.zone_positions(job.device)
+            job.set_effect(effect, params, alpha, blend, zone_positions, self.epoch, self.prerender, self.plugins)
+        else:
+            job.set_effect(effect, params, alpha, blend, prerender=self.prerender, plugins=self.plugins)
+
+    def start_effect_all(self, effect, params=None, bases=None):
+        """Start an effect on every connected device, returns the device count
+
+        All devices share one start time so they run in step; spatial
+        effects already share the engine clock (see start_effect). bases
+        maps device keys to their current colors (see get_job).
+        """
+        self.check_effect(effect)
+        on_epoch = self.layout is not None and (is_plugin_effect(effect) or EFFECTS[effect].spatial)
+        now = time.perf_counter()
+        started = 0
+        for device in self.client.devices:
+            if not device.leds:
+                continue
+            key = device_key(device)
+            self.start_effect(key, effect, params=params, base=(bases or {}).get(key))
+            if not on_epoch:
+                self.jobs[key].started = now
+            started += 1
+        return started
+
+    def start_timeline(self, key, timeline, alpha=1.0, blend="normal", base=None):
+        """Play a timeline (Timeline or its dict form) on a device
+
+        Replacing a timeline that is already playing keeps its clock, so
+        edits show up without jumping back to the start.
+        """
+        if not isinstance(timeline, Timeline):
+            timeline = Timeline.from_dict(timeline)
+        job = self.get_job(key, base=base)
+        started = job.started if job.effect == "timeline" else None
+        job.set_timeline(timeline, alpha, blend, started)
+
+    def seek(self, key, position):
+        """Move the effect or timeline of a device to position seconds"""
+        job = self.jobs.get(key)
+        if job is None:
+            raise ValueError(f"Nothing is playing on device {key[0]}")
+        job.seek(position)
+
+    def stop_effect(self, key):
+        """Stop everything the engine drives on a device"""
+        job = self.jobs.pop(key, None)
+        if job:
+            job.close()
+
+    def stop_all(self):
+        """Stop every effect and release the frame rings"""
+        for key in list(self.jobs):
+            self.stop_effect(key)
+
+    def refresh_device(self, key, zone_led_counts=None):
+        """Re-read a device after its zones were resized and resize its job
+
+        The effect keeps running with its params and blend mode; color
+        layers and timelines are dropped since their LEDs no longer line up.
+        """
+        device = self.find_device(key)
+        if device is None:
+            raise ValueError(f"Device not found: {key[0]}")
+        device.update()
+        read_back([device])
+        job = self.jobs.pop(key, None)
+        if job is None:
+            return
+        job.close()
+        layer = job.compositor.get_layer("effect")
+        if (job.effect in EFFECTS or is_plugin_effect(job.effect)) and layer is not None:
+            self.start_effect(key, job.effect, zone_led_counts, job.effect_params, layer.alpha, layer.blend)
+
+    def set_layer_colors(self, key, layer, start, end, color):
+        """Set colors for LEDs start..end (device-wide indices) on a color layer"""
+        self.get_job(key).color_layer(layer).set_range(start, end, color)
+
+    def clear_layer(self, key, layer):
+        """Remove a layer from a device"""
+        job = self.jobs.get(key)
+        if job:
+            job.compositor.remove_layer(layer)
+
+    def set_layer_blend(self, key, layer, blend, alpha=1.0):
+        """Change the blend mode and alpha of a layer"""
+        job = self.jobs.get(key)
+        target = job.compositor.get_layer(layer) if job else None
+        if target is None:
+            raise ValueError(f"No layer {layer} on device {key[0]}")
+        check_blend(blend)
+        target.blend = blend
+        target.alpha = alpha
+
+    def flash(self, key, color, duration=1.0, pulses=3, base=None):
+        """Flash a notification color on top of everything else"""
+        job = self.get_job(key, base=base)
+        job.compositor.set_layer("flash", FlashLayer(job.led_count, color, duration, pulses))
+
+    def reload_calibration(self):
+        """Fetch the calibration tables again; running devices switch on the next frame
+
+        Called by run() when the shared calibration changes (it reloads
+        itself when the file is edited, e.g. by the calibrate command of
+        cli.py), so edits show up while effects play.
+        """
+        calibration = shared_calibration()
+        self.calibration_generation = calibration.generation
+        for job in self.jobs.values():
+            job.lut = calibration.lut(job.device)
+
+    def render_frame(self):
+        """Render one frame for every device and send them all in one write"""
+        started = time.perf_counter()
+        metrics = self.metrics
+        mark = started
+        packets = {}
+        for key, job in list(self.jobs.items()):
+            try:
+                frame = job.render(started)
+                if metrics is not None:
+                    rendered = time.perf_counter()
+                    metrics.record(key, "render", rendered - mark)
+                packets[key] = (job.device.id, encode_device_colors(job.device.id, job.output(frame)))
+                if metrics is not None:
+                    mark = time.perf_counter()
+                    metrics.record(key, "encode", mark - rendered)
+                    metrics.count(key, "frames")
+                if job.ring:
+                    job.ring.publish(frame)
+                if not job.animated():
+                    # Only static colors left (e.g. a flash has ended): the
+                    # device keeps them, so there is nothing more to drive
+                    sync_cached_colors(job.device, frame)
+                    self.stop_effect(key)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{job.device.name}: {e}"
+        if packets and not self.connected():
+            self.dropped_frames += 1
+            if metrics is not None:
+                for key in packets:
+                    metrics.count(key, "dropped")
+        elif packets:
+            try:
+                joined = None
+                if self.recorder is not None or not self.pool:
+                    joined = b"".join(packet for _, packet in packets.values())
+                if self.recorder is not None:
+                    self.recorder.record(joined, started)
+                if self.pool:
+                    # The pool's senders time the write and ack of each device
+                    self.pool.submit(packets)
+                else:
+                    write_started = time.perf_counter()
+                    send_packet(self.client, joined)
+                    if metrics is not None:
+                        metrics.engine.stages["write"].record(time.perf_counter() - write_started)
+                        for key in packets:
+                            metrics.count(key, "sent")
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+        self.frames += 1
+        self.render_time = time.perf_counter() - started
+        if metrics is not None:
+            metrics.engine.stages["frame"].record(self.render_time)
+
+    def connected(self):
+        """Check the server connection, starting a reconnect if it is gone"""
+        if self.pool_stale:
+            self.reopen_pool()
+        if self.pool and not self.pool.healthy:
+            # The pool's sockets died, so the server is gone: drop the main
+            # socket too so the client notices and reconnects
+            self.client.comms.stop_connection()
+        if self.client.comms.connected:
+            return True
+        check = getattr(self.client, "check", None)  # ResilientClient reconnects in the background
+        if check:
+            check()
+        return False
+
+    def on_reconnect(self):
+        """Called by ResilientClient after it reconnected"""
+        self.pool_stale = True
+
+    def reopen_pool(self):
+        self.pool_stale = False
+        if self.pool:
+            size = self.pool.size
+            self.pool.close()
+            self.pool = open_pool(self.client, size, self.metrics)
+
+    def run(self, stop_event, on_idle=None):
+        """Run frames on a fixed schedule until stop_event is set
+
+        on_idle(timeout) is called with the time left until the next frame
+        and must return within it; by default the loop just waits.
+        """
+        next_frame = time.perf_counter()
+        while not stop_event.is_set():
+            if self.jobs:
+                self.render_frame()
+            next_frame += self.frame_delay
+            if shared_calibration().generation != self.calibration_generation:
+                self.reload_calibration()
+            remaining = next_frame - time.perf_counter()
+            if remaining < 0:
+                # Running behind, don't try to catch up with a burst of frames
+                next_frame = time.perf_counter()
+                remaining = 0
+            if on_idle:
+                on_idle(remaining)
+            else:
+                stop_event.wait(remaining)
+
+
+def open_pool(client, size=DEFAULT_CONNECTIONS, metrics=None):
+    """Open a connection pool next to client, or None to use the client socket"""
+    if size < 2:
+        return None
+    try:
+        return ConnectionPool.for_client(client, size, metrics)
+    except Exception as e:
+        print(f"Could not open extra SDK connections, using one: {e}")
+        return None
+
+
+def run_engine_process(conn):
+    """Entry point of the effect worker process"""
+    import threading
+    from openrgb_server import connect_to_openrgb
+
+    client = connect_to_openrgb(interactive=False)
+    if not client:
+        conn.send(("error", "Effect engine could not connect to OpenRGB"))
+        return
+    client = ResilientClient(client)
+
+    metrics = metrics_from_env()
+    engine = EffectEngine(client, publish_frames=True, layout=SpatialLayout().load(),
+                          pool=open_pool(client, metrics=metrics), metrics=metrics,
+                          recorder=recorder_from_env(client.devices, FRAME_DELAY))
+    client.add_listener(engine.on_reconnect)
+    stop_event = threading.Event()
+    state = {"last_report": time.perf_counter(), "last_frames": 0}
+
+    def handle(command):
+        action = command[0]
+        if action == "start":
+            _, key, effect, zone_led_counts, params, base = command
+            engine.start_effect(key, effect, zone_led_counts, params, base=base)
+        elif action == "start_all":
+            engine.start_effect_all(*command[1:])
+        elif action == "stop_all":
+            engine.stop_all()
+            conn.send(("stopped", None))
+        elif action == "timeline":
+            _, key, timeline, base = command
+            engine.start_timeline(key, timeline, base=base)
+        elif action == "seek":
+            engine.seek(*command[1:])
+        elif action == "refresh":
+            engine.refresh_device(*command[1:])
+        elif action == "colors":
+            engine.set_layer_colors(*command[1:])
+        elif action == "clear_layer":
+            engine.clear_layer(*command[1:])
+        elif action == "blend":
+            engine.set_layer_blend(*command[1:])
+        elif action == "flash":
+            engine.flash(*command[1:])
+        elif action == "stop":
+            engine.stop_effect(command[1])
+            conn.send(("stopped", command[1]))
+        elif action == "dump_metrics":
+            if engine.metrics is None:
+                raise ValueError("Latency metrics are off; set HANYARGB_METRICS=1 to collect them")
+            conn.send(("metrics", engine.metrics.dump(command[1])))
+        elif action == "shutdown":
+            stop_event.set()
+
+    def on_idle(timeout):
+        # Wait for UI commands in the gap between frames
+        deadline = time.perf_counter() + timeout
+        while True:
+            wait = max(0.0, deadline - time.perf_counter())
+            if not conn.poll(wait):
+                break
+            try:
+                handle(conn.recv())
+            except (EOFError, OSError):
+                stop_event.set()
+                return
+            except Exception as e:
+                conn.send(("error", str(e)))
+        now = time.perf_counter()
+        if now - state["last_report"] >= TELEMETRY_INTERVAL:
+            fps = (engine.frames - state["last_frames"]) / (now - state["last_report"])
+            telemetry = {
+                "fps": fps,
+                "frames": engine.frames,
+                "devices": len(engine.jobs),
+                "render_ms": engine.render_time * 1000,
+                "errors": engine.errors,
+                "last_error": engine.last_error,
+            }
+            telemetry["dropped_frames"] = engine.dropped_frames
+            telemetry.update(client.stats())
+            if engine.pool:
+                telemetry.update(engine.pool.stats())
+                telemetry["errors"] += telemetry["pool_errors"]
+                telemetry["last_error"] = telemetry["last_error"] or engine.pool.last_error
+            if engine.metrics is not None:
+                telemetry["latency_ms"] = engine.metrics.summary()
+            if engine.recorder is not None:
+                telemetry.update(engine.recorder.stats())
+            if engine.plugins is not None:
+                telemetry.update(engine.plugins.stats())
+                telemetry["last_error"] = telemetry["last_error"] or engine.plugins.last_error
+            for job in engine.jobs.values():
+                effect_stats = job.stats()
+                if effect_stats:
+                    telemetry.update(effect_stats)
+                    break
+            state["last_report"] = now
+            state["last_frames"] = engine.frames
+            try:
+                conn.send(("telemetry", telemetry))
+            except (BrokenPipeError, OSError):
+                stop_event.set()
+
+    try:
+        engine.run(stop_event, on_idle)
+    finally:
+        engine.stop_all()
+        if engine.pool:
+            engine.pool.close()
+        if engine.metrics is not None and engine.metrics.devices:
+            engine.metrics.dump()
+        if engine.recorder is not None:
+            engine.recorder.close()
+        if engine.plugins is not None:
+            engine.plugins.close()
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+
+class EffectEngineProcess:
+    """UI side handle of the effect worker process"""
+
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.telemetry = {}
+        self.last_error = ""
+        self.metrics_path = None  # Where the worker last dumped its latency metrics
+        self.awaited = set()  # Stop confirmations not received yet
+        self.stop_deadline = 0.0
+        self.jobs = set()  # Keys of the devices the worker drives, whoever started them
+
+    def start(self):
+        """Start the worker process if it is not running"""
+        if self.is_alive():
+            return
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_engine_process,
+            args=(child_conn,),
+            name="HanyaRGB effect engine",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def send(self, *command):
+        """Send a command to the worker, starting it if needed"""
+        self.start()
+        self.conn.send(command)
+
+    def start_effect(self, device, effect, zone_led_counts=None, params=None):
+        """Start an effect on a device in the worker process"""
+        counts = None
+        if zone_led_counts:
+            counts = [zone_led_counts.get(zone, len(zone.leds)) for zone in device.zones]
+        # The worker's own client never saw the UI's writes, so the colors
+        # the effect blends over come from this side
+        self.send("start", device_key(device), effect, counts, params, device_colors_to_bytes(device))
+        self.jobs.add(device_key(device))
+
+    def start_effect_all(self, effect, params=None, bases=None):
+        """Start an effect on every device the worker sees
+
+        bases are the devices' current colors, see global_ops.base_colors().
+        """
+        self.send("start_all", effect, params, bases)
+        self.jobs.update(bases or {})
+
+    def start_timeline(self, device, timeline):
+        """Play a keyframe timeline on a device in the worker process"""
+        self.send("timeline", device_key(device), timeline.to_dict(), device_colors_to_bytes(device))
+        self.jobs.add(device_key(device))
+
+    def seek(self, device, position):
+        """Jump the effect or timeline of a device to position seconds"""
+        self.send("seek", device_key(device), position)
+
+    def stop_all(self):
+        """Stop all effects; the worker confirms later (see when_stopped)"""
+        if not self.is_alive():
+            return
+        self.conn.send(("stop_all",))
+        self.jobs.clear()
+        self.expect(("stopped", None))
+
+    def refresh_device(self, device, zone_led_counts=None):
+        """Tell the worker a device's zones were resized"""
+        counts = None
+        if zone_led_counts:
+            counts = [zone_led_counts.get(zone, len(zone.leds)) for zone in device.zones]
+        self.send("refresh", device_key(device), counts)
+
+    def set_layer_colors(self, device, layer, start, end, color):
+        """Set colors of LEDs start..end on a color layer ("base" or "overrides")"""
+        self.send("colors", device_key(device), layer, start, end, color)
+
+    def clear_layer(self, device, layer):
+        self.send("clear_layer", device_key(device), layer)
+
+    def set_layer_blend(self, device, layer, blend, alpha=1.0):
+        """Change how a layer blends: normal, add, multiply, screen or max"""
+        self.send("blend", device_key(device), layer, blend, alpha)
+
+    def flash(self, device, color, duration=1.0, pulses=3):
+        """Flash a notification color over whatever the device shows"""
+        self.send("flash", device_key(device), color, duration, pulses, device_colors_to_bytes(device))
+        self.jobs.add(device_key(device))
+
+    def dump_metrics(self, path=None):
+        """Ask the worker to write its latency histograms to a file"""
+        self.send("dump_metrics", path)
+
+    def stop_effect(self, device):
+        """Stop the effect on a device; the worker confirms later (see when_stopped)"""
+        if not self.is_alive():
+            return
+        key = device_key(device)
+        self.conn.send(("stop", key))
+        self.jobs.discard(key)
+        self.expect(("stopped", key))
+
+    def has_job(self, device):
+        """Whether the worker drives a device, so static writes must go through it"""
+        return self.is_alive() and device_key(device) in self.jobs
+
+    def expect(self, reply):
+        self.awaited.add(reply)
+        self.stop_deadline = time.perf_counter() + STOP_TIMEOUT
+
+    @property
+    def stopping(self):
+        """Whether a stop is still unconfirmed; poll() picks up the replies"""
+        if self.awaited and time.perf_counter() > self.stop_deadline:
+            self.awaited.clear()  # The worker is stuck or gone, don't wait forever
+        return bool(self.awaited)
+
+    def when_stopped(self, widget, callback):
+        """Run callback on widget's Tk loop once every stop is confirmed
+
+        Static colors written from the callback can't be overwritten by a
+        frame the worker rendered before it saw the stop, and Tk never
+        blocks while waiting.
+        """
+        self.poll()
+        if self.stopping:
+            widget.after(STOP_POLL_MS, self.when_stopped, widget, callback)
+        else:
+            callback()
+
+    def handle_message(self, message):
+        kind = message[0]
+        if kind == "stopped":
+            self.awaited.discard(message)
+        elif kind == "telemetry":
+            self.telemetry = message[1]
+        elif kind == "metrics":
+            self.metrics_path = message[1]
+            print(f"Latency metrics written to {message[1]}")
+        elif kind == "error":
+            self.last_error = message[1]
+            print(f"Effect engine error: {message[1]}")
+
+    def poll(self):
+        """Drain pending messages from the worker, returns the latest telemetry"""
+        if not self.is_alive():
+            self.awaited.clear()
+            self.jobs.clear()
+            return self.telemetry
+        try:
+            while self.conn.poll():
+                self.handle_message(self.conn.recv())
+        except (EOFError, OSError):
+            pass
+        return self.telemetry
+
+    def shutdown(self, timeout=2.0):
+        """Ask the worker to exit and wait for it"""
+        if not self.is_alive():
+            return
+        try:
+            self.conn.send(("shutdown",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
@@ -0,0 +1,581 @@
+import time
+import numpy as np
+from noise import FireModel, PerlinNoise1D
+
+# Frame delay of the effect loops (seconds) and the rainbow step per frame
+RAINBOW_STEP = 5
+FRAME_DELAY = 0.01
+DEFAULT_SPEED = 50
+
+# Legacy steps for one sweep across the rig when effects follow the layout
+SPATIAL_STEPS = 60
+
+# Most fire steps simulated in one frame after a stall or a jump in time
+FIRE_MAX_CATCH_UP = 64
+
+# Palette shared by the legacy color wave and breathing effects
+BASE_COLORS = np.array([
+    (255, 0, 0),    # Red
+    (0, 255, 0),    # Green
+    (0, 0, 255),    # Blue
+    (255, 255, 0),  # Yellow
+    (255, 0, 255),  # Purple
+    (0, 255, 255),  # Cyan
+], dtype=np.float32)
+
+STROBE_COLORS = np.array([
+    (255, 255, 255),  # White
+    (255, 0, 0),      # Red
+    (0, 255, 0),      # Green
+    (0, 0, 255),      # Blue
+], dtype=np.float32)
+
+
+def speed_to_delay(speed):
+    """Legacy step delay for a 1-100 speed value: 0.11s (slow) to 0.01s (fast)"""
+    return 0.1 * (100 - speed) / 100 + 0.01
+
+
+def hsv_to_rgb(hue, saturation=1.0, value=1.0):
+    """Vectorized HSV to RGB, hue in [0, 1); returns float (n, 3) in 0-255"""
+    hue = np.asarray(hue, dtype=np.float32) % 1.0
+    saturation = np.broadcast_to(np.asarray(saturation, dtype=np.float32), hue.shape)
+    value = np.broadcast_to(np.asarray(value, dtype=np.float32), hue.shape)
+    sector = hue * 6.0
+    i = np.floor(sector).astype(np.int32) % 6
+    f = sector - np.floor(sector)
+    p = value * (1.0 - saturation)
+    q = value * (1.0 - saturation * f)
+    t = value * (1.0 - saturation * (1.0 - f))
+    r = np.choose(i, [value, q, p, p, t, value])
+    g = np.choose(i, [t, value, value, q, p, p])
+    b = np.choose(i, [p, p, t, value, value, q])
+    return np.stack((r, g, b), axis=-1) * 255.0
+
+
+def to_frame(colors):
+    """Clip float colors into a uint8 (n, 3) frame"""
+    return np.clip(colors, 0, 255).astype(np.uint8)
+
+
+class Effect:
+    """Base class of the effects
+
+    An effect renders a whole zone per call: render(t) takes the time in
+    seconds since the effect started and returns a uint8 array of shape
+    (led_count, 3). Effects work on any zone size.
+
+    Spatial effects can be given the layout positions of the zone's LEDs
+    (see layout.py) and are then sampled along x across the whole rig
+    instead of along the zone's own LED index.
+    """
+    name = ""
+    label = ""
+    spatial = False
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, positions=None):
+        self.led_count = led_count
+        self.speed = speed
+        self.delay = speed_to_delay(speed)
+        self.index = np.arange(led_count, dtype=np.float32)
+        if positions is None:
+            # Position along the zone in [0, 1)
+            self.coords = self.index / max(1, led_count)
+            self.span = max(1, led_count)
+        else:
+            self.coords = np.asarray(positions, dtype=np.float32)[:led_count, 0]
+            self.span = SPATIAL_STEPS
+
+    def steps(self, t, scale=1.0):
+        """Number of legacy animation steps elapsed at time t"""
+        return int(t / (self.delay * scale))
+
+    def render(self, t):
+        raise NotImplementedError
+
+    def period(self):
+        """One loop of the animation as (seconds per frame, frame count)
+
+        Frame i of the loop is shown from i to i + 1 times the seconds per
+        frame and must look the same on every loop. Effects whose
+        output depends on anything but t (random state, audio) return
+        None and can't be prerendered.
+        """
+        return None
+
+    def sampled_period(self, seconds):
+        """Split a loop of smoothly changing frames into whole engine frames"""
+        frames = max(1, int(round(seconds / FRAME_DELAY)))
+        return seconds / frames, frames
+
+    def stats(self):
+        """Extra telemetry of the effect (dict), or None"""
+        return None
+
+
+class RainbowEffect(Effect):
+    """Moving rainbow of the original Rainbow button"""
+    name = "rainbow"
+    label = "Rainbow"
+    spatial = True
+
+    def render(self, t):
+        # The hue moves 2 * RAINBOW_STEP degrees once per FRAME_DELAY, in
+        # whole steps like the original loop; wrapping the step first keeps
+        # the float math the same on every loop
+        position = (int(t / FRAME_DELAY) % (360 // (2 * RAINBOW_STEP))) * RAINBOW_STEP
+        hue = ((position * 2) + self.coords * 360) % 360 / 360.0
+        return to_frame(hsv_to_rgb(hue))
+
+    def period(self):
+        return FRAME_DELAY, 360 // (2 * RAINBOW_STEP)
+
+
+class RainbowFlowEffect(Effect):
+    """Rainbow spanning the zone that flows one step per frame"""
+    name = "rainbow_flow"
+    label = "Rainbow Flow"
+    spatial = True
+
+    def render(self, t):
+        frame = self.steps(t) % 100
+        hue = self.coords + frame / 100
+        return to_frame(hsv_to_rgb(hue))
+
+    def period(self):
+        return self.delay, 100
+
+
+class ColorWaveEffect(Effect):
+    """A wave of one color moving along the zone, next color every pass"""
+    name = "color_wave"
+    label = "Color Wave"
+    spatial = True
+
+    def render(self, t):
+        n = self.span
+        step = self.steps(t)
+        wave_position = (step % n) / n
+        color = BASE_COLORS[(step // n) % len(BASE_COLORS)]
+        distance = (self.coords - wave_position) % 1.0
+        brightness = 1.0 - np.minimum(distance, 1.0 - distance) * 3
+        brightness = np.maximum(brightness, 0)
+        return to_frame(brightness[:, None] * color)
+
+    def period(self):
+        # One pass per color
+        return self.delay, self.span * len(BASE_COLORS)
+
+
+class BreathingEffect(Effect):
+    """Fade in and out, moving to the next color after each breath"""
+    name = "breathing"
+    label = "Breathing"
+
+    def render(self, t):
+        step = self.steps(t, 0.5)
+        cycle, phase = divmod(step, 200)
+        brightness = np.sin(phase * np.pi / 100) if phase < 100 else 0.0
+        color = BASE_COLORS[cycle % len(BASE_COLORS)] * brightness
+        return to_frame(np.broadcast_to(color, (self.led_count, 3)))
+
+    def period(self):
+        # One breath (200 steps) per color
+        return self.delay * 0.5, 200 * len(BASE_COLORS)
+
+
+class FireEffect(Effect):
+    """Flames rising from the middle of the zone towards both ends"""
+    name = "fire"
+    label = "Fire"
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, cooling=55, sparking=120, seed=None):
+        super().__init__(led_count, speed)
+        # Both halves share one simulation, mirrored around the center
+        self.half = (led_count + 1) // 2
+        self.model = FireModel(self.half, cooling, sparking, seed)
+        self.last_step = 0
+        self.frame = np.zeros((led_count, 3), dtype=np.uint8)
+
+    def render(self, t):
+        # The fire advances at its own slower pace, independent of frame rate,
+        # so a seeded fire looks the same whenever it is rendered. After a
+        # stall missed steps are simulated (about 13 us each), but only as
+        # many as it takes the flames to settle again
+        step = self.steps(t, 1.5)
+        if step != self.last_step:
+            for _ in range(max(1, min(step - self.last_step, FIRE_MAX_CATCH_UP))):
+                self.model.step()
+            self.last_step = step
+            colors = self.model.colors()
+            left = colors[::-1][:self.led_count // 2]
+            self.frame = np.concatenate((left, colors))[:self.led_count]
+        return self.frame
+
+
+class FlickerEffect(Effect):
+    """Warm candle light with smooth random flicker along the zone"""
+    name = "flicker"
+    label = "Candle Flicker"
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, color=(255, 147, 41), seed=None):
+        super().__init__(led_count, speed)
+        self.noise = PerlinNoise1D(seed)
+        self.color = np.asarray(color, dtype=np.float32)
+        # Each LED samples its own stretch of the noise
+        self.offsets = self.index * 7.3
+
+    def render(self, t):
+        x = self.offsets + t / (self.delay * 4)
+        brightness = 0.75 + 0.25 * self.noise.fractal(x)
+        return to_frame(brightness[:, None] * self.color)
+
+
+class PoliceEffect(Effect):
+    """Red on the first half, then blue on the second, with short gaps"""
+    name = "police"
+    label = "Police Lights"
+
+    # Phase lengths in legacy delays: red, off, blue, off
+    PHASES = np.array([3.0, 0.5, 3.0, 0.5])
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED):
+        super().__init__(led_count, speed)
+        self.ends = np.cumsum(self.PHASES)
+        first_half = self.index < led_count // 2
+        red = np.zeros((led_count, 3), dtype=np.uint8)
+        red[first_half] = (255, 0, 0)
+        blue = np.zeros((led_count, 3), dtype=np.uint8)
+        blue[~first_half] = (0, 0, 255)
+        off = np.zeros((led_count, 3), dtype=np.uint8)
+        self.frames = (red, off, blue, off)
+
+    def render(self, t):
+        position = (t / self.delay) % self.ends[-1]
+        phase = int(np.searchsorted(self.ends, position, side="right"))
+        return self.frames[min(phase, 3)]
+
+    def period(self):
+        return self.sampled_period(self.ends[-1] * self.delay)
+
+
+class StrobeEffect(Effect):
+    """Quick flashes, occasionally switching color"""
+    name = "strobe"
+    label = "Strobe Flash"
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, seed=None):
+        super().__init__(led_count, speed)
+        self.rng = np.random.default_rng(seed)
+        self.flash = -1
+        self.color_index = 0
+
+    def render(self, t):
+        # One flash is 0.5 delays on and 1.5 delays off
+        flash, position = divmod(t / self.delay, 2.0)
+        while self.flash < flash:
+            self.flash += 1
+            if self.rng.integers(0, 4) == 0:
+                self.color_index = (self.color_index + 1) % len(STROBE_COLORS)
+        if position >= 0.5:
+            return np.zeros((self.led_count, 3), dtype=np.uint8)
+        return to_frame(np.broadcast_to(STROBE_COLORS[self.color_index], (self.led_count, 3)))
+
+
+class TrailBuffer:
+    """Float accumulation buffer for trail and decay effects
+
+    Effects keep their own light state here instead of reading colors back
+    from the LED objects: every frame the whole buffer decays with one
+    multiply, then sources are stamped in. Stamps from sources that overlap
+    add up, and are merged so a stamp never dims what is already brighter.
+    """
+
+    def __init__(self, led_count):
+        self.values = np.zeros((led_count, 3), dtype=np.float32)
+        self.stamp_layer = np.zeros_like(self.values)
+
+    def clear(self):
+        self.values.fill(0)
+
+    def decay(self, factor):
+        """Fade every LED by factor"""
+        self.values *= factor
+
+    def stamp(self, indices, colors):
+        """Stamp colors at LED indices; indices outside the zone are ignored"""
+        led_count = len(self.values)
+        indices = np.asarray(indices).ravel()
+        colors = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+        valid = (indices >= 0) & (indices < led_count)
+        if not valid.any():
+            return
+        indices = indices[valid]
+        colors = colors[valid]
+        for channel in range(3):
+            self.stamp_layer[:, channel] = np.bincount(
+                indices, weights=colors[:, channel], minlength=led_count
+            )
+        np.maximum(self.values, self.stamp_layer, out=self.values)
+
+    def frame(self):
+        return to_frame(self.values)
+
+
+class MeteorEffect(Effect):
+    """Meteors with fading trails, each taking a new random color every pass"""
+    name = "meteor"
+    label = "Meteor Rain"
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, size=3, trail=5, fade=0.8, meteors=1, seed=None):
+        super().__init__(led_count, speed)
+        self.size = size
+        self.trail = trail
+        self.fade = fade
+        self.rng = np.random.default_rng(seed)
+        self.cycle_length = led_count + size + trail
+        self.buffer = TrailBuffer(led_count)
+        # Meteors start spread evenly over one pass, the first one white
+        meteors = max(1, int(meteors))
+        self.heads = -np.arange(meteors, dtype=np.float64) * (self.cycle_length / meteors)
+        self.colors = hsv_to_rgb(self.rng.random(meteors)).reshape(meteors, 3)
+        self.colors[0] = 255
+        self.last_t = None  # Time of the previous frame; the first frame starts the meteors
+
+    def render(self, t):
+        if self.last_t is None:
+            self.last_t = t
+        # A jump of more than one pass (seek, stall) moves each meteor one
+        # pass at most; the trails it would have left are faded out anyway
+        steps = min(max((t - self.last_t) / self.delay, 0.0), self.cycle_length)
+        self.last_t = t
+        
+        # Fade the trails, then move the meteors forward (one LED per step)
+        self.buffer.decay(self.fade ** steps)
+        previous = np.floor(self.heads).astype(np.int64)
+        self.heads += steps
+        heads = np.floor(self.heads).astype(np.int64)
+        
+        # Stamp every LED a meteor covered since the last frame
+        reach = self.size + int(np.max(heads - previous, initial=0))
+        offsets = np.arange(reach)
+        indices = heads[:, None] - offsets[None, :]
+        first_new = np.minimum(previous + 1, heads) - self.size + 1
+        covered = indices >= first_new[:, None]
+        colors = np.broadcast_to(self.colors[:, None, :], indices.shape + (3,))
+        self.buffer.stamp(indices[covered], colors[covered])
+        
+        # Meteors that finished their pass start over with a new color
+        done = self.heads >= self.cycle_length
+        if done.any():
+            self.heads = np.where(done, self.heads % self.cycle_length, self.heads)
+            self.colors[done] = hsv_to_rgb(self.rng.random(int(done.sum()))).reshape(-1, 3)
+        return self.buffer.frame()
+
+
+class MusicVisualizerEffect(Effect):
+    """Audio levels as green to red meters across the zone
+
+    With a source ("live", "live:<backend>", "-" for stdin or a WAV path)
+    the levels come from the streaming FFT pipeline in audio.py; without
+    one, mixed sine waves simulate music like the legacy effect did.
+    """
+    name = "music"
+    label = "Music Visualizer"
+    spatial = True
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, source=None, bands=16, positions=None):
+        super().__init__(led_count, speed, positions)
+        self.spread = positions is not None  # Spread the bands over the rig, not the zone
+        self.pipeline = None
+        self.source = source
+        self.bands = bands
+        if source:
+            # Imported lazily; only the visualizer needs the audio stack
+            import audio
+            self.audio = audio
+            self.pipeline = audio.acquire_pipeline(source, bands=bands)
+            self.map_levels = audio.map_bands_to_leds
+
+    def render(self, t):
+        if self.pipeline:
+            levels = self.pipeline.read()
+            if self.spread:
+                return level_colors(np.interp(self.coords, np.linspace(0.0, 1.0, len(levels)), levels))
+            return level_colors(self.map_levels(levels, self.led_count))
+        frame = t / (self.delay * 0.8)
+        x = self.coords
+        wave1 = np.sin((x * 4 + frame / 10) * np.pi * 2) * 0.5 + 0.5
+        wave2 = np.sin((x * 2 + frame / 15) * np.pi * 2) * 0.3 + 0.7
+        wave3 = np.sin((x + frame / 5) * np.pi * 2) * 0.2 + 0.8
+        intensity = np.clip((wave1 * wave2 * wave3) ** 2, 0, 1)
+        return level_colors(intensity)
+
+    def stats(self):
+        return self.pipeline.stats() if self.pipeline else None
+
+    def close(self):
+        if self.pipeline is not None:
+            self.audio.release_pipeline(self.source, self.bands)
+            self.pipeline = None
+
+
+def level_colors(intensity):
+    """Map levels in [0, 1] to the green-yellow-red meter colors"""
+    low = intensity < 0.3
+    mid = (intensity >= 0.3) & (intensity < 0.7)
+    high = intensity >= 0.7
+    colors = np.zeros(intensity.shape + (3,), dtype=np.float32)
+    colors[low, 0] = intensity[low] * 255 * 3
+    colors[low, 1] = 255
+    colors[mid, 0] = 255
+    colors[mid, 1] = 255 * (1 - (intensity[mid] - 0.3) * 2.5)
+    colors[high, 0] = 255
+    colors[high, 2] = (intensity[high] - 0.7) * 255 * 3
+    return to_frame(colors)
+
+
+class SensorEffect(Effect):
+    """CPU load, memory or temperature shown through a color gradient
+
+    sensor is one of sensors.SENSORS; "cores" spreads the per-core load
+    over the zone. With style "bar" the zone fills up like a meter, each
+    LED keeping its place in the gradient; otherwise the whole zone takes
+    the gradient color of the level. Readings come from the shared
+    sampler thread and glide from one sample to the next.
+    """
+    name = "sensor"
+    label = "System Monitor"
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, sensor="cpu", gradient="heat", style="color", interval=None):
+        super().__init__(led_count, speed)
+        # Imported lazily; only this effect needs psutil
+        import sensors
+        if sensor not in sensors.SENSORS:
+            raise ValueError(f"Unknown sensor: {sensor}")
+        self.sensor = sensor
+        self.bar = style == "bar" and sensor != "cores"
+        self.lut = sensors.gradient_lut(gradient)
+        self.lookup = sensors.lookup
+        self.bar_colors = sensors.lookup(self.lut, self.coords)
+        self.interval = interval or sensors.DEFAULT_INTERVAL
+        self.sampler = sensors.acquire_sampler(self.interval)
+        self.release = sensors.release_sampler
+        self.levels = np.zeros(led_count, dtype=np.float32)
+        self.last_t = 0.0
+
+    def render(self, t):
+        sample = self.sampler.sample
+        if sample is not None:
+            # Ease towards the newest reading over one sampling interval
+            step = min(1.0, max(0.0, t - self.last_t) / self.interval)
+            self.levels += (sample.levels(self.sensor, self.coords) - self.levels) * step
+        self.last_t = t
+        if self.bar:
+            frame = self.bar_colors.copy()
+            frame[self.coords >= self.levels] = 0
+            return frame
+        return self.lookup(self.lut, self.levels)
+
+    def stats(self):
+        return self.sampler.stats()
+
+    def close(self):
+        if self.sampler is not None:
+            self.release(self.interval)
+            self.sampler = None
+
+
+class AmbientEffect(Effect):
+    """Colors of the frame edges of a screen, video or image sequence
+
+    source is a frame source spec (see ambient.py). edge places the
+    zone's LEDs on the frame: "around" (clockwise from the bottom left),
+    one side, or "layout" to take each LED to the frame edge nearest its
+    layout position. smoothing is the time constant (seconds) colors
+    follow the frames with, so cuts fade instead of flashing.
+    """
+    name = "ambient"
+    label = "Ambient Capture"
+    spatial = True
+
+    def __init__(self, led_count, speed=DEFAULT_SPEED, source="screen", edge="around", depth=None, samples=None,
+                 smoothing=0.08, positions=None):
+        super().__init__(led_count, speed, positions)
+        # Imported lazily; only this effect captures frames
+        import ambient
+        if edge not in ambient.EDGES:
+            raise ValueError(f"Unknown edge: {edge}")
+        if edge == "layout" and positions is not None:
+            self.points, self.length = ambient.layout_points(positions[:led_count])
+        else:
+            self.points, self.length = ambient.edge_points(led_count, "around" if edge == "layout" else edge)
+        self.ambient = ambient
+        self.depth = depth or ambient.DEFAULT_DEPTH
+        self.samples = samples or ambient.DEFAULT_SAMPLES
+        self.smoothing = smoothing
+        self.source = source
+        self.pipeline = ambient.acquire_capture(source)
+        self.regions = None
+        self.colors = np.zeros((led_count, 3), dtype=np.float32)
+        self.last_t = None
+        self.reduce_time = 0.0
+
+    def render(self, t):
+        frame = self.pipeline.frame
+        if frame is not None and self.led_count:
+            started = time.perf_counter()
+            if self.regions is None or frame.shape[:2] != self.regions.shape:
+                # Region maps only change with the frame size
+                self.regions = self.ambient.RegionMap(self.points, self.length, *frame.shape[:2],
+                                                      self.depth, self.samples)
+            target = self.regions.reduce(frame)
+            if self.last_t is None or self.smoothing <= 0:
+                self.colors[:] = target
+            else:
+                # Exponential smoothing that doesn't depend on the frame rate
+                self.colors += (target - self.colors) * (1.0 - np.exp(-max(0.0, t - self.last_t) / self.smoothing))
+            self.last_t = t
+            self.reduce_time = time.perf_counter() - started
+        return to_frame(self.colors)
+
+    def stats(self):
+        stats = self.pipeline.stats()
+        stats["ambient_reduce_ms"] = self.reduce_time * 1000
+        return stats
+
+    def close(self):
+        if self.pipeline is not None:
+            self.ambient.release_capture(self.source)
+            self.pipeline = None
+
+
+# Effects that can be selected in the UI, saved in a profile and run headless
+EFFECTS = {
+    effect.name: effect for effect in (
+        RainbowEffect,
+        RainbowFlowEffect,
+        ColorWaveEffect,
+        BreathingEffect,
+        FireEffect,
+        FlickerEffect,
+        PoliceEffect,
+        StrobeEffect,
+        MeteorEffect,
+        MusicVisualizerEffect,
+        SensorEffect,
+        AmbientEffect,
+    )
+}
+
+
+def create_effect(name, led_count, positions=None, **params):
+    """Create an effect instance for a zone of led_count LEDs
+
+    positions (layout positions of the zone's LEDs) are only used by
+    spatial effects; the others keep following the LED index.
+    """
+    effect = EFFECTS[name]
+    if positions is not None and effect.spatial:
+        params["positions"] = positions
+    return effect(led_count, **params)
@@ -0,0 +1,119 @@
+import struct
+import hashlib
+from multiprocessing import shared_memory
+
+# Ring layout: header (latest sequence, slot count, slot capacity)
+# followed by slots of (sequence, frame length, pad) + frame bytes.
+# The writer never takes a lock: it invalidates a slot, fills it and then
+# publishes the sequence. Readers check the slot sequence before and after
+# using a frame and drop it if the writer lapped them in between.
+RING_HEADER = struct.Struct("<QII")
+SLOT_HEADER = struct.Struct("<QII")
+DEFAULT_SLOTS = 4
+
+
+def ring_name(key):
+    """Shared memory name of the frame ring for a device key"""
+    digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()[:16]
+    return f"hrgb_{digest}"
+
+
+def _attach(name):
+    """Attach to an existing segment without letting this process own it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track flag; stop the resource tracker from
+        # unlinking the writer's segment when this process exits
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class FrameRing:
+    """Single-writer, many-reader ring of rendered frames in shared memory"""
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        _, self.slot_count, self.capacity = RING_HEADER.unpack_from(self.buf, 0)
+        self.slot_size = SLOT_HEADER.size + self.capacity
+        self.sequence = RING_HEADER.unpack_from(self.buf, 0)[0]
+
+    @classmethod
+    def create(cls, name, capacity, slot_count=DEFAULT_SLOTS):
+        """Create a ring owned by the writer process"""
+        size = RING_HEADER.size + slot_count * (SLOT_HEADER.size + capacity)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a previous run that did not clean up
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        RING_HEADER.pack_into(shm.buf, 0, 0, slot_count, capacity)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to a ring as a reader, returns None if it does not exist"""
+        try:
+            return cls(_attach(name), owner=False)
+        except FileNotFoundError:
+            return None
+
+    def _slot_offset(self, sequence):
+        return RING_HEADER.size + (sequence % self.slot_count) * self.slot_size
+
+    def publish(self, frame):
+        """Write a frame into the next slot and make it the latest"""
+        length = min(len(frame), self.capacity)
+        sequence = self.sequence + 1
+        offset = self._slot_offset(sequence)
+        data_offset = offset + SLOT_HEADER.size
+        # Invalidate the slot while it is being written
+        SLOT_HEADER.pack_into(self.buf, offset, 0, 0, 0)
+        self.buf[data_offset:data_offset + length] = frame[:length]
+        SLOT_HEADER.pack_into(self.buf, offset, sequence, length, 0)
+        struct.pack_into("<Q", self.buf, 0, sequence)
+        self.sequence = sequence
+
+    def latest_sequence(self):
+        return struct.unpack_from("<Q", self.buf, 0)[0]
+
+    def latest(self):
+        """Return (sequence, memoryview) of the newest frame without copying
+
+        The view stays valid only while is_current(sequence) is true;
+        check it after using the data. Returns (0, None) when empty.
+        """
+        sequence = self.latest_sequence()
+        if sequence == 0:
+            return 0, None
+        offset = self._slot_offset(sequence)
+        slot_sequence, length, _ = SLOT_HEADER.unpack_from(self.buf, offset)
+        if slot_sequence != sequence:
+            return 0, None
+        data_offset = offset + SLOT_HEADER.size
+        return sequence, self.buf[data_offset:data_offset + length]
+
+    def is_current(self, sequence):
+        """True if the slot holding sequence has not been overwritten"""
+        offset = self._slot_offset(sequence)
+        return SLOT_HEADER.unpack_from(self.buf, offset)[0] == sequence
+
+    def close(self):
+        """Detach from the ring; the owner also removes it"""
+        self.buf = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except (BufferError, FileNotFoundError, OSError):
+            pass
@@ -0,0 +1,145 @@
+"""Append-only binary traces of the frames sent to OpenRGB.
+
+A trace starts with a header (magic, version, length of a JSON block
+describing the devices) followed by one record per frame: the time since
+recording started in microseconds, the payload length and the exact SDK
+packets that went out. Frames are queued by the render loop without a
+lock and written by a background flusher, so recording never waits on
+the disk. A trace cut short by a crash loses at most its last record.
+"""
+import os
+import json
+import time
+import struct
+import threading
+from collections import deque
+from app_paths import get_app_path
+from profile_store import device_key
+
+TRACE_MAGIC = b"HRTR"
+TRACE_VERSION = 1
+# Magic, format version, length of the JSON metadata that follows
+TRACE_HEADER = struct.Struct("<4sHI")
+# Microseconds since the start of the recording, payload length
+RECORD = struct.Struct("<QI")
+# Path of a trace to record in the effect worker ("1" for a default name)
+TRACE_ENV = "HANYARGB_TRACE"
+# How often the flusher writes queued frames (seconds)
+FLUSH_INTERVAL = 0.25
+# Frames held in memory when the disk can't keep up; newer ones are dropped
+MAX_PENDING = 4096
+
+
+def default_trace_path():
+    return get_app_path("traces", time.strftime("frames-%Y%m%d-%H%M%S.hrtr"))
+
+
+def describe_devices(devices):
+    """Trace metadata for the devices frames are sent to"""
+    return [
+        {"key": list(device_key(device)), "id": device.id, "leds": len(device.leds)}
+        for device in devices
+    ]
+
+
+class TraceRecorder:
+    """Records outgoing frames with timestamps into a trace file"""
+
+    def __init__(self, path, devices=(), frame_delay=None, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.pending = deque()  # (time, bytes); append and popleft are thread safe
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.started = time.perf_counter()
+        meta = json.dumps({
+            "started": time.time(),
+            "frame_delay": frame_delay,
+            "devices": describe_devices(devices),
+        }).encode("utf-8")
+        self.file = open(path, "wb")
+        self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, len(meta)) + meta)
+        self.file.flush()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="Frame trace flusher", daemon=True)
+        self.thread.start()
+
+    def record(self, data, now=None):
+        """Queue the packets of one frame; called from the render loop"""
+        if len(self.pending) >= MAX_PENDING:
+            self.dropped += 1
+            return
+        self.pending.append((time.perf_counter() if now is None else now, data))
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Write every queued frame to the file"""
+        chunks = []
+        while True:
+            try:
+                now, data = self.pending.popleft()
+            except IndexError:
+                break
+            micros = max(0, int((now - self.started) * 1_000_000))
+            chunks.append(RECORD.pack(micros, len(data)))
+            chunks.append(data)
+            self.frames += 1
+            self.bytes += len(data)
+        if chunks:
+            try:
+                self.file.write(b"".join(chunks))
+                self.file.flush()
+            except (OSError, ValueError) as e:
+                print(f"Error writing frame trace {self.path}: {e}")
+
+    def stats(self):
+        return {"trace_frames": self.frames, "trace_bytes": self.bytes, "trace_dropped": self.dropped}
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+        self.file.close()
+
+
+def read_trace(path):
+    """Return (metadata, list of (seconds, packets)) from a trace file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < TRACE_HEADER.size:
+        raise ValueError(f"Not a frame trace: {path}")
+    magic, version, meta_size = TRACE_HEADER.unpack_from(data, 0)
+    if magic != TRACE_MAGIC:
+        raise ValueError(f"Not a frame trace: {path}")
+    if version != TRACE_VERSION:
+        raise ValueError(f"Unsupported trace version {version}: {path}")
+    offset = TRACE_HEADER.size
+    meta = json.loads(data[offset:offset + meta_size].decode("utf-8"))
+    offset += meta_size
+    frames = []
+    while offset + RECORD.size <= len(data):
+        micros, size = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + size > len(data):
+            break  # Cut short while recording
+        frames.append((micros / 1_000_000, data[offset:offset + size]))
+        offset += size
+    return meta, frames
+
+
+def recorder_from_env(devices, frame_delay=None):
+    """A recorder if HANYARGB_TRACE is set, otherwise None (recording off)"""
+    path = os.environ.get(TRACE_ENV, "")
+    if path in ("", "0"):
+        return None
+    if path == "1":
+        path = default_trace_path()
+    try:
+        return TraceRecorder(path, devices, frame_delay)
+    except OSError as e:
+        print(f"Error opening frame trace {path}: {e}")
+        return None
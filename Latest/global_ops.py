@@ -0,0 +1,110 @@
+"""Operations applied to every connected device at once.
+
+Packets for all devices are encoded up front and flushed over the SDK
+socket in a single write, so the cost is one syscall no matter how many
+controllers there are. Every operation returns a GlobalResult with the
+total time taken.
+"""
+import time
+from led_packets import (
+    encode_device_colors,
+    pack_colors,
+    send_packet,
+    sync_cached_colors,
+    device_colors_to_bytes,
+    resize_zones,
+)
+from profile_store import device_key
+from calibration import calibrate
+
+# Budget for one global operation; results above it are flagged as slow
+TARGET_MS = 50.0
+
+
+class GlobalResult:
+    """Outcome of a global operation"""
+
+    def __init__(self, action, devices, elapsed, skipped=0):
+        self.action = action
+        self.devices = devices
+        self.elapsed = elapsed
+        self.skipped = skipped
+
+    @property
+    def elapsed_ms(self):
+        return self.elapsed * 1000
+
+    @property
+    def slow(self):
+        return self.elapsed_ms > TARGET_MS
+
+    def __str__(self):
+        text = f"{self.action}: {self.devices} device(s) in {self.elapsed_ms:.1f} ms"
+        if self.skipped:
+            text += f", {self.skipped} skipped"
+        if self.slow:
+            text += f" (over {TARGET_MS:.0f} ms)"
+        return text
+
+
+def flush_device_frames(client, frames):
+    """Send (device, RGBx bytes) frames to the server in one pass
+
+    The cached colors keep the frames as given; the devices get them
+    through their calibration.
+    """
+    if not frames:
+        return
+    send_packet(client, b"".join(encode_device_colors(device.id, calibrate(device, data)) for device, data in frames))
+    for device, data in frames:
+        sync_cached_colors(device, data)
+
+
+def apply_color_all(client, color, action="Color"):
+    """Set every LED of every device to one color"""
+    started = time.perf_counter()
+    frames = [(device, pack_colors(color, len(device.leds))) for device in client.devices]
+    flush_device_frames(client, frames)
+    return GlobalResult(action, len(frames), time.perf_counter() - started)
+
+
+def turn_all_off(client):
+    return apply_color_all(client, (0, 0, 0), action="All Off")
+
+
+def apply_profile_all(client, profile_store):
+    """Restore the saved colors of every device that has a profile"""
+    started = time.perf_counter()
+    frames = []
+    skipped = 0
+    for device in client.devices:
+        profile = profile_store.get(device)
+        if not profile or profile.led_count == 0:
+            skipped += 1
+            continue
+        if profile.led_count != len(device.leds) and len(profile.zone_led_counts) == len(device.zones):
+            resize_zones(client, device, profile.zone_led_counts)
+        if profile.led_count != len(device.leds):
+            skipped += 1
+            continue
+        frames.append((device, profile.colors))
+    flush_device_frames(client, frames)
+    return GlobalResult(f"Profile {profile_store.name}", len(frames), time.perf_counter() - started, skipped)
+
+
+def base_colors(devices):
+    """Current colors of devices as {key: RGBx bytes}, the base effects blend over"""
+    return {device_key(device): device_colors_to_bytes(device) for device in devices if device.leds}
+
+
+def apply_effect_all(client, effect_engine, effect, params=None):
+    """Start an effect on every device in one engine command
+
+    Works with the in-process EffectEngine and the EffectEngineProcess
+    handle alike; the engine then writes all devices in one pass per frame.
+    The colors client shows go along as the base the effect blends over.
+    """
+    started = time.perf_counter()
+    effect_engine.start_effect_all(effect, params, base_colors(client.devices))
+    devices = sum(1 for device in client.devices if device.leds)
+    return GlobalResult(f"Effect {effect}", devices, time.perf_counter() - started)
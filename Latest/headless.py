@@ -0,0 +1,199 @@
+"""Restore saved lighting without the GUI.
+
+Usage:
+    python headless.py [--profile NAME] [--stay] [--workers N] [--stats-interval SECONDS]
+                       [--metrics [FILE]] [--trace [FILE]] [--api [ADDRESS]]
+
+Applies the saved profile to every connected device in parallel, then
+either exits or stays resident to run the effects saved in the profile.
+With --api it also stays resident and serves the control API (see
+api_server.py), applying its commands between frames.
+This module must never import customtkinter.
+"""
+import sys
+import time
+import signal
+import argparse
+import threading
+import psutil
+from concurrent.futures import ThreadPoolExecutor
+from openrgb_server import start_openrgb_server, connect_to_openrgb, cleanup_on_exit
+from profile_store import ProfileStore, DEFAULT_PROFILE, device_key
+from effects import EFFECTS
+from plugins import is_plugin_effect
+from effect_engine import EffectEngine, open_pool
+from connection_pool import DEFAULT_CONNECTIONS
+from resilient_client import ResilientClient
+from layout import SpatialLayout
+from latency_metrics import Metrics, metrics_from_env, format_summary
+from frame_trace import TraceRecorder, recorder_from_env, default_trace_path
+from api_server import ApiServer, ApiHandler, DEFAULT_API_PORT
+
+
+def resource_usage():
+    """Return CPU seconds and resident memory (MB) of this process"""
+    process = psutil.Process()
+    cpu_times = process.cpu_times()
+    rss_mb = process.memory_info().rss / (1024 * 1024)
+    return cpu_times.user + cpu_times.system, rss_mb
+
+
+def print_stats(label, started):
+    """Print wall time, CPU time and RSS since start"""
+    cpu_seconds, rss_mb = resource_usage()
+    gui_loaded = "customtkinter" in sys.modules
+    print(f"[{label}] wall={time.perf_counter() - started:.3f}s cpu={cpu_seconds:.3f}s "
+          f"rss={rss_mb:.1f}MB gui_loaded={gui_loaded}")
+
+
+def apply_profile_parallel(client, store, workers):
+    """Push saved colors to every device concurrently, returns devices applied"""
+    def apply_one(device):
+        try:
+            return store.apply_device(client, device)
+        except Exception as e:
+            print(f"Error applying profile to {device.name}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return sum(pool.map(apply_one, client.devices))
+
+
+def run_effects(client, store, stop_event, started, stats_interval, connections=1, metrics=None, trace=None,
+                api=None):
+    """Run the effects saved in the profile until stop_event is set
+
+    trace is the path frames are recorded to ("" for a default name), or
+    None to only record when HANYARGB_TRACE is set. api is the address
+    the control API is served on, or None to not serve it.
+    """
+    engine = EffectEngine(client, layout=SpatialLayout().load(), pool=open_pool(client, connections, metrics),
+                          metrics=metrics)
+    client.add_listener(engine.on_reconnect)
+    for device in client.devices:
+        profile = store.get(device)
+        if profile and (profile.effect in EFFECTS or is_plugin_effect(profile.effect)):
+            try:
+                engine.start_effect(device_key(device), profile.effect, profile.zone_led_counts)
+            except Exception as e:
+                print(f"Error starting {profile.effect} on {device.name}: {e}")
+
+    server = None
+    if api is not None:
+        server = ApiServer(ApiHandler(client, engine, keyed=True), api)
+        if server.start():
+            print(f"Control API listening on {server.url}")
+        else:
+            server = None
+
+    if not engine.jobs and server is None:
+        print("No saved effects to run.")
+        if engine.pool:
+            engine.pool.close()
+        if engine.plugins:
+            engine.plugins.close()
+        return
+
+    if trace is not None:
+        engine.recorder = TraceRecorder(trace or default_trace_path(), client.devices, engine.frame_delay)
+    else:
+        engine.recorder = recorder_from_env(client.devices, engine.frame_delay)
+    if engine.recorder is not None:
+        print(f"Recording frames to {engine.recorder.path}")
+    print(f"Running effects on {len(engine.jobs)} device(s). Press Ctrl+C to stop.")
+    state = {"last_stats": time.perf_counter()}
+
+    def on_idle(timeout):
+        if stats_interval and time.perf_counter() - state["last_stats"] >= stats_interval:
+            print_stats("resident", started)
+            if client.outages:
+                outage = client.stats()
+                print(f"[resident] outages={outage['outages']} total_outage={outage['total_outage_s']:.1f}s "
+                      f"dropped_frames={engine.dropped_frames}")
+            if metrics is not None and metrics.devices:
+                print(f"[resident] latency {format_summary(metrics.summary())}")
+            state["last_stats"] = time.perf_counter()
+        if server is None:
+            stop_event.wait(timeout)
+            return
+        # API commands run here, between frames, like every other engine call
+        deadline = time.perf_counter() + timeout
+        while not stop_event.is_set():
+            server.drain()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            server.commands.wait(remaining)
+
+    try:
+        engine.run(stop_event, on_idle)
+    finally:
+        if server is not None:
+            server.stop()
+        if engine.pool:
+            engine.pool.close()
+        if engine.plugins:
+            engine.plugins.close()
+        if engine.recorder is not None:
+            engine.recorder.close()
+            print(f"Recorded {engine.recorder.frames} frame(s) to {engine.recorder.path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a saved HanyaRGB profile without the GUI")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help="Name of the profile to apply")
+    parser.add_argument("--stay", action="store_true", help="Stay resident and run saved effects")
+    parser.add_argument("--workers", type=int, default=8, help="Devices written in parallel")
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS,
+                        help="SDK connections used for effect frames (1 = share the main one)")
+    parser.add_argument("--stats-interval", type=float, default=0,
+                        help="Print CPU/RSS every N seconds while resident (0 = off)")
+    parser.add_argument("--metrics", nargs="?", const="", default=None, metavar="FILE",
+                        help="Collect latency histograms and write them to FILE on exit")
+    parser.add_argument("--trace", nargs="?", const="", default=None, metavar="FILE",
+                        help="Record every frame sent to FILE for trace_replay.py")
+    parser.add_argument("--api", nargs="?", const="", default=None, metavar="ADDRESS",
+                        help=f"Stay resident and serve the control API on PORT, HOST:PORT or unix:PATH "
+                             f"(default port {DEFAULT_API_PORT})")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    if not start_openrgb_server(interactive=False):
+        print("Failed to start OpenRGB server. Exiting...")
+        return 1
+
+    client = connect_to_openrgb(interactive=False)
+    if not client:
+        print("Failed to connect to OpenRGB. Exiting...")
+        return 1
+    client = ResilientClient(client)
+
+    store = ProfileStore(args.profile)
+    applied = apply_profile_parallel(client, store, args.workers)
+    print(f"Applied profile '{args.profile}' to {applied}/{len(client.devices)} device(s)")
+    print_stats("restore", started)
+
+    if args.stay or args.api is not None:
+        stop_event = threading.Event()
+        signal.signal(signal.SIGINT, lambda sig, frame: stop_event.set())
+        signal.signal(signal.SIGTERM, lambda sig, frame: stop_event.set())
+        metrics = Metrics() if args.metrics is not None else metrics_from_env()
+        run_effects(client, store, stop_event, started, args.stats_interval, args.connections, metrics,
+                    args.trace, args.api)
+        print_stats("exit", started)
+        if metrics is not None and metrics.devices:
+            path = metrics.dump(args.metrics or None)
+            if path:
+                print(f"Latency metrics written to {path}")
+
+    try:
+        client.disconnect()
+    except Exception:
+        pass
+    cleanup_on_exit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""Latency histograms and frame counters for the frame update path.
+
+Every device gets one histogram per stage (render, encode, socket write,
+server acknowledgement) plus a few counters. Histograms use HDR-style
+log-linear buckets: exact below 32 us, then 16 buckets per power of two,
+so any value is kept within about 6% from microseconds to minutes in a
+few hundred integers. Each histogram and counter is only written by one
+thread (the render loop or a pool sender), so recording takes no lock;
+readers copy the counts. Metrics are off unless HANYARGB_METRICS is set,
+and code on the hot path skips all timing when they are off.
+"""
+import os
+import json
+import time
+from app_paths import get_app_path
+
+# Set to 1 to collect latency metrics in the effect engine
+METRICS_ENV = "HANYARGB_METRICS"
+# Stages of a device frame, in the order they happen
+STAGES = ("render", "encode", "write", "ack")
+# Values are recorded in microseconds; SUB_BUCKETS buckets per power of two
+SUB_BUCKETS = 16
+SUB_BITS = 4
+# Longest value kept apart (about a minute); larger ones land in the last bucket
+MAX_MICROS = 1 << 26
+# Percentiles reported in snapshots and dumps
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(micros):
+    """Bucket of a value in microseconds"""
+    if micros < 2 * SUB_BUCKETS:
+        return max(0, micros)
+    shift = micros.bit_length() - SUB_BITS - 1
+    return shift * SUB_BUCKETS + (micros >> shift)
+
+
+def bucket_range(index):
+    """Lowest and highest value (microseconds) counted in a bucket"""
+    if index < 2 * SUB_BUCKETS:
+        return index, index
+    shift = index // SUB_BUCKETS - 1
+    low = (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+    return low, low + (1 << shift) - 1
+
+
+BUCKETS = bucket_index(MAX_MICROS) + 1
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations, written by a single thread"""
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0  # Microseconds
+        self.min = 0
+        self.max = 0
+
+    def record(self, seconds):
+        micros = int(seconds * 1_000_000)
+        self.counts[bucket_index(min(micros, MAX_MICROS))] += 1
+        if not self.count or micros < self.min:
+            self.min = micros
+        if micros > self.max:
+            self.max = micros
+        self.total += micros
+        self.count += 1
+
+    def merge(self, other):
+        """Add the counts of another histogram to this one"""
+        counts = list(other.counts)
+        for index, value in enumerate(counts):
+            if value:
+                self.counts[index] += value
+        if other.count:
+            self.min = min(self.min, other.min) if self.count else other.min
+            self.max = max(self.max, other.max)
+        self.total += other.total
+        self.count += other.count
+        return self
+
+    def percentile(self, percent):
+        """Value (seconds) below which percent of the recorded values fall"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return 0.0
+        target = total * percent / 100
+        seen = 0
+        for index, value in enumerate(counts):
+            seen += value
+            if value and seen >= target:
+                # Highest value of the bucket, but never above what was seen
+                return min(bucket_range(index)[1], self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def mean(self):
+        return self.total / self.count / 1_000_000 if self.count else 0.0
+
+    def snapshot(self):
+        """Summary in milliseconds plus the non-empty buckets"""
+        counts = list(self.counts)
+        summary = {
+            "count": self.count,
+            "min_ms": self.min / 1000,
+            "mean_ms": self.mean() * 1000,
+            "max_ms": self.max / 1000,
+        }
+        for percent in PERCENTILES:
+            summary[f"p{percent:g}_ms"] = self.percentile(percent) * 1000
+        summary["buckets_us"] = [[bucket_range(i)[0], value] for i, value in enumerate(counts) if value]
+        return summary
+
+
+class DeviceMetrics:
+    """Stage histograms and frame counters of one device"""
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        # Each counter has a single writer: frames and dropped by the render
+        # loop, sent and acked by whichever thread writes the device
+        self.counters = {"frames": 0, "dropped": 0, "sent": 0, "acked": 0}
+
+    def snapshot(self):
+        return {
+            "name": self.name,
+            "counters": dict(self.counters),
+            "stages": {stage: histogram.snapshot() for stage, histogram in self.stages.items() if histogram.count},
+        }
+
+
+class Metrics:
+    """Per-device latency histograms of the frame update path"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.devices = {}  # key -> DeviceMetrics
+        # Stages that cover all devices at once: the whole frame and the
+        # joined write on the shared socket
+        self.engine = DeviceMetrics("all devices")
+        self.engine.stages["frame"] = LatencyHistogram()
+
+    def device(self, key):
+        metrics = self.devices.get(key)
+        if metrics is None:
+            # setdefault is atomic, so two threads can't create separate entries
+            metrics = self.devices.setdefault(key, DeviceMetrics(key[0]))
+        return metrics
+
+    def record(self, key, stage, seconds):
+        self.device(key).stages[stage].record(seconds)
+
+    def count(self, key, counter, amount=1):
+        self.device(key).counters[counter] += amount
+
+    def stage(self, stage):
+        """One histogram of a stage over every device"""
+        merged = LatencyHistogram()
+        for metrics in list(self.devices.values()) + [self.engine]:
+            histogram = metrics.stages.get(stage)
+            if histogram is not None and histogram.count:
+                merged.merge(histogram)
+        return merged
+
+    def summary(self):
+        """p50 and p99 (ms) of every stage with data, for status displays"""
+        summary = {}
+        for stage in STAGES + ("frame",):
+            histogram = self.stage(stage)
+            if histogram.count:
+                summary[stage] = (histogram.percentile(50) * 1000, histogram.percentile(99) * 1000)
+        return summary
+
+    def snapshot(self):
+        return {
+            "started": self.started,
+            "elapsed_s": time.time() - self.started,
+            "engine": self.engine.snapshot(),
+            "devices": [metrics.snapshot() for metrics in list(self.devices.values())],
+        }
+
+    def dump(self, path=None):
+        """Write a snapshot as JSON, returns the path"""
+        if path is None:
+            path = get_app_path("metrics", time.strftime("latency-%Y%m%d-%H%M%S.json"))
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error saving metrics {path}: {e}")
+            return None
+        return path
+
+
+def format_summary(summary):
+    """One-line p99 per stage, e.g. for a status bar"""
+    return " ".join(f"{stage} {p99:.1f}" for stage, (p50, p99) in summary.items() if stage != "frame") + " ms p99"
+
+
+def metrics_from_env():
+    """Metrics if HANYARGB_METRICS is set, otherwise None (instrumentation off)"""
+    if os.environ.get(METRICS_ENV, "") not in ("", "0"):
+        return Metrics()
+    return None
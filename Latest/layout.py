@@ -0,0 +1,189 @@
+import os
+import json
+import numpy as np
+from openrgb.utils import ZoneType
+from app_paths import get_app_path
+from profile_store import device_key
+
+# The layout is hand-editable JSON in the data directory:
+#   {"version": 1, "devices": [
+#       {"name": ..., "location": ..., "serial": ...,
+#        "zones": [{"start": [x, y, z], "end": [x, y, z]}, ...]}]}
+# Units are arbitrary (e.g. cm inside the case). A linear zone runs from
+# start to end; a matrix zone fills the box with start and end as opposite
+# corners. Missing zones and devices fall back to the default layout.
+LAYOUT_VERSION = 1
+LAYOUT_FILE = "layout.json"
+
+
+def get_layout_path():
+    return get_app_path(LAYOUT_FILE)
+
+
+def linear_positions(count, start, end):
+    """count points evenly spaced from start to end (the middle for one LED)"""
+    start = np.asarray(start, dtype=np.float32)
+    end = np.asarray(end, dtype=np.float32)
+    if count == 1:
+        return ((start + end) / 2)[None, :]
+    fraction = np.linspace(0.0, 1.0, count, dtype=np.float32)[:, None]
+    return start + (end - start) * fraction
+
+
+def matrix_positions(zone, start, end):
+    """Positions of the LEDs of a matrix zone from its matrix map"""
+    count = len(zone.leds)
+    positions = linear_positions(count, start, end)  # For LEDs missing from the map
+    height, width = zone.mat_height or 0, zone.mat_width or 0
+    if not height or not width or not zone.matrix_map:
+        return positions
+    start = np.asarray(start, dtype=np.float32)
+    size = np.asarray(end, dtype=np.float32) - start
+    for row, cells in enumerate(zone.matrix_map):
+        for col, led in enumerate(cells):
+            if led is not None and 0 <= led < count:
+                # Cell centers, rows along y and columns along x
+                cell = np.array([(col + 0.5) / width, (row + 0.5) / height, 0.5], dtype=np.float32)
+                positions[led] = start + size * cell
+    return positions
+
+
+def is_matrix(zone):
+    return getattr(zone, "type", None) in (ZoneType.MATRIX, ZoneType.MATRIX_LOOP_X, ZoneType.MATRIX_LOOP_Y)
+
+
+def default_device_positions(device):
+    """Default layout: the zones of a device chained along x from 0 to 1
+
+    Without a layout file every device shows one continuous sweep across
+    all of its zones, and all devices sweep in step.
+    """
+    total = sum(len(zone.leds) for zone in device.zones)
+    if not total:
+        return np.zeros((0, 3), dtype=np.float32)
+    positions = np.full((total, 3), 0.5, dtype=np.float32)
+    positions[:, 0] = np.arange(total, dtype=np.float32) / total
+    return positions
+
+
+class SpatialLayout:
+    """Positions of every LED of the rig in one shared space
+
+    positions(device) returns a float32 (led count, 3) array, normalized so
+    the whole rig spans [0, 1] on every axis it extends along. Arrays are
+    computed once per device and zone sizes, then reused every frame.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_layout_path()
+        self.devices = {}  # key -> list of (start, end) per zone, or None
+        self.cache = {}
+
+    def load(self):
+        """Load the layout file, keeping the default layout if it is missing"""
+        self.devices = {}
+        self.cache = {}
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for entry in data.get("devices", []):
+                key = (entry.get("name", ""), entry.get("location", ""), entry.get("serial", ""))
+                self.devices[key] = [
+                    (zone["start"], zone["end"]) if zone else None
+                    for zone in entry.get("zones", [])
+                ]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error loading layout {self.path}: {e}")
+        return self
+
+    def save(self):
+        """Write the layout file atomically"""
+        data = {
+            "version": LAYOUT_VERSION,
+            "devices": [
+                {
+                    "name": key[0],
+                    "location": key[1],
+                    "serial": key[2],
+                    "zones": [
+                        {"start": list(zone[0]), "end": list(zone[1])} if zone else None
+                        for zone in zones
+                    ],
+                }
+                for key, zones in self.devices.items()
+            ],
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving layout {self.path}: {e}")
+
+    def place_zone(self, device, zone_index, start, end):
+        """Place a zone of a device between two points"""
+        zones = self.devices.setdefault(device_key(device), [])
+        zones.extend([None] * (zone_index + 1 - len(zones)))
+        zones[zone_index] = (tuple(start), tuple(end))
+        self.cache = {}
+
+    def bounds(self):
+        """Lower corner and size of the box around all placed zones"""
+        points = [
+            point
+            for zones in self.devices.values()
+            for zone in zones if zone
+            for point in zone
+        ]
+        if not points:
+            return None
+        points = np.asarray(points, dtype=np.float32)
+        low = points.min(axis=0)
+        size = points.max(axis=0) - low
+        return low, size
+
+    def positions(self, device):
+        """Normalized LED positions of a device, shape (led count, 3)"""
+        key = device_key(device)
+        sizes = tuple(len(zone.leds) for zone in device.zones)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == sizes:
+            return cached[1]
+
+        zones = self.devices.get(key)
+        bounds = self.bounds()
+        if not zones or bounds is None:
+            positions = default_device_positions(device)
+        else:
+            positions = default_device_positions(device)
+            low, size = bounds
+            # Flat axes (e.g. everything at z=0) map to the middle
+            scale = np.where(size > 0, 1.0 / np.where(size > 0, size, 1.0), 0.0).astype(np.float32)
+            start = 0
+            for zone, placement in zip(device.zones, zones):
+                count = len(zone.leds)
+                if placement and count:
+                    if is_matrix(zone):
+                        points = matrix_positions(zone, *placement)
+                    else:
+                        points = linear_positions(count, *placement)
+                    normalized = (points - low) * scale
+                    normalized[:, size <= 0] = 0.5
+                    positions[start:start + count] = normalized
+                start += count
+        positions.setflags(write=False)
+        self.cache[key] = (sizes, positions)
+        return positions
+
+    def zone_positions(self, device):
+        """Positions split into one array per zone"""
+        positions = self.positions(device)
+        result = []
+        start = 0
+        for zone in device.zones:
+            result.append(positions[start:start + len(zone.leds)])
+            start += len(zone.leds)
+        return result
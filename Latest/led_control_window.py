@@ -1,8 +1,19 @@
 import customtkinter as ctk
 import tkinter as tk
-from openrgb.utils import RGBColor
 import threading
 import time
+import numpy as np
+from led_packets import zone_size_range, set_zone_colors
+
+# Colors marking a zone's configured LED count: white, red for the last LED, then off
+COUNT_COLORS = np.array([(255, 255, 255), (255, 0, 0), (0, 0, 0)], dtype=np.uint8)
+
+
+def led_count_colors(led_count, configured_count):
+    """Colors that show where a zone of led_count LEDs ends at configured_count"""
+    index = np.arange(led_count)
+    kind = np.where(index < configured_count - 1, 0, np.where(index < configured_count, 1, 2))
+    return COUNT_COLORS[kind]
 
 class LEDControlWindow(ctk.CTkToplevel):
     def __init__(self, parent, client, device, zones, initial_led_counts=None):
@@ -86,10 +97,14 @@ class LEDControlWindow(ctk.CTkToplevel):
         zone_frame = ctk.CTkFrame(self.main_frame)
         zone_frame.pack(fill="x", padx=10, pady=10)
         
-        # Zone name and total LED count
+        # Zone name and total LED count, plus the range of addressable zones
+        low, high = self.zone_size_range(zone)
+        text = f"{zone.name} ({len(zone.leds)} LEDs)"
+        if low != high:
+            text = f"{zone.name} ({len(zone.leds)} LEDs, resizable {low}-{high})"
         zone_label = ctk.CTkLabel(
             zone_frame,
-            text=f"{zone.name} ({len(zone.leds)} LEDs)",
+            text=text,
             font=("Arial", 16, "bold")
         )
         zone_label.pack(pady=(10, 5))
@@ -160,10 +175,15 @@ class LEDControlWindow(ctk.CTkToplevel):
         # Calculate number of boxes to show (max 24)
         num_boxes = min(24, self.zone_led_counts[zone])
         
+        # Addressable zones are resized on apply, so only LEDs beyond what
+        # the controller can drive are virtual
+        low, high = self.zone_size_range(zone)
+        limit = high if low != high else len(zone.leds)
+        
         # Create boxes
         for i in range(num_boxes):
-            # If we're showing more LEDs than the zone has, show them in a different color
-            if i >= len(zone.leds):
+            # If we're showing more LEDs than the zone can have, show them in a different color
+            if i >= limit:
                 box = ctk.CTkFrame(
                     preview_frame,
                     width=20,
@@ -179,6 +199,10 @@ class LEDControlWindow(ctk.CTkToplevel):
                 )
             box.pack(side="left", padx=2, pady=2)
     
+    def zone_size_range(self, zone):
+        """Smallest and largest LED count the controller accepts for a zone"""
+        return zone_size_range(self.device, self.device.zones.index(zone))
+    
     def adjust_led_count(self, zone, delta):
         """Adjust the number of LEDs for a zone"""
         current_count = self.zone_led_counts[zone]
@@ -205,20 +229,9 @@ class LEDControlWindow(ctk.CTkToplevel):
         
         def update_leds():
             try:
-                # Set all LEDs to white except the last one
-                for i in range(len(zone.leds)):
-                    if i < self.zone_led_counts[zone] - 1:
-                        # White color
-                        zone.leds[i].set_color(RGBColor(255, 255, 255))
-                    elif i < self.zone_led_counts[zone]:
-                        # Red color for the last active LED
-                        zone.leds[i].set_color(RGBColor(255, 0, 0))
-                    else:
-                        # Turn off remaining LEDs
-                        zone.leds[i].set_color(RGBColor(0, 0, 0))
-                
-                # Update the device
-                self.client.update_device(self.device)
+                # White up to the last LED, red for the last one, the rest off
+                colors = led_count_colors(len(zone.leds), self.zone_led_counts[zone])
+                set_zone_colors(self.client, self.device, zone, colors)
                 
             except Exception as e:
                 print(f"Error updating LEDs: {e}")
@@ -0,0 +1,183 @@
+import time
+import struct
+from openrgb.utils import PacketType, RGBColor, OpenRGBDisconnected, CONNECTION_ERRORS
+from openrgb.network import NOSIGNAL
+
+# OpenRGB SDK packet header: magic, device id, packet type, payload size
+HEADER = struct.Struct("<4sIII")
+# Colors travel on the wire as R, G, B and one padding byte
+BYTES_PER_LED = 4
+
+
+def encode_device_colors(device_id, colors):
+    """Build a complete UPDATELEDS packet from raw RGBx color bytes"""
+    payload_size = 4 + 2 + len(colors)
+    return b"".join((
+        HEADER.pack(b"ORGB", device_id, PacketType.RGBCONTROLLER_UPDATELEDS, payload_size),
+        struct.pack("<IH", payload_size, len(colors) // BYTES_PER_LED),
+        colors
+    ))
+
+
+def encode_zone_colors(device_id, zone_id, colors):
+    """Build a complete UPDATEZONELEDS packet from raw RGBx color bytes"""
+    payload_size = 4 + 4 + 2 + len(colors)
+    return b"".join((
+        HEADER.pack(b"ORGB", device_id, PacketType.RGBCONTROLLER_UPDATEZONELEDS, payload_size),
+        struct.pack("<IiH", payload_size, zone_id, len(colors) // BYTES_PER_LED),
+        colors
+    ))
+
+
+def pack_colors(colors, count):
+    """RGBx bytes for count LEDs from one (r, g, b) color or an (n, 3) array
+
+    An array shorter than count leaves the remaining LEDs black.
+    """
+    import numpy as np  # Loaded on first use so the CLI starts without it
+    colors = np.asarray(colors)
+    frame = np.zeros((count, BYTES_PER_LED), dtype=np.uint8)
+    if colors.ndim == 1:
+        frame[:, :3] = colors
+    else:
+        colors = colors[:count]
+        frame[:len(colors), :3] = colors
+    return frame.tobytes()
+
+
+def encode_zone_resize(device_id, zone_id, size):
+    """Build a complete RESIZEZONE packet"""
+    payload = struct.pack("<ii", zone_id, size)
+    return HEADER.pack(b"ORGB", device_id, PacketType.RGBCONTROLLER_RESIZEZONE, len(payload)) + payload
+
+
+def send_packet(client, packet):
+    """Send one prebuilt packet over the client's SDK socket in a single write"""
+    send_on(client.comms, packet)
+
+
+def send_on(comms, packet):
+    """Send one prebuilt packet over an SDK connection in a single write"""
+    if not comms.connected:
+        raise OpenRGBDisconnected()
+    if not comms.lock.acquire(timeout=10):
+        raise OpenRGBDisconnected("SDK server did not respond to previous request")
+    try:
+        comms.sock.sendall(packet, NOSIGNAL)
+    except CONNECTION_ERRORS as e:
+        # stop_connection releases the lock for us
+        comms.stop_connection()
+        raise OpenRGBDisconnected() from e
+    comms.lock.release()
+
+
+def round_trip(comms):
+    """Ask the server for its protocol version and wait for the reply
+
+    The server answers requests in order, so this returns (in seconds)
+    once everything sent before it has been processed.
+    """
+    started = time.perf_counter()
+    packet = HEADER.pack(b"ORGB", 0, PacketType.REQUEST_PROTOCOL_VERSION, 4) + \
+        struct.pack("<I", comms._protocol_version)
+    if not comms.lock.acquire(timeout=10):
+        raise OpenRGBDisconnected("SDK server did not respond to previous request")
+    try:
+        comms.sock.sendall(packet, NOSIGNAL)
+    except CONNECTION_ERRORS as e:
+        comms.stop_connection()
+        raise OpenRGBDisconnected() from e
+    comms.read()  # Releases the lock once the reply is in
+    return time.perf_counter() - started
+
+
+def zone_size_range(device, zone_index):
+    """Smallest and largest LED count the controller accepts for a zone"""
+    data = getattr(device, "data", None)
+    zone = device.zones[zone_index]
+    try:
+        zone_data = data.zones[zone_index]
+        return zone_data.leds_min, zone_data.leds_max
+    except (AttributeError, IndexError):
+        return len(zone.leds), len(zone.leds)
+
+
+def resize_zones(client, device, zone_sizes):
+    """Resize the addressable zones of a device on the server
+
+    Sizes are clamped to what each zone accepts and fixed size zones are
+    left alone. All resizes go out in one write, then only this device is
+    re-read so its cached zones and LEDs match the real strip lengths
+    (the zone objects themselves are kept). Returns True if any zone
+    changed size.
+    """
+    packets = []
+    for index, (zone, size) in enumerate(zip(device.zones, zone_sizes)):
+        low, high = zone_size_range(device, index)
+        if low == high:
+            continue
+        size = max(low, min(high, size))
+        if size != len(zone.leds):
+            packets.append(encode_zone_resize(device.id, zone.id, size))
+    if not packets:
+        return False
+    from calibration import read_back
+    send_packet(client, b"".join(packets))
+    device.update()
+    read_back([device])
+    return True
+
+
+def device_colors_to_bytes(device):
+    """Read the cached zone colors of a device into RGBx bytes"""
+    colors = bytearray()
+    for zone in device.zones:
+        for led in zone.leds:
+            color = led.colors[0]
+            colors += bytes((color.red, color.green, color.blue, 0))
+    return bytes(colors)
+
+
+def _sync_leds(leds, colors):
+    offset = 0
+    for led in leds:
+        led.colors = [RGBColor(colors[offset], colors[offset + 1], colors[offset + 2])]
+        offset += BYTES_PER_LED
+
+
+def sync_cached_colors(device, colors):
+    """Mirror raw RGBx bytes into the cached LED objects after a direct write"""
+    _sync_leds((led for zone in device.zones for led in zone.leds), colors)
+
+
+def set_zone_colors(client, device, zone, colors):
+    """Fill a zone from one color or an array of colors with a single packet"""
+    from calibration import calibrate  # Imported here: calibration imports profile_store, which imports this module
+    data = pack_colors(colors, len(zone.leds))
+    send_packet(client, encode_zone_colors(device.id, zone.id, calibrate(device, data)))
+    _sync_leds(zone.leds, data)
+
+
+def set_device_colors(client, device, colors):
+    """Fill a whole device from one color or an array of colors with a single packet"""
+    from calibration import calibrate
+    data = pack_colors(colors, sum(len(zone.leds) for zone in device.zones))
+    send_packet(client, encode_device_colors(device.id, calibrate(device, data)))
+    sync_cached_colors(device, data)
+
+
+def device_color_array(device):
+    """Cached colors of a device as a writable uint8 (n, 3) array"""
+    import numpy as np
+    colors = np.frombuffer(device_colors_to_bytes(device), dtype=np.uint8)
+    return colors.reshape(-1, BYTES_PER_LED)[:, :3].copy()
+
+
+def zone_slices(device):
+    """Slice of each zone in the device-wide LED order"""
+    slices = {}
+    start = 0
+    for zone in device.zones:
+        slices[zone] = slice(start, start + len(zone.leds))
+        start += len(zone.leds)
+    return slices
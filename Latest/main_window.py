@@ -1,186 +1,38 @@
 import customtkinter as ctk
-import os
 import sys
-import time
 import atexit
 import signal
-import shutil
-import psutil
-import subprocess
 from tkinter import messagebox
-from openrgb import OpenRGBClient
 from openrgb.utils import RGBColor
 import tkinter.colorchooser as colorchooser
 from threading import Thread
 from color_control_window import ColorControlWindow
+from profile_store import ProfileStore
+from effect_engine import EffectEngineProcess
+from effects import EFFECTS
+from plugins import discover_plugins
+from global_ops import turn_all_off, apply_color_all, apply_profile_all, apply_effect_all
+from resilient_client import ResilientClient
+from api_server import ApiHandler, api_from_env
+from openrgb_server import (
+    start_openrgb_server,
+    connect_to_openrgb,
+    cleanup_on_exit,
+)
 # Global variables
-openrgb_server_process = None
 client = None
 
+# How often the connection to the OpenRGB server is checked
+CONNECTION_CHECK_MS = 1000
+# How often control API commands are picked up on the Tk loop
+API_POLL_MS = 10
+# How often a device refresh running in the background is checked
+REFRESH_POLL_MS = 100
+
 # Set global appearance
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
 
-# For connecting to OpenRGB server and application 
-def find_openrgb_executable():
-    """Find OpenRGB executable in common locations"""
-    possible_paths = [
-        # Windows paths
-        r"C:\Program Files\OpenRGB\OpenRGB.exe",
-        r"C:\Program Files (x86)\OpenRGB\OpenRGB.exe",
-        r".\OpenRGB.exe",
-        r".\OpenRGB\OpenRGB.exe",
-        # Linux paths
-        "/usr/bin/openrgb",
-        "/usr/local/bin/openrgb",
-        "./openrgb",
-        # macOS paths
-        "/Applications/OpenRGB.app/Contents/MacOS/OpenRGB",
-        "/usr/local/bin/openrgb",
-    ]
-    
-    # Also check PATH
-    path_executable = shutil.which("openrgb") or shutil.which("OpenRGB")
-    if path_executable:
-        possible_paths.insert(0, path_executable)
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            return path
-    
-    return None
-
-def is_openrgb_server_running():
-    """Check if OpenRGB server is already running"""
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-        try:
-            if proc.info['name'] and 'openrgb' in proc.info['name'].lower():
-                cmdline = proc.info.get('cmdline', [])
-                if cmdline and any('--server' in arg or '-s' in arg for arg in cmdline):
-                    return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return False
-
-def start_openrgb_server():
-    """Start OpenRGB server if not already running"""
-    global openrgb_server_process
-    
-    # Check if server is already running
-    if is_openrgb_server_running():
-        print("OpenRGB server is already running.")
-        return True
-    
-    # Find OpenRGB executable
-    openrgb_path = find_openrgb_executable()
-    if not openrgb_path:
-        messagebox.showerror(
-            "OpenRGB Not Found", 
-            "OpenRGB executable not found!\n\n"
-            "Please install OpenRGB or place OpenRGB.exe in the same directory as this script.\n"
-            "Download from: https://openrgb.org/"
-        )
-        return False
-    
-    try:
-        # Start OpenRGB server
-        print(f"Starting OpenRGB server from: {openrgb_path}")
-        
-        # Different startup commands for different platforms
-        if sys.platform.startswith('win'):
-            # Windows: Use CREATE_NO_WINDOW to hide console
-            openrgb_server_process = subprocess.Popen(
-                [openrgb_path, "--server", "--server-port", "6742"],
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-        else:
-            # Linux/macOS
-            openrgb_server_process = subprocess.Popen(
-                [openrgb_path, "--server", "--server-port", "6742"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-        
-        # Wait a moment for server to start
-        time.sleep(3)
-        
-        # Check if process is still running (didn't crash immediately)
-        if openrgb_server_process.poll() is None:
-            print("OpenRGB server started successfully!")
-            return True
-        else:
-            print("OpenRGB server failed to start.")
-            return False
-            
-    except FileNotFoundError:
-        messagebox.showerror(
-            "OpenRGB Error", 
-            f"Could not start OpenRGB from: {openrgb_path}\n"
-            "Please check if the file exists and is executable."
-        )
-        return False
-    except Exception as e:
-        messagebox.showerror(
-            "OpenRGB Error", 
-            f"Error starting OpenRGB server: {str(e)}"
-        )
-        return False
-
-def stop_openrgb_server():
-    """Stop the OpenRGB server process"""
-    global openrgb_server_process
-    
-    if openrgb_server_process and openrgb_server_process.poll() is None:
-        try:
-            print("Stopping OpenRGB server...")
-            openrgb_server_process.terminate()
-            
-            # Wait for graceful shutdown
-            try:
-                openrgb_server_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                # Force kill if it doesn't stop gracefully
-                openrgb_server_process.kill()
-                openrgb_server_process.wait()
-            
-            print("OpenRGB server stopped.")
-        except Exception as e:
-            print(f"Error stopping OpenRGB server: {e}")
-
-def cleanup_on_exit():
-    """Cleanup function called when the application exits"""
-    stop_openrgb_server()
-
-def connect_to_openrgb():
-    """Connect to OpenRGB with retry logic"""
-    max_retries = 5
-    retry_delay = 2
-    
-    for attempt in range(max_retries):
-        try:
-            print(f"Attempting to connect to OpenRGB (attempt {attempt + 1}/{max_retries})...")
-            client = OpenRGBClient()
-            client.connect()
-            print("Successfully connected to OpenRGB!")
-            return client
-        except Exception as e:
-            print(f"Connection attempt {attempt + 1} failed: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-            else:
-                messagebox.showerror(
-                    "Connection Error",
-                    "Failed to connect to OpenRGB server after multiple attempts.\n\n"
-                    "Please check:\n"
-                    "1. OpenRGB is installed correctly\n"
-                    "2. Your RGB hardware is detected\n"
-                    "3. You have proper permissions\n"
-                    "4. No firewall is blocking the connection"
-                )
-                return None
-
 # Create main application window
 class RGBControlApp(ctk.CTk):
     def __init__(self):
@@ -208,6 +60,10 @@ class RGBControlApp(ctk.CTk):
         self.selected_device = None
         self.selected_zone = None
         self.client = None
+        self.profile_store = None
+        self.effect_engine = EffectEngineProcess()
+        self.api_server = None  # Control API, served when HANYARGB_API is set
+        self.outages_seen = 0  # Connection outages already reported in the status bar
         
         # Create UI
         self.create_ui()
@@ -270,6 +126,52 @@ class RGBControlApp(ctk.CTk):
             height=40
         )
         self.refresh_btn.pack(pady=10)
+        
+        # Global actions applied to every connected device at once
+        self.global_frame = ctk.CTkFrame(self.control_frame)
+        self.global_frame.pack(pady=(0, 10))
+        
+        self.all_off_btn = ctk.CTkButton(
+            self.global_frame,
+            text="All Devices Off",
+            command=self.turn_all_devices_off,
+            width=200,
+            height=40,
+            fg_color=["#E74C3C", "#C0392B"],  # Red color
+            hover_color=["#C0392B", "#922B21"]
+        )
+        self.all_off_btn.pack(side="left", padx=(0, 10))
+        
+        self.color_all_btn = ctk.CTkButton(
+            self.global_frame,
+            text="Color All Devices",
+            command=self.color_all_devices,
+            width=200,
+            height=40
+        )
+        self.color_all_btn.pack(side="left", padx=(0, 10))
+        
+        self.profile_all_btn = ctk.CTkButton(
+            self.global_frame,
+            text="Restore Profile",
+            command=self.restore_all_profiles,
+            width=200,
+            height=40
+        )
+        self.profile_all_btn.pack(side="left", padx=(0, 10))
+        
+        # Library effects followed by the user's plugins (effect name -> label)
+        self.effect_labels = {name: effect.label for name, effect in EFFECTS.items()}
+        self.effect_labels.update(discover_plugins())
+        self.effect_all_menu = ctk.CTkOptionMenu(
+            self.global_frame,
+            values=list(self.effect_labels.values()),
+            command=self.start_effect_on_all,
+            width=200,
+            height=40
+        )
+        self.effect_all_menu.set("Effect on All")
+        self.effect_all_menu.pack(side="left")
     
     def on_window_resize(self, event):
         """Handle window resize events to make buttons responsive"""
@@ -325,18 +227,57 @@ class RGBControlApp(ctk.CTk):
             self.update()
             
             # Connect to OpenRGB
-            self.client = connect_to_openrgb()
-            if not self.client:
+            client = connect_to_openrgb()
+            if not client:
                 self.status_label.configure(text="Failed to connect to OpenRGB")
                 return
+            self.client = ResilientClient(client)
             
-            self.status_label.configure(text="Connected! Select a device.")
+            # Restore the saved lighting state of every device
+            self.profile_store = ProfileStore()
+            restored = self.profile_store.apply(self.client)
+            if restored:
+                self.status_label.configure(text=f"Connected! Restored {restored} device profile(s). Select a device.")
+            else:
+                self.status_label.configure(text="Connected! Select a device.")
             self.load_devices()
             
+            # Start the effect worker process in the background
+            self.effect_engine.start()
+            
+            # Commands from the control API are applied on the Tk loop
+            self.api_server = api_from_env(ApiHandler(self.client, self.effect_engine))
+            if self.api_server:
+                self.after(API_POLL_MS, self.poll_api)
+            
+            # Watch the connection so a restarted server is picked up again
+            self.after(CONNECTION_CHECK_MS, self.check_connection)
+            
         except Exception as e:
             self.status_label.configure(text=f"Error: {str(e)}")
             print(f"Initialization error: {e}")
     
+    def poll_api(self):
+        """Apply commands that arrived on the control API"""
+        if not self.api_server:
+            return
+        self.api_server.drain()
+        self.after(API_POLL_MS, self.poll_api)
+    
+    def check_connection(self):
+        """Reconnect in the background if the OpenRGB server went away"""
+        if not self.client:
+            return
+        self.after(CONNECTION_CHECK_MS, self.check_connection)
+        if not self.client.check():
+            self.status_label.configure(
+                text=f"Lost connection to OpenRGB, reconnecting... ({self.client.outage_time():.0f}s)"
+            )
+        elif self.client.outages > self.outages_seen:
+            self.outages_seen = self.client.outages
+            self.status_label.configure(text=f"Reconnected to OpenRGB after {self.client.last_outage:.1f}s")
+            self.load_devices()
+    
     def load_devices(self):
         """Load and display available RGB devices"""
         if not self.client:
@@ -397,7 +338,9 @@ class RGBControlApp(ctk.CTk):
             from color_control_window import ColorControlWindow
             # Hide main window
             self.withdraw()
-            color_window = ColorControlWindow(self, self.client, self.selected_device)
+            color_window = ColorControlWindow(
+                self, self.client, self.selected_device, self.profile_store, self.effect_engine
+            )
             # Show main window when color window is closed
             color_window.protocol("WM_DELETE_WINDOW", lambda: self.on_color_window_close(color_window))
         except Exception as e:
@@ -408,26 +351,78 @@ class RGBControlApp(ctk.CTk):
     
     def on_color_window_close(self, color_window):
         """Handle color window closing"""
+        color_window.save_profile()
         color_window.destroy()
         self.deiconify()  # Show main window again
     
+    def run_global(self, operation, *args):
+        """Run a global operation and show how long it took"""
+        if not self.client:
+            return
+        try:
+            result = operation(*args)
+            self.status_label.configure(text=str(result))
+        except Exception as e:
+            print(f"Error in global operation: {e}")
+            self.status_label.configure(text=f"Error: {str(e)}")
+    
+    def turn_all_devices_off(self):
+        """Turn off every LED on every device"""
+        self.effect_engine.stop_all()
+        self.effect_engine.when_stopped(self, lambda: self.run_global(turn_all_off, self.client))
+    
+    def color_all_devices(self):
+        """Pick a color and apply it to every device"""
+        color = colorchooser.askcolor(title="Choose Color for All Devices", parent=self)
+        if color[0]:
+            rgb = tuple(int(c) for c in color[0])
+            self.effect_engine.stop_all()
+            self.effect_engine.when_stopped(self, lambda: self.run_global(apply_color_all, self.client, rgb))
+    
+    def restore_all_profiles(self):
+        """Restore the saved colors of every device"""
+        if self.profile_store:
+            self.effect_engine.stop_all()
+            self.effect_engine.when_stopped(
+                self, lambda: self.run_global(apply_profile_all, self.client, self.profile_store)
+            )
+    
+    def start_effect_on_all(self, label):
+        """Start the picked effect on every device"""
+        for name, effect_label in self.effect_labels.items():
+            if effect_label == label:
+                self.run_global(apply_effect_all, self.client, self.effect_engine, name)
+                break
+        self.effect_all_menu.set("Effect on All")
+    
     def refresh_devices(self):
         """Refresh the device list"""
-        if self.client:
-            try:
-                # Reconnect to get updated device list
-                self.client.disconnect()
-                time.sleep(1)
-                self.client.connect()
-                self.load_devices()
-                self.status_label.configure(text="Devices refreshed!")
-            except Exception as e:
-                print(f"Error refreshing devices: {e}")
-                self.status_label.configure(text=f"Error refreshing: {str(e)}")
+        if not self.client:
+            return
+        # Reconnect in the background to get the updated device list, so the
+        # handshake never blocks Tk; devices that are still there keep
+        # their objects
+        if self.client.start_reconnect(outage=False):
+            self.status_label.configure(text="Refreshing devices...")
+        self.after(REFRESH_POLL_MS, self.finish_refresh)
+
+    def finish_refresh(self):
+        """Show the new device list once the background reconnect is done"""
+        if not self.client:
+            return
+        if self.client.reconnecting:
+            self.after(REFRESH_POLL_MS, self.finish_refresh)
+            return
+        self.load_devices()
+        self.status_label.configure(text="Devices refreshed!")
     
     def on_closing(self):
         """Handle application closing"""
         try:
+            if self.api_server:
+                self.api_server.stop()
+                self.api_server = None
+            self.effect_engine.shutdown()
             if self.client:
                 self.client.disconnect()
             cleanup_on_exit()
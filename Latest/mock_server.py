@@ -0,0 +1,142 @@
+"""Minimal stand-in for the OpenRGB SDK server.
+
+Speaks enough of the protocol for a client to connect (protocol
+version, controller count, profile and plugin list requests are
+answered, with no controllers), then swallows everything else while
+counting packets and bytes per device. Devices can be given a
+processing delay to act like slow controllers. Used to benchmark the
+write path and try the CLI without hardware:
+
+    python mock_server.py [--port 6742] [--delay DEVICE=SECONDS ...]
+"""
+import sys
+import time
+import socket
+import argparse
+import threading
+from openrgb.utils import PacketType
+from led_packets import HEADER
+
+# Protocol version the mock claims to speak
+MOCK_PROTOCOL_VERSION = 4
+# Packets that carry LED colors, delayed for slow devices
+LED_PACKETS = (
+    PacketType.RGBCONTROLLER_UPDATELEDS,
+    PacketType.RGBCONTROLLER_UPDATEZONELEDS,
+    PacketType.RGBCONTROLLER_UPDATESINGLELED,
+)
+
+
+class MockServer:
+    """Threaded SDK server that accepts and counts packets"""
+
+    def __init__(self, port=6742, address="127.0.0.1", delays=None):
+        self.address = address
+        self.port = port
+        self.delays = delays or {}  # device id -> seconds spent per LED packet
+        self.sock = None
+        self.running = False
+        self.lock = threading.Lock()
+        self.packets = 0
+        self.bytes = 0
+        self.device_packets = {}  # device id -> LED packets received
+        self.clients = 0
+
+    def start(self):
+        """Start listening; port 0 picks a free port (see self.port)"""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.address, self.port))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self._accept, name="Mock SDK server", daemon=True).start()
+        return self
+
+    def _accept(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.clients += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        reader = conn.makefile("rb")
+        try:
+            while self.running:
+                header = reader.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                magic, device_id, packet_type, size = HEADER.unpack(header)
+                if magic != b"ORGB":
+                    return
+                reader.read(size)
+                with self.lock:
+                    self.packets += 1
+                    self.bytes += HEADER.size + size
+                if packet_type == PacketType.REQUEST_PROTOCOL_VERSION:
+                    conn.sendall(HEADER.pack(b"ORGB", 0, packet_type, 4) + MOCK_PROTOCOL_VERSION.to_bytes(4, "little"))
+                elif packet_type == PacketType.REQUEST_CONTROLLER_COUNT:
+                    conn.sendall(HEADER.pack(b"ORGB", 0, packet_type, 4) + (0).to_bytes(4, "little"))
+                elif packet_type in (PacketType.REQUEST_PROFILE_LIST, PacketType.REQUEST_PLUGIN_LIST):
+                    # Empty list: data size and item count
+                    conn.sendall(HEADER.pack(b"ORGB", 0, packet_type, 6) + (6).to_bytes(4, "little") + bytes(2))
+                elif packet_type in LED_PACKETS:
+                    with self.lock:
+                        self.device_packets[device_id] = self.device_packets.get(device_id, 0) + 1
+                    if device_id in self.delays:
+                        time.sleep(self.delays[device_id])
+        except OSError:
+            pass
+        finally:
+            reader.close()
+            conn.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clients": self.clients,
+                "packets": self.packets,
+                "bytes": self.bytes,
+                "device_packets": dict(self.device_packets),
+            }
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+
+def parse_delay(text):
+    """DEVICE=SECONDS -> (device id, seconds)"""
+    device, _, seconds = text.partition("=")
+    return int(device), float(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock OpenRGB SDK server")
+    parser.add_argument("--port", type=int, default=6742)
+    parser.add_argument("--delay", type=parse_delay, action="append", default=[], metavar="DEVICE=SECONDS",
+                        help="Time a device takes to process each LED packet")
+    parser.add_argument("--stats-interval", type=float, default=5, help="Print counters every N seconds")
+    args = parser.parse_args(argv)
+
+    server = MockServer(args.port, delays=dict(args.delay)).start()
+    print(f"Mock OpenRGB server listening on port {server.port}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            print(server.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Size of the random lattice; noise repeats after this many units
+DEFAULT_PERIOD = 256
+
+
+def quintic(t):
+    """Perlin's fade curve 6t^5 - 15t^4 + 10t^3"""
+    return t * t * t * (t * (t * 6.0 - 15.0) + 10.0)
+
+
+class PerlinNoise1D:
+    """Seeded 1D gradient (Perlin) noise in roughly [-1, 1]"""
+
+    def __init__(self, seed=None, period=DEFAULT_PERIOD):
+        self.period = period
+        self.gradients = np.random.default_rng(seed).uniform(-1.0, 1.0, period)
+
+    def sample(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        base = np.floor(x)
+        i0 = base.astype(np.int64) % self.period
+        i1 = (i0 + 1) % self.period
+        f = x - base
+        a = self.gradients[i0] * f
+        b = self.gradients[i1] * (f - 1.0)
+        return (a + (b - a) * quintic(f)) * 2.0
+
+    def fractal(self, x, octaves=3, persistence=0.5):
+        """Sum of octaves at doubling frequency, normalized to [-1, 1]"""
+        x = np.asarray(x, dtype=np.float64)
+        total = np.zeros_like(x)
+        amplitude = 1.0
+        norm = 0.0
+        for octave in range(octaves):
+            total += self.sample(x * (2 ** octave) + octave * 31.7) * amplitude
+            norm += amplitude
+            amplitude *= persistence
+        return total / norm
+
+
+def heat_palette():
+    """256 entry lookup table from heat to color: black, red, yellow, white"""
+    heat = np.arange(256, dtype=np.float32)
+    ramp = (heat % 85) * 3  # 0-252 inside each third
+    palette = np.zeros((256, 3), dtype=np.float32)
+    low = heat < 85
+    mid = (heat >= 85) & (heat < 170)
+    high = heat >= 170
+    palette[low, 0] = ramp[low]
+    palette[mid, 0] = 255
+    palette[mid, 1] = ramp[mid]
+    palette[high, 0] = 255
+    palette[high, 1] = 255
+    palette[high, 2] = ramp[high]
+    return palette.astype(np.uint8)
+
+
+HEAT_PALETTE = heat_palette()
+
+
+class FireModel:
+    """Heat diffusion fire (cooling, upward drift, sparks) for one strip
+
+    Index 0 is the base of the flame. Every step updates the whole strip
+    with array operations and draws all of its randomness in one call.
+    """
+
+    def __init__(self, length, cooling=55, sparking=120, seed=None):
+        self.length = length
+        self.cooling = cooling
+        self.sparking = sparking
+        self.rng = np.random.default_rng(seed)
+        self.heat = np.zeros(length, dtype=np.float32)
+        self.spark_zone = max(1, min(7, length))
+
+    def step(self):
+        if not self.length:
+            return self.heat
+        # One draw for all randomness of this step
+        noise = self.rng.random(self.length + 3)
+        max_cooling = (self.cooling * 10.0) / self.length + 2.0
+        np.subtract(self.heat, noise[:self.length] * max_cooling, out=self.heat)
+        np.maximum(self.heat, 0, out=self.heat)
+        # Heat drifts up and diffuses a little
+        if self.length > 2:
+            self.heat[2:] = (self.heat[1:-1] + 2.0 * self.heat[:-2]) / 3.0
+        # Randomly ignite new sparks near the base
+        if noise[-3] * 255 < self.sparking:
+            position = int(noise[-2] * self.spark_zone)
+            self.heat[position] = min(255.0, self.heat[position] + 160 + noise[-1] * 95)
+        return self.heat
+
+    def colors(self):
+        """Map the current heat to colors through the heat palette"""
+        return HEAT_PALETTE[self.heat.astype(np.uint8)]
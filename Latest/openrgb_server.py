@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import shutil
+import psutil
+import subprocess
+from openrgb import OpenRGBClient
+from calibration import read_back
+
+# Global variables
+openrgb_server_process = None
+
+
+def show_error(title, message, interactive=True):
+    """Report an error, with a dialog box when running with a GUI"""
+    print(f"{title}: {message}")
+    if interactive:
+        # Imported lazily so headless callers never load Tk
+        from tkinter import messagebox
+        messagebox.showerror(title, message)
+
+
+# For connecting to OpenRGB server and application
+def find_openrgb_executable():
+    """Find OpenRGB executable in common locations"""
+    possible_paths = [
+        # Windows paths
+        r"C:\Program Files\OpenRGB\OpenRGB.exe",
+        r"C:\Program Files (x86)\OpenRGB\OpenRGB.exe",
+        r".\OpenRGB.exe",
+        r".\OpenRGB\OpenRGB.exe",
+        # Linux paths
+        "/usr/bin/openrgb",
+        "/usr/local/bin/openrgb",
+        "./openrgb",
+        # macOS paths
+        "/Applications/OpenRGB.app/Contents/MacOS/OpenRGB",
+        "/usr/local/bin/openrgb",
+    ]
+
+    # Also check PATH
+    path_executable = shutil.which("openrgb") or shutil.which("OpenRGB")
+    if path_executable:
+        possible_paths.insert(0, path_executable)
+
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+
+    return None
+
+def is_openrgb_server_running():
+    """Check if OpenRGB server is already running"""
+    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+        try:
+            if proc.info['name'] and 'openrgb' in proc.info['name'].lower():
+                cmdline = proc.info.get('cmdline', [])
+                if cmdline and any('--server' in arg or '-s' in arg for arg in cmdline):
+                    return True
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return False
+
+def start_openrgb_server(interactive=True):
+    """Start OpenRGB server if not already running"""
+    global openrgb_server_process
+
+    # Check if server is already running
+    if is_openrgb_server_running():
+        print("OpenRGB server is already running.")
+        return True
+
+    # Find OpenRGB executable
+    openrgb_path = find_openrgb_executable()
+    if not openrgb_path:
+        show_error(
+            "OpenRGB Not Found",
+            "OpenRGB executable not found!\n\n"
+            "Please install OpenRGB or place OpenRGB.exe in the same directory as this script.\n"
+            "Download from: https://openrgb.org/",
+            interactive
+        )
+        return False
+
+    try:
+        # Start OpenRGB server
+        print(f"Starting OpenRGB server from: {openrgb_path}")
+
+        # Different startup commands for different platforms
+        if sys.platform.startswith('win'):
+            # Windows: Use CREATE_NO_WINDOW to hide console
+            openrgb_server_process = subprocess.Popen(
+                [openrgb_path, "--server", "--server-port", "6742"],
+                creationflags=subprocess.CREATE_NO_WINDOW,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        else:
+            # Linux/macOS
+            openrgb_server_process = subprocess.Popen(
+                [openrgb_path, "--server", "--server-port", "6742"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+
+        # Wait a moment for server to start
+        time.sleep(3)
+
+        # Check if process is still running (didn't crash immediately)
+        if openrgb_server_process.poll() is None:
+            print("OpenRGB server started successfully!")
+            return True
+        else:
+            print("OpenRGB server failed to start.")
+            return False
+
+    except FileNotFoundError:
+        show_error(
+            "OpenRGB Error",
+            f"Could not start OpenRGB from: {openrgb_path}\n"
+            "Please check if the file exists and is executable.",
+            interactive
+        )
+        return False
+    except Exception as e:
+        show_error(
+            "OpenRGB Error",
+            f"Error starting OpenRGB server: {str(e)}",
+            interactive
+        )
+        return False
+
+def stop_openrgb_server():
+    """Stop the OpenRGB server process"""
+    global openrgb_server_process
+
+    if openrgb_server_process and openrgb_server_process.poll() is None:
+        try:
+            print("Stopping OpenRGB server...")
+            openrgb_server_process.terminate()
+
+            # Wait for graceful shutdown
+            try:
+                openrgb_server_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                # Force kill if it doesn't stop gracefully
+                openrgb_server_process.kill()
+                openrgb_server_process.wait()
+
+            print("OpenRGB server stopped.")
+        except Exception as e:
+            print(f"Error stopping OpenRGB server: {e}")
+
+def cleanup_on_exit():
+    """Cleanup function called when the application exits"""
+    stop_openrgb_server()
+
+def connect_to_openrgb(interactive=True):
+    """Connect to OpenRGB with retry logic"""
+    max_retries = 5
+    retry_delay = 2
+
+    for attempt in range(max_retries):
+        try:
+            print(f"Attempting to connect to OpenRGB (attempt {attempt + 1}/{max_retries})...")
+            client = OpenRGBClient()
+            client.connect()
+            read_back(client.devices)  # The server reports the calibrated colors last sent
+            print("Successfully connected to OpenRGB!")
+            return client
+        except Exception as e:
+            print(f"Connection attempt {attempt + 1} failed: {e}")
+            if attempt < max_retries - 1:
+                time.sleep(retry_delay)
+            else:
+                show_error(
+                    "Connection Error",
+                    "Failed to connect to OpenRGB server after multiple attempts.\n\n"
+                    "Please check:\n"
+                    "1. OpenRGB is installed correctly\n"
+                    "2. Your RGB hardware is detected\n"
+                    "3. You have proper permissions\n"
+                    "4. No firewall is blocking the connection",
+                    interactive
+                )
+                return None
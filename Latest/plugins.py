@@ -0,0 +1,393 @@
+"""User effect plugins, run in a worker process with a frame budget.
+
+A plugin is a Python file in ~/.hanyargb/plugins exposing
+
+    render(t, positions) -> array
+
+where t is the time in seconds since the effect started and positions
+is a float (n, 3) array of LED positions in [0, 1] (layout positions, or
+spread along x when there is no layout). It returns n colors as (n, 3)
+values in 0-255, or one color for every LED. An optional LABEL string
+names it in the UI. Plugins are found without importing them and only
+loaded when first started, inside a worker process, so a plugin that
+crashes, hangs or burns CPU can't take the effect engine down with it.
+
+Frames are pipelined: a zone gets the frame its plugin rendered for the
+previous tick, so the render loop never waits on a plugin. A plugin over
+its per-frame budget is throttled to render every few frames instead;
+one that needs more than MAX_THROTTLE frames, raises, or hangs is
+disabled for the rest of the session. The worker is not a security
+sandbox; plugins run with the user's permissions.
+"""
+import os
+import ast
+import sys
+import math
+import time
+import secrets
+import threading
+import subprocess
+import importlib.util
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from app_paths import get_app_path
+
+# Effect names of plugins: prefix + file name without .py
+PLUGIN_PREFIX = "plugin:"
+# Worker time a plugin may spend on one frame (seconds)
+FRAME_BUDGET = 0.004
+# A plugin that needs more frames than this per render is disabled
+MAX_THROTTLE = 8
+# A render not answered within this time counts as hung (seconds)
+HANG_TIMEOUT = 1.0
+# Weight of a new render time in the moving average
+BUDGET_SMOOTHING = 0.3
+# Carries the worker's connection key, so it never shows up in the process list
+KEY_ENV = "HANYARGB_PLUGIN_KEY"
+
+
+def plugin_dir():
+    """Directory plugins are loaded from (HANYARGB_HOME/plugins)"""
+    return os.path.dirname(get_app_path("plugins", "x"))
+
+
+def is_plugin_effect(name):
+    return isinstance(name, str) and name.startswith(PLUGIN_PREFIX)
+
+
+def read_label(path):
+    """LABEL of a plugin file, read without running it"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            if any(isinstance(target, ast.Name) and target.id == "LABEL" for target in node.targets):
+                return node.value.value
+    return None
+
+
+def discover_plugins(directory=None):
+    """Effect name -> UI label of every plugin file in the directory"""
+    directory = directory or plugin_dir()
+    plugins = {}
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return plugins
+    for file_name in names:
+        if not file_name.endswith(".py") or file_name.startswith("_"):
+            continue
+        stem = file_name[:-3]
+        label = read_label(os.path.join(directory, file_name)) or stem.replace("_", " ").title()
+        plugins[PLUGIN_PREFIX + stem] = label
+    return plugins
+
+
+def default_positions(led_count):
+    """Positions for a zone without a layout: spread along x, centered in y and z"""
+    positions = np.full((led_count, 3), 0.5, dtype=np.float32)
+    positions[:, 0] = np.arange(led_count, dtype=np.float32) / max(1, led_count)
+    return positions
+
+
+def load_plugin(directory, name):
+    """Import a plugin module by effect name"""
+    stem = name[len(PLUGIN_PREFIX):]
+    path = os.path.join(directory, f"{stem}.py")
+    spec = importlib.util.spec_from_file_location(f"hanyargb_plugin_{stem}", path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Plugin not found: {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not callable(getattr(module, "render", None)):
+        raise ImportError(f"Plugin {stem} has no render(t, positions)")
+    return module
+
+
+def run_plugin_worker(conn, directory):
+    """Serve render requests from the engine until it hangs up"""
+    try:
+        os.nice(10)  # Device writers come first
+    except (AttributeError, OSError):
+        pass
+    modules = {}
+    slots = {}  # slot -> (effect name, positions)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        kind = message[0]
+        if kind == "register":
+            _, slot, name, positions = message
+            slots[slot] = (name, positions)
+            if name not in modules:
+                try:
+                    modules[name] = load_plugin(directory, name)
+                except Exception as e:
+                    conn.send(("error", slot, f"{type(e).__name__}: {e}"))
+        elif kind == "unregister":
+            slots.pop(message[1], None)
+        elif kind == "render":
+            _, slot, t = message
+            name, positions = slots.get(slot, (None, None))
+            module = modules.get(name)
+            if module is None:
+                continue
+            started = time.perf_counter()
+            try:
+                colors = np.asarray(module.render(t, positions), dtype=np.float32)
+                frame = np.empty((len(positions), 3), dtype=np.uint8)
+                frame[:] = np.clip(colors, 0, 255)
+            except Exception as e:
+                conn.send(("error", slot, f"{type(e).__name__}: {e}"))
+                continue
+            conn.send(("frame", slot, frame.tobytes(), time.perf_counter() - started))
+        elif kind == "shutdown":
+            return
+
+
+class PluginSlot:
+    """One zone running a plugin: its latest frame and render timing"""
+
+    def __init__(self, slot, name, positions):
+        self.slot = slot
+        self.name = name
+        self.positions = positions
+        self.colors = np.zeros((len(positions), 3), dtype=np.uint8)
+        self.pending_since = None  # When the unanswered render request was sent
+        self.render_time = 0.0  # Smoothed worker time per render
+        self.skip = 0  # Frames left before the next request when throttled
+        self.throttle = 1  # Frames per render
+
+
+class PluginHost:
+    """Engine side of the plugin worker: requests frames and enforces budgets"""
+
+    def __init__(self, directory=None, budget=FRAME_BUDGET):
+        self.directory = directory or plugin_dir()
+        self.budget = budget
+        self.process = None
+        self.conn = None
+        self.ready_conn = None  # Connection of a freshly started worker, taken up by connection()
+        self.thread = None
+        self.slots = {}
+        self.next_slot = 0
+        self.disabled = {}  # effect name -> reason
+        self.renders = 0
+        self.restarts = 0
+        self.last_error = ""
+
+    def start(self):
+        """Start the worker in the background if it is not running
+
+        The worker is a separate interpreter rather than a multiprocessing
+        child, since the effect engine itself runs in a daemon process that
+        may not have children. It listens on a loopback port it prints on
+        stdout and only accepts the engine's key. Starting it takes a
+        moment, so zones show black until it is up rather than stalling
+        the render loop.
+        """
+        if self.conn is not None or self.ready_conn is not None:
+            return
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._launch, name="Plugin worker start", daemon=True)
+        self.thread.start()
+
+    def _launch(self):
+        key = secrets.token_bytes(16)
+        env = dict(os.environ, **{KEY_ENV: key.hex()})
+        try:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--worker", self.directory],
+                stdout=subprocess.PIPE,
+                env=env,
+            )
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("worker exited")
+            conn = Client(("127.0.0.1", int(line)), authkey=key)
+        except Exception as e:
+            self.last_error = f"Plugin worker did not start: {e}"
+            print(self.last_error)
+            return
+        self.process = process
+        self.ready_conn = conn
+
+    def connection(self):
+        """The worker connection, or None while it starts
+
+        Zones are (re)registered here, on the render thread, once a new
+        worker is up, so only that thread ever sends to it.
+        """
+        if self.conn is None and self.ready_conn is not None:
+            self.conn, self.ready_conn = self.ready_conn, None
+            for slot in list(self.slots.values()):
+                slot.pending_since = None
+                if slot.name not in self.disabled:
+                    self.conn.send(("register", slot.slot, slot.name, slot.positions))
+        return self.conn
+
+    def register(self, name, positions):
+        """Start rendering a plugin for one zone, returns its PluginSlot"""
+        slot = PluginSlot(self.next_slot, name, positions)
+        self.next_slot += 1
+        self.slots[slot.slot] = slot
+        conn = self.connection()
+        if conn is None:
+            self.start()  # Registered when the worker is up
+        elif name not in self.disabled:
+            conn.send(("register", slot.slot, name, positions))
+        return slot
+
+    def unregister(self, slot):
+        if self.slots.pop(slot.slot, None) is not None and self.conn is not None:
+            try:
+                self.conn.send(("unregister", slot.slot))
+            except (BrokenPipeError, OSError):
+                pass
+
+    def disable(self, name, reason):
+        if name in self.disabled:
+            return
+        self.disabled[name] = reason
+        self.last_error = f"Plugin {name[len(PLUGIN_PREFIX):]} disabled: {reason}"
+        print(self.last_error)
+
+    def restart(self):
+        """Replace a dead or stuck worker; disabled plugins are not loaded again"""
+        self.restarts += 1
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.kill()
+            self.process = None
+        for slot in self.slots.values():
+            slot.pending_since = None  # Frames asked of the old worker never come
+        self.start()
+
+    def collect(self):
+        """Take in every frame the worker has finished"""
+        conn = self.connection()
+        if conn is None:
+            return
+        try:
+            while conn.poll():
+                self.handle(conn.recv())
+        except (EOFError, OSError):
+            self.last_error = "Plugin worker exited"
+            self.restart()
+
+    def handle(self, message):
+        kind, index = message[0], message[1]
+        slot = self.slots.get(index)
+        if slot is None:
+            return
+        slot.pending_since = None
+        if kind == "error":
+            self.disable(slot.name, message[2])
+            return
+        _, _, data, elapsed = message
+        slot.colors = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        self.renders += 1
+        slot.render_time += (elapsed - slot.render_time) * BUDGET_SMOOTHING
+        # Over budget: spread the plugin's work over several frames
+        slot.throttle = max(1, math.ceil(slot.render_time / self.budget))
+        if slot.throttle > MAX_THROTTLE:
+            self.disable(slot.name, f"{slot.render_time * 1000:.1f} ms per frame, budget {self.budget * 1000:.1f} ms")
+
+    def request(self, slot, t):
+        """Ask for the frame at time t unless one is pending or the plugin is throttled"""
+        if slot.name in self.disabled or self.conn is None:
+            return
+        now = time.perf_counter()
+        if slot.pending_since is not None:
+            if now - slot.pending_since > HANG_TIMEOUT:
+                self.disable(slot.name, f"no frame in {HANG_TIMEOUT:.0f}s")
+                self.restart()
+            return
+        if slot.skip > 0:
+            slot.skip -= 1
+            return
+        try:
+            self.conn.send(("render", slot.slot, t))
+        except (BrokenPipeError, OSError):
+            self.restart()
+            return
+        slot.pending_since = now
+        slot.skip = slot.throttle - 1
+
+    def stats(self):
+        return {
+            "plugin_renders": self.renders,
+            "plugin_restarts": self.restarts,
+            "plugins_throttled": sorted({slot.name for slot in self.slots.values() if slot.throttle > 1}),
+            "plugins_disabled": dict(self.disabled),
+        }
+
+    def close(self):
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        conn = self.connection()
+        if self.process is None:
+            return
+        try:
+            conn.send(("shutdown",))
+            self.process.wait(timeout=1)
+        except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        conn.close()
+        self.process = None
+        self.conn = None
+
+
+class PluginEffect:
+    """Zone effect whose frames come from a plugin in the worker process"""
+    spatial = True
+
+    def __init__(self, host, name, led_count, positions=None):
+        self.host = host
+        self.name = name
+        self.label = name[len(PLUGIN_PREFIX):]
+        self.led_count = led_count
+        if positions is None:
+            positions = default_positions(led_count)
+        self.slot = host.register(name, np.ascontiguousarray(positions[:led_count], dtype=np.float32))
+
+    def render(self, t):
+        self.host.collect()
+        self.host.request(self.slot, t)
+        return self.slot.colors
+
+    def period(self):
+        return None
+
+    def stats(self):
+        return None
+
+    def close(self):
+        self.host.unregister(self.slot)
+
+
+def main(argv):
+    """Worker entry point: python plugins.py --worker DIRECTORY"""
+    if len(argv) != 3 or argv[1] != "--worker":
+        print("Usage: python plugins.py --worker DIRECTORY")
+        return 2
+    key = bytes.fromhex(os.environ.pop(KEY_ENV, ""))
+    with Listener(("127.0.0.1", 0), authkey=key) as listener:
+        print(listener.address[1], flush=True)
+        # Nobody reads the pipe after the port; plugin output goes to stderr
+        sys.stdout = sys.stderr
+        with listener.accept() as conn:
+            run_plugin_worker(conn, argv[2])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,192 @@
+import os
+import struct
+from app_paths import get_app_path
+from led_packets import (
+    BYTES_PER_LED,
+    encode_device_colors,
+    send_packet,
+    device_colors_to_bytes,
+    sync_cached_colors,
+    resize_zones,
+)
+
+# Profile file layout (little endian):
+#   header  : magic "HRGB", u16 version, u16 device count
+#   device  : name, location, serial (u16 length + utf-8 each)
+#             u16 zone count, u32 configured LED count per zone
+#             active effect name (u16 length + utf-8)
+#             u32 LED count, then 4 bytes (R, G, B, pad) per LED
+# The color block is stored exactly as the SDK sends it, so applying a
+# profile is one packet per device with no per-LED conversion.
+PROFILE_MAGIC = b"HRGB"
+PROFILE_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHH")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+DEFAULT_PROFILE = "default"
+
+
+def device_key(device):
+    """Stable identity of a device across reconnects: name, location and serial"""
+    metadata = getattr(device, "metadata", None)
+    location = getattr(metadata, "location", "") or ""
+    serial = getattr(metadata, "serial", "") or ""
+    return (device.name, location, serial)
+
+
+class DeviceProfile:
+    """Saved state of one device"""
+
+    def __init__(self, key, zone_led_counts=None, effect="", colors=b""):
+        self.key = key
+        self.zone_led_counts = list(zone_led_counts or [])
+        self.effect = effect or ""
+        self.colors = colors  # RGBx bytes (or a memoryview into the loaded file)
+
+    @property
+    def led_count(self):
+        return len(self.colors) // BYTES_PER_LED
+
+
+def _pack_string(value):
+    data = value.encode("utf-8")
+    return U16.pack(len(data)) + data
+
+
+def _unpack_string(view, offset):
+    (length,) = U16.unpack_from(view, offset)
+    offset += U16.size
+    return bytes(view[offset:offset + length]).decode("utf-8"), offset + length
+
+
+def encode_profiles(profiles):
+    """Serialize DeviceProfile objects into the binary profile format"""
+    chunks = [FILE_HEADER.pack(PROFILE_MAGIC, PROFILE_VERSION, len(profiles))]
+    for profile in profiles:
+        for part in profile.key:
+            chunks.append(_pack_string(part))
+        chunks.append(U16.pack(len(profile.zone_led_counts)))
+        chunks.append(struct.pack(f"<{len(profile.zone_led_counts)}I", *profile.zone_led_counts))
+        chunks.append(_pack_string(profile.effect))
+        chunks.append(U32.pack(profile.led_count))
+        chunks.append(bytes(profile.colors))
+    return b"".join(chunks)
+
+
+def decode_profiles(data):
+    """Decode a profile file buffer; color blocks stay as views into it"""
+    view = memoryview(data)
+    magic, version, count = FILE_HEADER.unpack_from(view, 0)
+    if magic != PROFILE_MAGIC:
+        raise ValueError("Not a HanyaRGB profile file")
+    if version != PROFILE_VERSION:
+        raise ValueError(f"Unsupported profile version {version}")
+
+    offset = FILE_HEADER.size
+    profiles = {}
+    for _ in range(count):
+        name, offset = _unpack_string(view, offset)
+        location, offset = _unpack_string(view, offset)
+        serial, offset = _unpack_string(view, offset)
+        (zone_count,) = U16.unpack_from(view, offset)
+        offset += U16.size
+        zone_led_counts = list(struct.unpack_from(f"<{zone_count}I", view, offset))
+        offset += 4 * zone_count
+        effect, offset = _unpack_string(view, offset)
+        (led_count,) = U32.unpack_from(view, offset)
+        offset += U32.size
+        end = offset + led_count * BYTES_PER_LED
+        if end > len(view):
+            raise ValueError("Truncated profile file")
+        key = (name, location, serial)
+        profiles[key] = DeviceProfile(key, zone_led_counts, effect, view[offset:end])
+        offset = end
+    return profiles
+
+
+def get_profile_path(name=DEFAULT_PROFILE):
+    """Return the file path of a named profile"""
+    return get_app_path("profiles", f"{name}.hrgb")
+
+
+class ProfileStore:
+    """Named profile holding the saved state of every known device"""
+
+    def __init__(self, name=DEFAULT_PROFILE, path=None):
+        self.name = name
+        self.path = path or get_profile_path(name)
+        self.profiles = {}
+        self.load()
+
+    def load(self):
+        """Load the profile file with a single read"""
+        self.profiles = {}
+        if not os.path.exists(self.path):
+            return self.profiles
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            self.profiles = decode_profiles(data)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Error loading profile {self.path}: {e}")
+        return self.profiles
+
+    def save(self):
+        """Write the profile file atomically"""
+        data = encode_profiles(list(self.profiles.values()))
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving profile {self.path}: {e}")
+
+    def get(self, device):
+        """Return the saved profile for a device, or None"""
+        return self.profiles.get(device_key(device))
+
+    def update_device(self, device, zone_led_counts=None, effect=""):
+        """Capture the current state of a device into the store"""
+        key = device_key(device)
+        if zone_led_counts is None:
+            counts = [len(zone.leds) for zone in device.zones]
+        else:
+            counts = [zone_led_counts.get(zone, len(zone.leds)) for zone in device.zones]
+        self.profiles[key] = DeviceProfile(key, counts, effect, device_colors_to_bytes(device))
+        return self.profiles[key]
+
+    def zone_led_counts_for(self, device):
+        """Map the saved zone LED counts back onto the device's zone objects"""
+        profile = self.get(device)
+        if not profile or len(profile.zone_led_counts) != len(device.zones):
+            return None
+        return dict(zip(device.zones, profile.zone_led_counts))
+
+    def apply_device(self, client, device):
+        """Push the saved colors of one device with a single write"""
+        profile = self.get(device)
+        if not profile or profile.led_count == 0:
+            return False
+        if profile.led_count != len(device.leds) and len(profile.zone_led_counts) == len(device.zones):
+            # Zones may have been resized since; put the saved sizes back first
+            resize_zones(client, device, profile.zone_led_counts)
+        if profile.led_count != len(device.leds):
+            print(f"Skipping profile for {device.name}: LED count changed "
+                  f"({profile.led_count} saved, {len(device.leds)} present)")
+            return False
+        from calibration import calibrate  # Imported here: calibration imports this module
+        send_packet(client, encode_device_colors(device.id, calibrate(device, profile.colors)))
+        sync_cached_colors(device, profile.colors)
+        return True
+
+    def apply(self, client):
+        """Push saved colors to every connected device, returns devices applied"""
+        applied = 0
+        for device in client.devices:
+            try:
+                if self.apply_device(client, device):
+                    applied += 1
+            except Exception as e:
+                print(f"Error applying profile to {device.name}: {e}")
+        return applied
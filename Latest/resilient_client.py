@@ -0,0 +1,187 @@
+"""OpenRGB client wrapper that survives server restarts.
+
+When a write finds the SDK socket broken, ResilientClient reconnects in
+the background with capped exponential backoff. Devices are matched to
+the ones held before the outage by name, location and serial, and the
+old Device, Zone and LED objects are updated in place, so windows,
+effect jobs and zone keyed dicts holding them keep working. The last
+committed colors of every device are then replayed in one write.
+"""
+import time
+import threading
+from openrgb import OpenRGBClient
+from led_packets import (
+    BYTES_PER_LED,
+    encode_device_colors,
+    send_packet,
+    device_colors_to_bytes,
+    sync_cached_colors,
+)
+from profile_store import device_key
+from calibration import calibrate, read_back
+
+# Reconnect backoff (seconds): doubles after every failed attempt up to the cap
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+
+
+class ResilientClient:
+    """Drop-in wrapper around OpenRGBClient with automatic reconnect and replay"""
+
+    def __init__(self, client, min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, connect=None):
+        self.client = client
+        self.connect = connect or self._connect  # Returns a new client with its device list read
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.listeners = []  # Called with no arguments after every reconnect
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self.committed = {}  # key -> RGBx bytes captured when the outage started
+        # Outage metrics
+        self.outages = 0
+        self.outage_started = None
+        self.last_outage = 0.0
+        self.total_outage = 0.0
+        self.attempts = 0
+
+    def __getattr__(self, name):
+        # Everything else (devices, comms, update, ...) is the wrapped client's
+        return getattr(self.client, name)
+
+    @property
+    def connected(self):
+        return self.client.comms.connected
+
+    @property
+    def reconnecting(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def add_listener(self, callback):
+        """Call callback() after every successful reconnect"""
+        self.listeners.append(callback)
+
+    def check(self):
+        """Return True if connected, otherwise start reconnecting in the background"""
+        if self.connected:
+            return True
+        self.start_reconnect()
+        return False
+
+    def start_reconnect(self, outage=True):
+        """Reconnect on the background thread
+
+        With outage=False (e.g. to re-read the device list) the connection
+        isn't counted as lost and no colors are replayed. Returns False if
+        a reconnect is already running.
+        """
+        with self.lock:
+            if self.closed or self.reconnecting:
+                return False
+            if outage and self.outage_started is None:
+                self.outage_started = time.perf_counter()
+                self.outages += 1
+                # The cached colors are what was last committed to each device
+                self.committed = {device_key(device): device_colors_to_bytes(device) for device in self.client.devices}
+            self.thread = threading.Thread(target=self._reconnect_loop, name="OpenRGB reconnect", daemon=True)
+            self.thread.start()
+        return True
+
+    def _reconnect_loop(self):
+        backoff = self.min_backoff
+        while not self.closed:
+            self.attempts += 1
+            try:
+                self.reconnect()
+                return
+            except Exception as e:
+                print(f"Reconnect to OpenRGB failed, retrying in {backoff:.1f}s: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _connect(self):
+        client = self.client
+        return OpenRGBClient(client.address, client.port, client.name)
+
+    def reconnect(self):
+        """Reconnect, re-map devices by identity and replay their colors
+
+        The new connection reads its device list into a client of its own,
+        so the UI and the render loop keep iterating the old list until
+        the new one replaces it in a single swap.
+        """
+        client = self.connect()
+        previous = {device_key(device): device for device in self.client.devices}
+        # Fresh Device objects, so the server's new order can't update the wrong one
+        client.devices = [self._remap(previous, device, index) for index, device in enumerate(client.devices)]
+        read_back(client.devices)
+        old, self.client = self.client, client
+        try:
+            old.comms.stop_connection()
+        except Exception:
+            pass
+        self.replay()
+
+        now = time.perf_counter()
+        if self.outage_started is not None:
+            self.last_outage = now - self.outage_started
+            self.total_outage += self.last_outage
+            self.outage_started = None
+            print(f"Reconnected to OpenRGB after {self.last_outage:.1f}s")
+        for callback in self.listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error after reconnect: {e}")
+
+    def _remap(self, previous, device, index):
+        """Return the pre-outage object of a device, updated with the new data"""
+        old = previous.get(device_key(device))
+        if old is None:
+            return device
+        old.id = old.device_id = index
+        old.comms = device.comms
+        old._update(device.data)
+        for zone in old.zones:
+            zone.device_id = index
+            zone.comms = device.comms
+            for led in zone.leds:
+                led.device_id = index
+                led.comms = device.comms
+        for led in old.leds:
+            led.device_id = index
+            led.comms = device.comms
+        return old
+
+    def replay(self):
+        """Send the last committed colors of every device in one write"""
+        frames = []
+        for device in self.client.devices:
+            colors = self.committed.get(device_key(device))
+            if colors and len(colors) == len(device.leds) * BYTES_PER_LED:
+                frames.append((device, colors))
+        if frames:
+            send_packet(self.client, b"".join(encode_device_colors(device.id, calibrate(device, colors))
+                                              for device, colors in frames))
+            for device, colors in frames:
+                sync_cached_colors(device, colors)
+        self.committed = {}
+
+    def outage_time(self):
+        """Length of the current outage in seconds, 0 when connected"""
+        started = self.outage_started
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "outages": self.outages,
+            "outage_s": self.outage_time(),
+            "last_outage_s": self.last_outage,
+            "total_outage_s": self.total_outage + self.outage_time(),
+            "reconnect_attempts": self.attempts,
+        }
+
+    def disconnect(self):
+        self.closed = True
+        self.client.disconnect()
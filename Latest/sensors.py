@@ -0,0 +1,200 @@
+"""System sensors (CPU, per-core load, memory, temperatures) for effects.
+
+One SensorSampler thread per process reads psutil at the fastest rate any
+effect asked for and publishes each sample with a single reference swap,
+so every zone and device showing a sensor shares the same readings and
+render() never calls psutil itself. Temperatures need a scan of the
+hardware monitors and are read every TEMP_INTERVAL at most. Levels are
+turned into colors through gradient lookup tables, one indexing per
+frame. psutil has no GPU load; GPU temperatures are read where the
+driver reports them (amdgpu, nouveau, radeon).
+"""
+import time
+import threading
+import numpy as np
+
+# Default and shortest time between samples (seconds)
+DEFAULT_INTERVAL = 0.5
+MIN_INTERVAL = 0.05
+# Temperatures are read this often at most (seconds)
+TEMP_INTERVAL = 2.0
+# Temperatures mapped to the start and end of a gradient (degrees C)
+TEMP_RANGE = (30.0, 90.0)
+# Entries in a gradient lookup table
+LUT_SIZE = 256
+# Readings an effect can show; "cores" has one level per CPU core
+SENSORS = ("cpu", "cores", "memory", "cpu_temp", "gpu_temp")
+# Hardware monitor chips that report CPU and GPU temperatures
+CPU_TEMP_CHIPS = ("coretemp", "k10temp", "zenpower", "cpu_thermal", "acpitz")
+GPU_TEMP_CHIPS = ("amdgpu", "nouveau", "radeon")
+# Gradient stops as (position in [0, 1], color)
+GRADIENTS = {
+    "heat": ((0.0, (0, 255, 0)), (0.5, (255, 255, 0)), (1.0, (255, 0, 0))),
+    "thermal": ((0.0, (0, 0, 255)), (0.35, (0, 255, 255)), (0.65, (255, 255, 0)), (1.0, (255, 0, 0))),
+    "ice": ((0.0, (0, 16, 64)), (0.6, (0, 128, 255)), (1.0, (255, 255, 255))),
+    "mono": ((0.0, (0, 0, 0)), (1.0, (255, 255, 255))),
+}
+
+
+def gradient_lut(gradient="heat", size=LUT_SIZE):
+    """uint8 (size, 3) table for a gradient name, a list of stops or a list of colors"""
+    stops = GRADIENTS.get(gradient) if isinstance(gradient, str) else gradient
+    if not stops:
+        raise ValueError(f"Unknown gradient: {gradient}")
+    if not isinstance(stops[0][1], (list, tuple)):
+        # Plain colors, spaced evenly
+        stops = [(i / max(1, len(stops) - 1), color) for i, color in enumerate(stops)]
+    positions = np.array([position for position, _ in stops], dtype=np.float32)
+    colors = np.array([color for _, color in stops], dtype=np.float32)
+    x = np.linspace(0.0, 1.0, size, dtype=np.float32)
+    table = np.stack([np.interp(x, positions, colors[:, channel]) for channel in range(3)], axis=1)
+    return np.rint(table).astype(np.uint8)
+
+
+def lookup(lut, levels):
+    """Colors of levels in [0, 1] from a gradient table"""
+    index = np.clip(np.asarray(levels) * (len(lut) - 1) + 0.5, 0, len(lut) - 1).astype(np.intp)
+    return lut[index]
+
+
+def temp_level(celsius):
+    low, high = TEMP_RANGE
+    return 0.0 if celsius is None else min(1.0, max(0.0, (celsius - low) / (high - low)))
+
+
+class SensorSample:
+    """One reading of every sensor, with loads and memory in [0, 1]"""
+
+    def __init__(self, taken, cpu, cores, memory, cpu_temp=None, gpu_temp=None):
+        self.taken = taken
+        self.cpu = cpu
+        self.cores = cores  # float32 array, one load per core
+        self.memory = memory
+        self.cpu_temp = cpu_temp  # Degrees C, None where not reported
+        self.gpu_temp = gpu_temp
+
+    def levels(self, sensor, coords):
+        """Level in [0, 1] of a sensor at each LED position in coords ([0, 1))"""
+        if sensor == "cores":
+            index = np.minimum((coords * len(self.cores)).astype(np.intp), len(self.cores) - 1)
+            return self.cores[index]
+        if sensor in ("cpu_temp", "gpu_temp"):
+            level = temp_level(getattr(self, sensor))
+        else:
+            level = getattr(self, sensor)
+        return np.full(len(coords), level, dtype=np.float32)
+
+
+def hottest(temperatures, chips):
+    """Highest current temperature reported by any of chips, or None"""
+    readings = [entry.current for chip in chips for entry in temperatures.get(chip, ()) if entry.current]
+    return max(readings) if readings else None
+
+
+class SensorSampler:
+    """Background thread keeping the newest SensorSample in self.sample"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = max(MIN_INTERVAL, interval)
+        self.sample = None
+        self.running = False
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.temperatures = {}
+        self.temps_read = 0.0
+        self.read_time = 0.0  # Seconds the last sample took
+        self.samples = 0
+
+    def start(self):
+        if self.running:
+            return
+        import psutil  # Only loaded once an effect shows a sensor
+        self.psutil = psutil
+        psutil.cpu_percent(percpu=True)  # Loads are measured from this call on
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="Sensor sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+
+    def read(self):
+        """Take one SensorSample"""
+        started = time.perf_counter()
+        psutil = self.psutil
+        cores = np.array(psutil.cpu_percent(percpu=True), dtype=np.float32) / 100.0
+        memory = psutil.virtual_memory().percent / 100.0
+        if started - self.temps_read >= TEMP_INTERVAL and hasattr(psutil, "sensors_temperatures"):
+            try:
+                self.temperatures = psutil.sensors_temperatures()
+            except (OSError, RuntimeError):
+                self.temperatures = {}
+            self.temps_read = started
+        sample = SensorSample(started, float(cores.mean()) if len(cores) else 0.0, cores, memory,
+                              hottest(self.temperatures, CPU_TEMP_CHIPS), hottest(self.temperatures, GPU_TEMP_CHIPS))
+        self.read_time = time.perf_counter() - started
+        return sample
+
+    def _run(self):
+        # Give the first load reading a measuring window
+        self.stop_event.wait(min(self.interval, 0.1))
+        try:
+            while self.running:
+                # Publish as one reference swap so readers never see a half update
+                self.sample = self.read()
+                self.samples += 1
+                self.stop_event.wait(self.interval)
+        except Exception as e:
+            print(f"Sensor sampler error: {e}")
+        finally:
+            self.running = False
+
+    def stats(self):
+        sample = self.sample
+        stats = {
+            "sensor_interval_ms": self.interval * 1000,
+            "sensor_read_ms": self.read_time * 1000,
+            "sensor_samples": self.samples,
+        }
+        if sample is not None:
+            stats["sensor_cpu"] = round(sample.cpu * 100, 1)
+            stats["sensor_cpu_temp"] = sample.cpu_temp
+        return stats
+
+
+# One sampler per process, shared by every effect showing a sensor
+_sampler = None
+_intervals = []  # Interval asked for by each current user
+_sampler_lock = threading.Lock()
+
+
+def acquire_sampler(interval=DEFAULT_INTERVAL):
+    """Return the shared sampler, running at least every interval seconds
+
+    Every call must be paired with release_sampler(interval).
+    """
+    global _sampler
+    with _sampler_lock:
+        _intervals.append(interval)
+        if _sampler is None or not _sampler.running:
+            _sampler = SensorSampler(interval)
+            _sampler.start()
+        _sampler.interval = max(MIN_INTERVAL, min(_intervals))
+        return _sampler
+
+
+def release_sampler(interval=DEFAULT_INTERVAL):
+    """Drop one user of the shared sampler; the last one stops it"""
+    global _sampler
+    with _sampler_lock:
+        if interval in _intervals:
+            _intervals.remove(interval)
+        if _sampler is None:
+            return
+        if not _intervals:
+            _sampler.stop()
+            _sampler = None
+        else:
+            _sampler.interval = max(MIN_INTERVAL, min(_intervals))
@@ -0,0 +1,219 @@
+"""Keyframe timelines for authored light shows.
+
+A timeline holds tracks, each driving a range of a device's LEDs (a zone
+or any LED group) through keyframes. A keyframe is a time, one color or
+one color per LED, and the easing used on the way to the next keyframe.
+Seeking finds the surrounding keyframes of every track by bisection, and
+all LEDs of a track are interpolated in one numpy expression. Timelines
+are saved as JSON under ~/.hanyargb/timelines.
+"""
+import os
+import re
+import json
+import bisect
+import numpy as np
+from app_paths import get_app_path
+from compositor import Layer
+
+# Curves from the start (0) to the end (1) of a segment, vectorized over u
+EASINGS = {
+    "linear": lambda u: u,
+    "ease_in": lambda u: u * u,
+    "ease_out": lambda u: u * (2.0 - u),
+    "ease_in_out": lambda u: u * u * (3.0 - 2.0 * u),
+    "step": lambda u: np.zeros_like(u),
+}
+# Default length of a new timeline (seconds)
+DEFAULT_DURATION = 10.0
+
+
+def check_easing(easing):
+    if easing not in EASINGS:
+        raise ValueError(f"Unknown easing: {easing}")
+
+
+class Track:
+    """Keyframes driving LEDs start..end (device-wide indices)"""
+
+    def __init__(self, name, start, end):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.times = []  # Sorted keyframe times, searched with bisect
+        self.colors = np.zeros((0, end - start, 3), dtype=np.float32)
+        self.easings = []  # Easing from each keyframe to the next
+
+    @property
+    def led_count(self):
+        return self.end - self.start
+
+    def add_keyframe(self, time, color, easing="linear"):
+        """Add a keyframe, or replace the one at the same time
+
+        color is one (r, g, b) for the whole track or an (n, 3) array.
+        """
+        check_easing(easing)
+        colors = np.empty((self.led_count, 3), dtype=np.float32)
+        colors[:] = np.asarray(color, dtype=np.float32)
+        index = bisect.bisect_left(self.times, time)
+        if index < len(self.times) and self.times[index] == time:
+            self.colors[index] = colors
+            self.easings[index] = easing
+            return
+        self.times.insert(index, time)
+        self.colors = np.insert(self.colors, index, colors, axis=0)
+        self.easings.insert(index, easing)
+
+    def remove_keyframe(self, time):
+        index = bisect.bisect_left(self.times, time)
+        if index < len(self.times) and self.times[index] == time:
+            del self.times[index]
+            del self.easings[index]
+            self.colors = np.delete(self.colors, index, axis=0)
+
+    def sample(self, t):
+        """Colors of the track at time t as float (n, 3), or None without keyframes"""
+        if not self.times:
+            return None
+        index = bisect.bisect_right(self.times, t) - 1
+        if index < 0:
+            return self.colors[0]
+        if index >= len(self.times) - 1:
+            return self.colors[-1]
+        t0, t1 = self.times[index], self.times[index + 1]
+        u = np.float32((t - t0) / (t1 - t0))
+        weight = EASINGS[self.easings[index]](u)
+        before = self.colors[index]
+        return before + (self.colors[index + 1] - before) * weight
+
+    def to_dict(self):
+        keyframes = []
+        for time, colors, easing in zip(self.times, self.colors, self.easings):
+            # One color when the whole track shares it, keeps files small
+            color = colors[0] if (colors == colors[0]).all() else colors
+            keyframes.append({"time": time, "color": np.rint(color).astype(int).tolist(), "easing": easing})
+        return {"name": self.name, "start": self.start, "end": self.end, "keyframes": keyframes}
+
+    @classmethod
+    def from_dict(cls, data):
+        track = cls(data["name"], int(data["start"]), int(data["end"]))
+        for keyframe in data.get("keyframes", []):
+            track.add_keyframe(float(keyframe["time"]), keyframe["color"], keyframe.get("easing", "linear"))
+        return track
+
+
+class Timeline:
+    """Tracks of keyframes over the LEDs of one device"""
+
+    def __init__(self, name, led_count, duration=DEFAULT_DURATION, loop=True):
+        self.name = name
+        self.led_count = led_count
+        self.duration = duration
+        self.loop = loop
+        self.tracks = {}  # name -> Track
+        self.frame = np.zeros((led_count, 3), dtype=np.float32)
+        self.mask = np.zeros(led_count, dtype=np.float32)
+
+    def track(self, name, start, end):
+        """Return the track called name, creating it for LEDs start..end"""
+        track = self.tracks.get(name)
+        if track is None or (track.start, track.end) != (start, end):
+            if not 0 <= start <= end <= self.led_count:
+                raise ValueError(f"Track {name} is outside the device's {self.led_count} LEDs")
+            track = Track(name, start, end)
+            self.tracks[name] = track
+        return track
+
+    def position(self, t):
+        """Time within the timeline for time t since it started"""
+        if self.loop and self.duration > 0:
+            return t % self.duration
+        return min(t, self.duration)
+
+    def render(self, t):
+        """Float colors (n, 3) in 0-255 at time t; LEDs without a track stay black"""
+        position = self.position(t)
+        self.frame.fill(0)
+        self.mask.fill(0)
+        for track in self.tracks.values():
+            colors = track.sample(position)
+            if colors is not None:
+                self.frame[track.start:track.end] = colors
+                self.mask[track.start:track.end] = 1.0
+        return self.frame
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "led_count": self.led_count,
+            "duration": self.duration,
+            "loop": self.loop,
+            "tracks": [track.to_dict() for track in self.tracks.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        timeline = cls(data["name"], int(data["led_count"]), float(data.get("duration", DEFAULT_DURATION)),
+                       bool(data.get("loop", True)))
+        for track_data in data.get("tracks", []):
+            track = Track.from_dict(track_data)
+            if track.end > timeline.led_count:
+                raise ValueError(f"Track {track.name} is outside the device's {timeline.led_count} LEDs")
+            timeline.tracks[track.name] = track
+        return timeline
+
+
+class TimelineLayer(Layer):
+    """Compositor layer playing a timeline; covers only LEDs with a track"""
+
+    def __init__(self, timeline, alpha=1.0, blend="normal"):
+        super().__init__(timeline.led_count, alpha, blend)
+        self.timeline = timeline
+        self.colors = np.zeros((timeline.led_count, 3), dtype=np.float32)
+
+    def render(self, t):
+        np.multiply(self.timeline.render(t), 1.0 / 255.0, out=self.colors)
+        self.mask = self.timeline.mask
+        return self.colors
+
+
+def file_stem(name):
+    """name as a file name that stays inside its folder (e.g. "../x" -> "_x")"""
+    stem = re.sub(r"[^\w .-]", "_", name).strip(" .")
+    return stem or "timeline"
+
+
+def timeline_path(name):
+    return get_app_path("timelines", f"{file_stem(name)}.json")
+
+
+def save_timeline(timeline):
+    """Write a timeline atomically, returns True on success"""
+    path = timeline_path(timeline.name)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(timeline.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error saving timeline {path}: {e}")
+        return False
+    return True
+
+
+def load_timeline(name):
+    """Load a saved timeline, or None if there is none"""
+    path = timeline_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return Timeline.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading timeline {path}: {e}")
+        return None
+
+
+def list_timelines():
+    directory = os.path.dirname(timeline_path("x"))
+    return sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".json"))
@@ -0,0 +1,153 @@
+"""Replay a frame trace to an OpenRGB server or the mock server.
+
+Usage:
+    python trace_replay.py TRACE [--fast] [--loop N] [--mock [--delay DEVICE=SECONDS ...]]
+                                 [--host HOST] [--port PORT]
+
+Frames are sent at their recorded timing, or back to back with --fast.
+On a real server device ids are re-mapped by name, location and serial,
+so a trace from another machine plays on whichever of its devices are
+connected here. Reports write times and how far playback fell behind
+the recorded schedule. This module must never import customtkinter.
+"""
+import sys
+import time
+import argparse
+from openrgb import OpenRGBClient
+from openrgb.network import NetworkClient
+from led_packets import HEADER, send_on, round_trip
+from profile_store import device_key
+from frame_trace import read_trace
+from latency_metrics import LatencyHistogram
+from mock_server import MockServer, parse_delay
+
+
+def split_packets(data):
+    """Yield (offset, device id, packet size) of every SDK packet in data"""
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        _, device_id, _, size = HEADER.unpack_from(data, offset)
+        yield offset, device_id, HEADER.size + size
+        offset += HEADER.size + size
+
+
+def remap_frames(frames, id_map):
+    """Rewrite device ids of every packet; packets for missing devices are dropped"""
+    remapped = []
+    for t, data in frames:
+        packets = []
+        for offset, device_id, size in split_packets(data):
+            new_id = id_map.get(device_id)
+            if new_id is None:
+                continue
+            packet = bytearray(data[offset:offset + size])
+            HEADER.pack_into(packet, 0, b"ORGB", new_id, *HEADER.unpack_from(packet, 0)[2:])
+            packets.append(bytes(packet))
+        if packets:
+            remapped.append((t, b"".join(packets)))
+    return remapped
+
+
+def device_id_map(meta, devices):
+    """Trace device id -> id of the same device on this server"""
+    ids = {device_key(device): device.id for device in devices}
+    id_map = {}
+    for entry in meta.get("devices", []):
+        new_id = ids.get(tuple(entry["key"]))
+        if new_id is not None:
+            id_map[entry["id"]] = new_id
+    return id_map
+
+
+def replay(comms, frames, fast=False):
+    """Send frames over an SDK connection, returns (write histogram, lag histogram, seconds)"""
+    writes = LatencyHistogram()
+    lag = LatencyHistogram()
+    started = time.perf_counter()
+    for t, data in frames:
+        if not fast:
+            due = started + t
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            lag.record(max(0.0, time.perf_counter() - due))
+        write_started = time.perf_counter()
+        send_on(comms, data)
+        writes.record(time.perf_counter() - write_started)
+    if comms.max_protocol_version > 0:
+        # Writes only fill the socket buffer; include the server's processing
+        round_trip(comms)
+    return writes, lag, time.perf_counter() - started
+
+
+def print_histogram(label, histogram):
+    print(f"  {label}: p50={histogram.percentile(50) * 1000:.3f} ms p99={histogram.percentile(99) * 1000:.3f} ms "
+          f"max={histogram.max / 1000:.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a HanyaRGB frame trace")
+    parser.add_argument("trace", help="Trace file recorded with --trace or HANYARGB_TRACE")
+    parser.add_argument("--fast", action="store_true", help="Send frames back to back instead of at recorded timing")
+    parser.add_argument("--loop", type=int, default=1, help="Play the trace N times")
+    parser.add_argument("--mock", action="store_true", help="Replay to an in-process mock server")
+    parser.add_argument("--delay", type=parse_delay, action="append", default=[], metavar="DEVICE=SECONDS",
+                        help="Processing delay of a mock device")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6742)
+    args = parser.parse_args(argv)
+
+    try:
+        meta, frames = read_trace(args.trace)
+    except (OSError, ValueError) as e:
+        print(f"Error reading trace: {e}")
+        return 1
+    if not frames:
+        print("Trace has no frames.")
+        return 1
+    print(f"Trace: {len(frames)} frame(s), {frames[-1][0]:.1f}s, {len(meta.get('devices', []))} device(s)")
+
+    server = None
+    client = None
+    try:
+        if args.mock:
+            server = MockServer(0, delays=dict(args.delay)).start()
+            comms = NetworkClient(lambda *update: None, "127.0.0.1", server.port, "HanyaRGB replay")
+        else:
+            client = OpenRGBClient(args.host, args.port, "HanyaRGB replay")
+            comms = client.comms
+            id_map = device_id_map(meta, client.devices)
+            print(f"Matched {len(id_map)}/{len(meta.get('devices', []))} device(s) on {args.host}:{args.port}")
+            frames = remap_frames(frames, id_map)
+            if not frames:
+                print("None of the traced devices are connected.")
+                return 1
+    except Exception as e:
+        print(f"Error connecting to OpenRGB: {e}")
+        if server:
+            server.stop()
+        return 1
+
+    try:
+        for run in range(max(1, args.loop)):
+            writes, lag, elapsed = replay(comms, frames, args.fast)
+            sent = sum(len(data) for _, data in frames)
+            print(f"Run {run + 1}: {len(frames)} frame(s) in {elapsed:.3f}s "
+                  f"({len(frames) / elapsed:.0f} fps, {sent / elapsed / 1024:.0f} KiB/s)")
+            print_histogram("write", writes)
+            if not args.fast:
+                print_histogram("behind schedule", lag)
+        if server:
+            print(f"Mock server: {server.stats()}")
+    except Exception as e:
+        print(f"Error replaying trace: {e}")
+        return 1
+    finally:
+        comms.stop_connection()
+        if server:
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())